@@ -1,22 +1,62 @@
+import time
+STARTUP_STARTED = time.perf_counter()
 import json
 import os
 import random
 import hashlib
+import hmac
 import re
+import math
+import datetime
+import functools
+import gc
+import atexit
+import base64
+import bisect
+import contextlib
+import io
+import itertools
+import threading
+import weakref
+import sqlite3
+import struct
 import traceback
+import sys
+import queue
+import argparse
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
-import winsound
+STARTUP_IMPORTED = time.perf_counter()
 USERS_FILE = "users.json"
 ADMINS_FILE = "admins.json"
 LEADERBOARD_FILE = "leaderboard.json"
+PLAYER_MANIFEST_FILE = "players_manifest.json"
 QUESTION_FILE = "questions.json"
+QUESTION_CACHE_SUFFIX = ".cache"
+ENEMIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "enemies.json")
 SAVE_DIR = "saves"
+SQLITE_FILE = "quicx.db"
+STORAGE_BACKEND = os.environ.get("QUICX_STORAGE", "json")
+STORAGE = None
+CURRENT_SESSION = None
+ACTIVE_USERS = set()
+PERSIST_POOL = None
+REPORT_POOL = None
 USERS = {}
+USER_INDEX = {}
 ADMINS = {}
+ADMIN_INDEX = {}
 QUESTIONS = []
-LEADERBOARD = []
+QUESTION_INDEX = None
+LEADERBOARD = None
+LEADERBOARD_FLUSH_EVERY = 25
+LEADERBOARD_FLUSH_SECONDS = 30.0
 DEV_MODE = {"god_mode": False, "show_answers": False, "instant_win": False}
 SOUND_ENABLED = True
+AUDIO_BACKEND = os.environ.get("QUICX_AUDIO", "auto")
+AUDIO = None
 ITEMS = {
     "potion": {"name": "Healing Potion", "desc": "Restores 30 HP", "price": 50},
     "shield": {"name": "Shield", "desc": "Provides 3 shield points to block hits", "price": 100},
@@ -35,7 +75,21 @@ DEFAULT_PLAYER = {
     "inventory": {},
     "shield_active": False,
     "shield_points": 0,
-    "story_shown": False
+    "story_shown": False,
+    "question_stats": ""
+}
+LEVEL_UP_CHOICES = {
+    "1": ("max_hp", 15),
+    "2": ("damage", 3),
+    "3": ("gold_bonus", 2),
+}
+DIFFICULTY_ORDER = ("easy", "medium", "hard", "boss")
+POOL_DIFFICULTIES = {
+    "easy": ("easy",),
+    "medium": ("easy", "medium"),
+    "hard": ("medium", "hard"),
+    "boss": ("boss",),
+    "random": ("easy", "medium", "hard"),
 }
 STORY_INTRO = """
 ╔══════════════════════════════════════════════════════════════════════════════╗
@@ -112,201 +166,2435 @@ def safe_json_load(path):
     except Exception as e:
         print(f"⚠️ Error loading {path}: {e}")
         return None
-def safe_json_write(path, data):
+def write_json_temp(path, data) -> Optional[str]:
+    """Write JSON to a fsynced temp file beside path; returns its name, or None after reporting the error."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
         ensure_dirs()
         d = os.path.dirname(path)
         if d:
             os.makedirs(d, exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
-        return True
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp
     except Exception as e:
         print(f"⚠️ Error saving {path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return None
+def safe_json_write(path, data):
+    """Write JSON to a temp file, fsync it and atomically swap it in place of path."""
+    tmp = write_json_temp(path, data)
+    if tmp is None:
         return False
+    try:
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"⚠️ Error saving {path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+JOURNAL_FSYNC_EVERY = 16
+JOURNAL_FSYNC_SECONDS = 2.0
+JOURNAL_COMPACT_MIN_BYTES = 16 * 1024
+JOURNALS = {}
+JOURNALS_LOCK = threading.Lock()
+JOURNAL_CACHE_LIMIT = 256
+LOCK_STATS = {"acquired": 0, "contended": 0, "wait": 0.0, "wait_max": 0.0, "held": 0.0, "held_max": 0.0}
+LOCK_STATS_LOCK = threading.Lock()
+if os.name == "nt":
+    def _lock_fd(fd: int, block: bool) -> bool:
+        import msvcrt
+        while True:
+            os.lseek(fd, 0, os.SEEK_SET)
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not block:
+                    return False
+                time.sleep(0.001)
+    def _unlock_fd(fd: int):
+        import msvcrt
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    def _lock_fd(fd: int, block: bool) -> bool:
+        import fcntl
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if block else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+    def _unlock_fd(fd: int):
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_UN)
+class FileLock:
+    """Exclusive advisory lock on path + ".lock"; the lock file also holds the store's generation base."""
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self.fd = None
+        self.held = False
+        self._since = 0.0
+    def __enter__(self):
+        start = time.perf_counter()
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        # opened per acquisition so an idle store (e.g. one per player save) holds no descriptor
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        contended = not _lock_fd(self.fd, False)
+        if contended:
+            _lock_fd(self.fd, True)
+        self.held = True
+        self._since = time.perf_counter()
+        waited = self._since - start
+        with LOCK_STATS_LOCK:
+            LOCK_STATS["acquired"] += 1
+            LOCK_STATS["contended"] += contended
+            LOCK_STATS["wait"] += waited
+            LOCK_STATS["wait_max"] = max(LOCK_STATS["wait_max"], waited)
+        return self
+    def __exit__(self, *exc):
+        held = time.perf_counter() - self._since
+        self.held = False
+        try:
+            _unlock_fd(self.fd)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+        with LOCK_STATS_LOCK:
+            LOCK_STATS["held"] += held
+            LOCK_STATS["held_max"] = max(LOCK_STATS["held_max"], held)
+    def stamp(self) -> tuple:
+        """(generation, base) as last written by bump(); (0, -1) for a store nobody compacted yet."""
+        try:
+            if self.held:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                raw = os.read(self.fd, 64)
+            else:
+                with open(self.path, "rb") as f:
+                    raw = f.read(64)
+            gen, base = raw.split()
+            return int(gen), int(base)
+        except (OSError, ValueError):
+            return 0, -1
+    def bump(self, base: int = -1) -> int:
+        """Start the next generation; base is where the previous log starts inside .journal.old (-1: not kept)."""
+        gen = self.stamp()[0] + 1
+        data = f"{gen} {base}\n".encode()
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, data)
+        os.ftruncate(self.fd, len(data))
+        return gen
+def lock_stats() -> dict:
+    with LOCK_STATS_LOCK:
+        return dict(LOCK_STATS)
+_GONE = object()
+def _encode_value(v) -> str:
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+class StateJournal:
+    """Append-only change journal (path + ".journal") over the JSON snapshot at path, shared safely between processes."""
+    def __init__(self, path: str, snapshot_fn=None, from_snapshot=None, to_snapshot=None, on_remote=None):
+        self.path = path
+        self.log_path = path + ".journal"
+        self.old_path = path + ".journal.old"
+        self.snapshot_fn = snapshot_fn
+        self.from_snapshot = from_snapshot or (lambda data: data if isinstance(data, dict) else {})
+        self.to_snapshot = to_snapshot or (lambda state: state)
+        self.on_remote = on_remote
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(path)
+        self.mirror = None
+        self.generation = None
+        self.offset = 0
+        self._fh = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._snapshot_bytes = 0
+        self._compactor = None
+    def exists(self) -> bool:
+        return any(os.path.exists(p) for p in (self.path, self.log_path, self.old_path))
+    def load(self, track: bool = False) -> dict:
+        """Snapshot plus every journaled change, in order; track=True keeps a copy for commit_diff()."""
+        with self.lock, self.file_lock:
+            state, had_old = self._load_locked()
+            if track:
+                self.mirror = {k: _encode_value(v) for k, v in state.items()}
+            if had_old and (self._compactor is None or not self._compactor.is_alive()):
+                self._rewrite_locked(state)
+        return state
+    def _load_locked(self) -> tuple:
+        self._close()
+        state = self.from_snapshot(safe_json_load(self.path))
+        self._snapshot_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        had_old = self._replay(self.old_path, state) is not None
+        self.offset = self._replay(self.log_path, state) or 0
+        self.generation = self.file_lock.stamp()[0]
+        return state, had_old
+    def _replay(self, path: str, state: dict, start: int = 0, tombstones: bool = False) -> Optional[int]:
+        """Apply the complete lines of path from byte start and cut off a torn tail; returns where they end (None: no file)."""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            f.seek(start)
+            good = start
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                good += len(raw)
+                try:
+                    op = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(op, dict) or "k" not in op:
+                    continue
+                if op.get("d"):
+                    if tombstones:
+                        state[op["k"]] = _GONE
+                    else:
+                        state.pop(op["k"], None)
+                else:
+                    state[op["k"]] = op.get("v")
+            torn = good < f.seek(0, os.SEEK_END)
+        if torn:
+            with open(path, "r+b") as f:
+                f.truncate(good)
+        return good
+    def _follow(self) -> dict:
+        """Catch up with other writers (both locks held); returns {key: value or _GONE} they touched."""
+        gen, base = self.file_lock.stamp()
+        if self.generation is None:
+            self._close()
+            self.generation = gen
+            self.offset = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+            return {}
+        ops = {}
+        if gen == self.generation:
+            end = self.offset if self._log_size() == self.offset else self._replay(self.log_path, ops, self.offset, True)
+        elif gen == self.generation + 1 and base >= 0 and self._replay(self.old_path, ops, base + self.offset, True) is not None:
+            self._close()
+            self.generation = gen
+            end = self._replay(self.log_path, ops, 0, True)
+        else:
+            state, _ = self._load_locked()
+            if self.mirror is not None:
+                self.mirror = {k: _encode_value(v) for k, v in state.items()}
+            if self.on_remote:
+                self.on_remote(state, [], True)
+            return state
+        self.offset = end or 0
+        if not ops:
+            return ops
+        changes = {k: v for k, v in ops.items() if v is not _GONE}
+        deleted = [k for k, v in ops.items() if v is _GONE]
+        if self.mirror is not None:
+            self.mirror.update((k, _encode_value(v)) for k, v in changes.items())
+            for k in deleted:
+                self.mirror.pop(k, None)
+        if self.on_remote:
+            self.on_remote(changes, deleted, False)
+        return ops
+    def _log_size(self) -> int:
+        try:
+            return os.fstat(self._fh.fileno()).st_size if self._fh is not None else os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+    def refresh(self) -> bool:
+        """Pick up what other processes wrote since the last look; cheap when nothing did."""
+        if self.generation is None:
+            return False
+        if self._log_size() == self.offset and self.file_lock.stamp()[0] == self.generation:
+            return False
+        try:
+            with self.lock, self.file_lock:
+                return bool(self._follow())
+        except OSError as e:
+            print(f"⚠️ Error loading {self.path}: {e}")
+            return False
+    def append(self, changes: Optional[dict] = None, deleted=(), merge=None, alias=None) -> bool:
+        """Journal changed keys and deletions; merge(key, ours, theirs) settles keys another process also changed."""
+        changes = dict(changes or {})
+        deleted = list(deleted)
+        if not changes and not deleted:
+            return True
+        try:
+            with self.lock:
+                with self.file_lock:
+                    self._append_locked(changes, deleted, merge, alias)
+                if self._unsynced >= JOURNAL_FSYNC_EVERY or time.monotonic() - self._last_sync >= JOURNAL_FSYNC_SECONDS:
+                    self._sync()
+        except OSError as e:
+            print(f"⚠️ Error saving {self.path}: {e}")
+            return False
+        if self.offset > max(JOURNAL_COMPACT_MIN_BYTES, self._snapshot_bytes):
+            self.compact()
+        return True
+    def _append_locked(self, changes: dict, deleted: list, merge, alias=None):
+        before = {k: self.mirror.get(k) for k in changes} if self.mirror is not None else None
+        touched = self._follow()
+        settle = [(k, None if touched[k] is _GONE else touched[k]) for k in changes
+                  if k in touched and (before is None or before[k] != self.mirror.get(k))]
+        if alias is not None and self.mirror is not None:
+            for k in changes:
+                other = alias(k)
+                if other is not None and other != k and other in self.mirror:
+                    settle.append((k, json.loads(self.mirror[other])))
+        for k, theirs in settle:
+            if k not in changes:
+                continue
+            value = merge(k, changes[k], theirs) if merge else changes[k]
+            if value is theirs:
+                del changes[k]
+            else:
+                changes[k] = value
+        lines = [json.dumps({"k": k, "v": v}, ensure_ascii=False, separators=(",", ":")) for k, v in changes.items()]
+        lines.extend(json.dumps({"k": k, "d": 1}, ensure_ascii=False) for k in deleted)
+        if lines:
+            self._write(("\n".join(lines) + "\n").encode("utf-8"))
+        if self.mirror is not None:
+            self.mirror.update((k, _encode_value(v)) for k, v in changes.items())
+            for k in deleted:
+                self.mirror.pop(k, None)
+    def _write(self, data: bytes):
+        if self._fh is None:
+            d = os.path.dirname(self.log_path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._fh = open(self.log_path, "ab")
+        self._fh.write(data)
+        self._fh.flush()
+        self.offset += len(data)
+        self._unsynced += 1
+    def commit_diff(self, doc: dict) -> bool:
+        """Journal only the top-level fields of doc that differ from the last committed version."""
+        encoded = {k: _encode_value(v) for k, v in doc.items()}
+        if self.mirror is None:
+            self.load(track=True)
+        changed = {k: doc[k] for k, e in encoded.items() if self.mirror.get(k) != e}
+        deleted = [k for k in self.mirror if k not in encoded]
+        if not self.append(changed, deleted):
+            return False
+        self.mirror = encoded
+        return True
+    def _sync(self):
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    def _close(self):
+        if self._fh is not None:
+            self._sync()
+            self._fh.close()
+            self._fh = None
+    def sync(self):
+        with self.lock:
+            try:
+                self._close()
+            except OSError:
+                pass
+    def close(self):
+        """Finish any compaction and release the log handle; the journal reopens on next use."""
+        if self._compactor is not None:
+            self._compactor.join()
+        self.sync()
+    def compact(self, wait: bool = False) -> bool:
+        """Move the log aside and write a fresh snapshot from snapshot_fn() in the background."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        if self.snapshot_fn is None and self.mirror is None:
+            return False
+        with self.lock, self.file_lock:
+            self._follow()
+            self._close()
+            base = 0
+            if os.path.exists(self.old_path):
+                base = os.path.getsize(self.old_path)
+                if os.path.exists(self.log_path):
+                    with open(self.log_path, "rb") as src, open(self.old_path, "ab") as dst:
+                        dst.write(src.read())
+                    os.remove(self.log_path)
+            elif os.path.exists(self.log_path):
+                os.replace(self.log_path, self.old_path)
+            self.generation = self.file_lock.bump(base)
+            self.offset = 0
+            old_size = os.path.getsize(self.old_path) if os.path.exists(self.old_path) else -1
+            data = self.snapshot_fn() if self.snapshot_fn else {k: json.loads(v) for k, v in self.mirror.items()}
+        self._compactor = threading.Thread(target=self._write_snapshot, args=(data, old_size), name=f"compact:{self.path}")
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+        return True
+    def _write_snapshot(self, data, old_size: int):
+        """Serialize outside the locks; swap it in only if nobody touched .journal.old meanwhile."""
+        tmp = write_json_temp(self.path, self.to_snapshot(data))
+        if tmp is None:
+            return
+        try:
+            with self.lock, self.file_lock:
+                current = os.path.getsize(self.old_path) if os.path.exists(self.old_path) else -1
+                if current == old_size:
+                    os.replace(tmp, self.path)
+                    tmp = None
+                    self._snapshot_bytes = os.path.getsize(self.path)
+                    if current >= 0:
+                        os.remove(self.old_path)
+        except OSError as e:
+            print(f"⚠️ Error saving {self.path}: {e}")
+        finally:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+    def rewrite(self, state: dict) -> bool:
+        """Replace snapshot and journal with state right away (full reset of the store)."""
+        if self._compactor is not None:
+            self._compactor.join()
+        try:
+            with self.lock, self.file_lock:
+                return self._rewrite_locked(state)
+        except OSError as e:
+            print(f"⚠️ Error saving {self.path}: {e}")
+            return False
+    def _rewrite_locked(self, state: dict) -> bool:
+        self._close()
+        if not safe_json_write(self.path, self.to_snapshot(state)):
+            return False
+        self._snapshot_bytes = os.path.getsize(self.path)
+        for p in (self.log_path, self.old_path):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        self.generation = self.file_lock.bump()
+        self.offset = 0
+        if self.mirror is not None:
+            self.mirror = {k: _encode_value(v) for k, v in state.items()}
+        return True
+def get_journal(path: str, snapshot_fn=None, from_snapshot=None, to_snapshot=None, on_remote=None) -> StateJournal:
+    """Cached journal for path; past JOURNAL_CACHE_LIMIT the least recently used plain (per-player) ones are closed."""
+    with JOURNALS_LOCK:
+        j = JOURNALS.pop(path, None)
+        if j is None:
+            j = StateJournal(path, snapshot_fn, from_snapshot, to_snapshot, on_remote)
+        JOURNALS[path] = j
+        evicted = []
+        if len(JOURNALS) > JOURNAL_CACHE_LIMIT:
+            # shared stores keep callbacks and mirrors the game relies on, so only plain journals go
+            for p, old in list(JOURNALS.items()):
+                if len(JOURNALS) <= JOURNAL_CACHE_LIMIT or old is j:
+                    break
+                if old.snapshot_fn is None and old.on_remote is None:
+                    evicted.append(JOURNALS.pop(p))
+    for old in evicted:
+        old.close()
+    return j
+def release_journal(path: str):
+    with JOURNALS_LOCK:
+        j = JOURNALS.pop(path, None)
+    if j is not None:
+        j.close()
+def sync_journals():
+    for j in list(JOURNALS.values()):
+        j.sync()
+        if j._compactor is not None:
+            j._compactor.join()
+class TerminalRenderer:
+    """Draws screens with ANSI escapes, rewriting only the rows that changed; plain prints without ANSI support."""
+    def __init__(self, ansi: bool = True):
+        self.ansi = ansi
+        self.lines = None
+    def _write(self, text: str):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    def clear(self):
+        """Blank the screen and release any pinned frame."""
+        if self.ansi:
+            self._write("\033[r\033[H\033[2J")
+        self.lines = []
+    def reset(self):
+        """Give the whole screen back to ordinary output (on exit)."""
+        if self.ansi and self.lines:
+            self._write(f"\033[r\033[{len(self.lines) + 1};1H")
+        self.lines = None
+    def frame(self, lines: list):
+        if not self.ansi:
+            self._write("\n".join(lines) + "\n")
+            return
+        buf = []
+        prev = self.lines
+        if prev is None:
+            buf.append("\033[r\033[H\033[2J")
+            prev = []
+        if len(lines) != len(prev) or self.lines is None:
+            buf.append(f"\033[{len(lines) + 1}r")
+        for i, line in enumerate(lines):
+            if i >= len(prev) or prev[i] != line:
+                buf.append(f"\033[{i + 1};1H{line}\033[K")
+        buf.append(f"\033[{len(lines) + 1};1H\033[J")
+        self.lines = list(lines)
+        self._write("".join(buf))
+RENDERER = None
+def get_renderer() -> TerminalRenderer:
+    """The renderer for whoever is being served: the network session or the local terminal."""
+    global RENDERER
+    if CURRENT_SESSION is not None:
+        return CURRENT_SESSION.renderer
+    if RENDERER is None:
+        if os.name == "nt":
+            os.system("")
+        RENDERER = TerminalRenderer(ansi=sys.stdout.isatty())
+        atexit.register(RENDERER.reset)
+    return RENDERER
 def clear_screen():
-    os.system("cls" if os.name == "nt" else "clear")
-def play_sound(frequency: int, duration: int = 200):
-    """Play a simple beep sound if sound is enabled."""
-    if SOUND_ENABLED:
+    get_renderer().clear()
+class NullAudioBackend:
+    """Silent backend for headless hosts and the server."""
+    name = "null"
+    def play(self, frequency: int, duration: int):
+        pass
+    def close(self):
+        pass
+class WinsoundBackend:
+    """Blocking winsound.Beep; only ever called from the audio thread."""
+    name = "winsound"
+    def __init__(self):
+        import winsound
+        self._beep = winsound.Beep
+    def play(self, frequency: int, duration: int):
+        self._beep(frequency, duration)
+    def close(self):
+        pass
+class BellBackend:
+    """Terminal bell for consoles without a tone generator; ignores pitch and length."""
+    name = "bell"
+    def __init__(self):
+        if sys.__stdout__ is None or not sys.__stdout__.isatty():
+            raise OSError("no terminal for the bell")
+    def play(self, frequency: int, duration: int):
+        sys.__stdout__.write("\a")
+        sys.__stdout__.flush()
+    def close(self):
+        pass
+class QueuedAudioPlayer:
+    """Feeds a blocking backend from a daemon thread so play() returns at once; beeps past a full queue are dropped."""
+    def __init__(self, backend, max_pending: int = 4):
+        self.backend = backend
+        self.name = backend.name
+        self._queue = queue.Queue(max_pending)
+        self._thread = None
+    def play(self, frequency: int, duration: int):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+            self._thread.start()
         try:
-            winsound.Beep(frequency, duration)
-        except Exception:
+            self._queue.put_nowait((frequency, duration))
+        except queue.Full:
             pass
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self.backend.play(*item)
+            except Exception:
+                pass
+    def close(self):
+        if self._thread is None:
+            return
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+        self._thread.join(timeout=1.0)
+        self._thread = None
+        self.backend.close()
+AUDIO_BACKENDS = {"winsound": WinsoundBackend, "bell": BellBackend, "null": NullAudioBackend}
+def make_audio(name: str = "auto"):
+    """Build the named backend ("auto" tries winsound, then stays silent)."""
+    for candidate in (("winsound", "null") if name == "auto" else (name, "null")):
+        try:
+            backend = AUDIO_BACKENDS[candidate]()
+        except (ImportError, OSError, KeyError):
+            continue
+        return backend if isinstance(backend, NullAudioBackend) else QueuedAudioPlayer(backend)
+    return NullAudioBackend()
+def get_audio():
+    global AUDIO
+    if AUDIO is None:
+        AUDIO = make_audio(AUDIO_BACKEND)
+        atexit.register(AUDIO.close)
+    return AUDIO
+def dev_mode() -> dict:
+    """Dev flags of whoever is being served: the network session's own, or DEV_MODE for the local terminal."""
+    return CURRENT_SESSION.dev if CURRENT_SESSION is not None else DEV_MODE
+def sound_enabled() -> bool:
+    return CURRENT_SESSION.sound if CURRENT_SESSION is not None else SOUND_ENABLED
+def play_sound(frequency: int, duration: int = 200):
+    """Queue a simple beep if sound is enabled; never waits for it to finish."""
+    if sound_enabled():
+        get_audio().play(frequency, duration)
+class Call:
+    """Blocking work (disk, password hashing) yielded by a game coroutine and run off the event loop."""
+    __slots__ = ("fn", "args")
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+class SlowCall(Call):
+    """A Call that scans whole tables or logs; the server keeps these off the pool that saves players."""
+    __slots__ = ()
+def run_cli(flow):
+    """Drive a game coroutine from the terminal with input()."""
+    value = None
+    while True:
+        try:
+            req = flow.send(value)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(req, Call):
+            value = req.fn(*req.args)
+        elif isinstance(req, Future):
+            value = req.result()
+        else:
+            try:
+                value = input(req)
+            except (EOFError, KeyboardInterrupt):
+                value = None
 def press_enter():
-    try:
-        input("\n⚡ Press Enter to continue...")
-    except (EOFError, KeyboardInterrupt):
-        pass
+    yield "\n⚡ Press Enter to continue..."
 def safe_input(prompt=""):
-    try:
-        return input(prompt).strip()
-    except (EOFError, KeyboardInterrupt):
+    line = yield prompt
+    if line is None:
         print("\n⚠️ Input interrupted")
         return ""
+    return line.strip()
 def get_valid_choice(prompt, valid_choices, error_msg="⚠️ Invalid choice."):
     while True:
-        c = safe_input(prompt)
+        c = yield from safe_input(prompt)
         if c in valid_choices:
             return c
         print(error_msg)
-        press_enter()
-def _find_record_case_insensitive(d: dict, key: str):
-    if not isinstance(d, dict) or not key:
-        return None, None
-    key_low = key.lower()
-    for k, v in d.items():
-        if k.lower() == key_low:
-            return k, v
-    return None, None
+        yield from press_enter()
+def persist_later(fn, *args):
+    """Fire-and-forget save for cleanup paths that cannot wait (e.g. a dropped connection)."""
+    if PERSIST_POOL is not None:
+        PERSIST_POOL.submit(fn, *args)
+    else:
+        fn(*args)
+AUTH_KDF = os.environ.get("QUICX_KDF", "pbkdf2_sha256")
+AUTH_COSTS = {"pbkdf2_sha256": 200_000, "scrypt": 2 ** 14}
+AUTH_SERVICE = None
+class AuthService:
+    """Salted password hashing with a stdlib KDF in a worker thread pool; records without "kdf" are legacy SHA-256."""
+    def __init__(self, kdf: str = "pbkdf2_sha256", cost: Optional[int] = None, workers: Optional[int] = None):
+        if kdf not in AUTH_COSTS:
+            raise ValueError(f"unknown KDF: {kdf}")
+        self.kdf = kdf
+        self.cost = int(cost or AUTH_COSTS[kdf])
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix="auth")
+    def _params(self) -> dict:
+        if self.kdf == "scrypt":
+            return {"kdf": "scrypt", "n": self.cost, "r": 8, "p": 1}
+        return {"kdf": self.kdf, "iterations": self.cost}
+    @staticmethod
+    def _derive(password: str, salt: bytes, params: dict) -> str:
+        kdf = params.get("kdf")
+        if kdf is None:
+            return hashlib.sha256(salt + password.encode()).hexdigest()
+        if kdf == "scrypt":
+            n, r, p = int(params["n"]), int(params["r"]), int(params["p"])
+            return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + (1 << 20), dklen=32).hex()
+        if kdf == "pbkdf2_sha256":
+            return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, int(params["iterations"])).hex()
+        raise ValueError(f"unknown KDF: {kdf}")
+    def _hash(self, password: str, salt: bytes) -> dict:
+        record = self._params()
+        record.update(hash=self._derive(password, salt, record), salt=salt.hex())
+        return record
+    def _verify(self, password: str, stored: dict) -> bool:
+        try:
+            salt = bytes.fromhex(stored.get("salt", ""))
+            return hmac.compare_digest(self._derive(password, salt, stored), str(stored.get("hash", "")))
+        except Exception:
+            return False
+    def hash_async(self, password: str, salt: Optional[bytes] = None) -> Future:
+        return self.pool.submit(self._hash, password, salt if salt is not None else os.urandom(16))
+    def verify_async(self, password: str, stored: dict) -> Future:
+        return self.pool.submit(self._verify, password, stored)
+    def hash(self, password: str, salt: Optional[bytes] = None) -> dict:
+        return self.hash_async(password, salt).result()
+    def verify(self, password: str, stored: dict) -> bool:
+        return isinstance(stored, dict) and self.verify_async(password, stored).result()
+    def needs_rehash(self, stored: dict) -> bool:
+        """True for legacy records and records hashed with another KDF or a lower cost."""
+        if not isinstance(stored, dict) or stored.get("kdf") != self.kdf:
+            return True
+        return int(stored.get("n" if self.kdf == "scrypt" else "iterations", 0)) < self.cost
+    def close(self):
+        self.pool.shutdown(wait=False)
+def get_auth() -> AuthService:
+    global AUTH_SERVICE
+    if AUTH_SERVICE is None:
+        AUTH_SERVICE = AuthService(AUTH_KDF if AUTH_KDF in AUTH_COSTS else "pbkdf2_sha256")
+    return AUTH_SERVICE
 def hash_password(password: str, salt: Optional[bytes] = None) -> dict:
-    if salt is None:
-        salt = os.urandom(16)
-    h = hashlib.sha256(salt + password.encode()).hexdigest()
-    return {"hash": h, "salt": salt.hex()}
+    return get_auth().hash(password, salt)
 def verify_password(password: str, stored: dict) -> bool:
+    return get_auth().verify(password, stored)
+def benchmark_password_hashing(seconds: float = 2.0, workers: Optional[int] = None, settings=None) -> list:
+    """Measure verifications/sec for each (kdf, cost) setting across a worker pool."""
+    workers = workers or os.cpu_count() or 1
+    settings = settings or [("sha256 (legacy)", None)] + [("pbkdf2_sha256", c) for c in (50_000, 100_000, 200_000, 600_000)] \
+        + [("scrypt", c) for c in (2 ** 12, 2 ** 14, 2 ** 15)]
+    results = []
+    for kdf, cost in settings:
+        svc = AuthService("pbkdf2_sha256" if cost is None else kdf, cost, workers)
+        salt = os.urandom(16)
+        stored = {"hash": hashlib.sha256(salt + b"hunter2").hexdigest(), "salt": salt.hex()} if cost is None else svc.hash("hunter2")
+        done = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            batch = [svc.verify_async("hunter2", stored) for _ in range(workers * 4)]
+            done += sum(1 for f in batch if f.result())
+        elapsed = time.perf_counter() - start
+        svc.close()
+        results.append({"kdf": kdf, "cost": cost, "workers": workers, "logins_per_sec": done / elapsed,
+                        "per_core": done / elapsed / workers, "latency_ms": elapsed * 1000 * workers / max(1, done)})
+    return results
+def print_auth_benchmark(results: list):
+    print("🔐 Password hashing throughput\n" + "─"*64)
+    print(f"{'KDF':<16} | {'Cost':>8} | {'Logins/s':>10} | {'Per core':>9} | {'ms/login':>8}")
+    for r in results:
+        print(f"{r['kdf']:<16} | {r['cost'] or '-':>8} | {r['logins_per_sec']:>10.1f} | {r['per_core']:>9.1f} | {r['latency_ms']:>8.2f}")
+ITEM_SLOTS = {k: i for i, k in enumerate(ITEMS)}
+class Inventory:
+    """Item counts in one small array (a slot per ITEMS key) that reads like the old {item: count} dict."""
+    __slots__ = ("counts", "extra", "revision")
+    def __init__(self, items=None):
+        self.counts = array("l", [0] * len(ITEM_SLOTS))
+        self.extra = None
+        self.revision = 0
+        for k, v in (items.items() if isinstance(items, (dict, Inventory)) else ()):
+            if isinstance(k, str):
+                try:
+                    self[k] = v
+                except (TypeError, ValueError):
+                    self[k] = 0
+    def __getitem__(self, key):
+        i = ITEM_SLOTS.get(key)
+        if i is not None:
+            return self.counts[i]
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise TypeError(f"item key must be a string, not {type(key).__name__}")
+        value = max(0, int(value))
+        i = ITEM_SLOTS.get(key)
+        if i is not None:
+            self.counts[i] = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        self.revision += 1
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        i = ITEM_SLOTS.get(key)
+        if i is not None:
+            self.counts[i] = 0
+        elif self.extra:
+            self.extra.pop(key, None)
+        self.revision += 1
+        return value
+    def items(self):
+        for k, i in ITEM_SLOTS.items():
+            if self.counts[i] > 0:
+                yield k, self.counts[i]
+        if self.extra:
+            yield from ((k, v) for k, v in self.extra.items() if v > 0)
+    def keys(self):
+        return [k for k, _ in self.items()]
+    def values(self):
+        return [v for _, v in self.items()]
+    def __iter__(self):
+        return iter(self.keys())
+    def __len__(self):
+        return len(self.keys())
+    def __contains__(self, key):
+        return (self.get(key) or 0) > 0
+    def to_dict(self) -> dict:
+        return dict(self.items())
+    def __eq__(self, other):
+        if isinstance(other, (dict, Inventory)):
+            return self.to_dict() == {k: v for k, v in other.items() if v > 0}
+        return NotImplemented
+    def __repr__(self):
+        return f"Inventory({self.to_dict()!r})"
+def _at_least(low: int):
+    def rule(v) -> int:
+        v = int(v)
+        return v if v > low else low
+    return rule
+def _player_name(v) -> str:
+    if not isinstance(v, str) or not v.strip():
+        raise ValueError("player name must be a non-empty string")
+    return v
+def _as_inventory(v) -> Inventory:
+    return v if isinstance(v, Inventory) else Inventory(v)
+def _as_question_stats(v) -> "QuestionStats":
+    if isinstance(v, QuestionStats):
+        return v
+    if v is None or isinstance(v, str):
+        return QuestionStats.decode(v or "")
+    raise TypeError("question_stats must be encoded text")
+PLAYER_FIELDS = tuple(DEFAULT_PLAYER)
+PLAYER_RULES = {
+    "name": _player_name, "level": _at_least(1), "xp": int, "hp": _at_least(0), "max_hp": _at_least(1),
+    "damage": _at_least(1), "score": _at_least(0), "combo": _at_least(0), "gold": _at_least(0),
+    "gold_bonus": _at_least(0), "inventory": _as_inventory, "shield_active": bool,
+    "shield_points": _at_least(0), "story_shown": bool, "question_stats": _as_question_stats,
+}
+class Player:
+    """A player's stats in fixed slots, coerced through PLAYER_RULES on every assignment, which also bumps the revision."""
+    __slots__ = PLAYER_FIELDS + ("_rev", "_saved", "_saved_at")
+    def __init__(self, name: str = "Hero"):
+        for k, v in DEFAULT_PLAYER.items():
+            object.__setattr__(self, k, v)
+        object.__setattr__(self, "inventory", Inventory())
+        object.__setattr__(self, "question_stats", QuestionStats())
+        object.__setattr__(self, "_rev", 0)
+        object.__setattr__(self, "_saved", None)
+        object.__setattr__(self, "_saved_at", 0.0)
+        self.name = name
+    @classmethod
+    def from_dict(cls, data) -> "Player":
+        """Validate saved data once, keeping the default for any field that does not check out."""
+        p = cls()
+        if isinstance(data, Player):
+            data = data.to_dict()
+        if not isinstance(data, dict):
+            return p
+        for k in ("max_hp",) + PLAYER_FIELDS:
+            if k in data:
+                try:
+                    setattr(p, k, data[k])
+                except (TypeError, ValueError):
+                    pass
+        return p
+    def __setattr__(self, key, value):
+        if key not in PLAYER_RULES:
+            raise AttributeError(f"Player has no field {key!r}")
+        self[key] = value
+    def __getitem__(self, key):
+        if key in PLAYER_RULES:
+            return getattr(self, key)
+        raise KeyError(key)
+    def __setitem__(self, key, value):
+        rule = PLAYER_RULES.get(key)
+        if rule is None:
+            raise KeyError(key)
+        value = rule(value)
+        if key == "hp":
+            if value > self.max_hp:
+                value = self.max_hp
+        elif key == "max_hp" and self.hp > value:
+            object.__setattr__(self, "hp", value)
+        object.__setattr__(self, key, value)
+        object.__setattr__(self, "_rev", self._rev + 1)
+    @property
+    def revision(self) -> tuple:
+        return self._rev, self.inventory.revision, self.question_stats.revision
+    @property
+    def dirty(self) -> bool:
+        """Changed since the last mark_saved()."""
+        return self.revision != self._saved
+    def mark_saved(self, revision: tuple):
+        object.__setattr__(self, "_saved", revision)
+        object.__setattr__(self, "_saved_at", time.monotonic())
+    def get(self, key, default=None):
+        return getattr(self, key) if key in PLAYER_RULES else default
+    def setdefault(self, key, default=None):
+        return self[key]
+    def __contains__(self, key):
+        return key in PLAYER_RULES
+    def __iter__(self):
+        return iter(PLAYER_FIELDS)
+    def __len__(self):
+        return len(PLAYER_FIELDS)
+    def keys(self):
+        return PLAYER_FIELDS
+    def items(self):
+        return [(k, getattr(self, k)) for k in PLAYER_FIELDS]
+    def to_dict(self) -> dict:
+        d = {k: getattr(self, k) for k in PLAYER_FIELDS}
+        d["inventory"] = self.inventory.to_dict()
+        d["question_stats"] = self.question_stats.encode()
+        return d
+    def copy(self) -> "Player":
+        return Player.from_dict(self)
+    def __eq__(self, other):
+        if isinstance(other, (dict, Player)):
+            return self.to_dict() == Player.from_dict(other).to_dict()
+        return NotImplemented
+    def __repr__(self):
+        return f"Player({self.to_dict()!r})"
+def normalize_player(p: Optional[dict]) -> Player:
+    """Return a validated Player built from a dict (or Player), using defaults for bad fields."""
+    return Player.from_dict(p or {})
+def _clean_leaderboard_entry(e) -> Optional[dict]:
+    if not isinstance(e, dict) or not e.get("name"):
+        return None
     try:
-        salt = bytes.fromhex(stored.get("salt", ""))
-        return hashlib.sha256(salt + password.encode()).hexdigest() == stored.get("hash", "")
+        return {
+            "name": str(e["name"]),
+            "score": max(0, int(e.get("score", 0))),
+            "level": max(1, int(e.get("level", 1))),
+            "xp": max(0, int(e.get("xp", 0)))
+        }
     except Exception:
-        return False
-def normalize_player(p: Optional[dict]) -> dict:
-    """Return a safe copy of player dict using defaults and validation."""
-    p = p or {}
-    player = DEFAULT_PLAYER.copy()
-    player.update({k: p.get(k, player[k]) for k in player.keys()})
-    for n in ("level", "xp", "hp", "max_hp", "damage", "score", "combo", "gold", "gold_bonus"):
-        try:
-            player[n] = int(player.get(n, DEFAULT_PLAYER[n]))
-        except Exception:
-            player[n] = DEFAULT_PLAYER[n]
-    player["level"] = max(1, player["level"])
-    player["max_hp"] = max(1, player["max_hp"])
-    player["hp"] = max(0, min(player["hp"], player["max_hp"]))
-    player["damage"] = max(1, player["damage"])
-    player["score"] = max(0, player["score"])
-    player["combo"] = max(0, player["combo"])
-    player["gold"] = max(0, player["gold"])
-    player["gold_bonus"] = max(0, player["gold_bonus"])
-    inv = player.get("inventory", {}) or {}
-    if not isinstance(inv, dict):
-        inv = {}
-    new_inv = {}
-    for k, v in inv.items():
-        if isinstance(k, str):
-            try:
-                new_inv[k] = max(0, int(v))
-            except Exception:
-                new_inv[k] = 0
-    player["inventory"] = new_inv
-    player["shield_active"] = bool(player.get("shield_active", False))
-    player["shield_points"] = max(0, int(player.get("shield_points", 0)))
-    player["story_shown"] = bool(player.get("story_shown", False))
-    if not isinstance(player.get("name"), str) or not player["name"].strip():
-        player["name"] = DEFAULT_PLAYER["name"]
-    return player
+        return None
+MANIFEST_COLUMNS = {"name": None, "level": 0, "score": 1, "saved": 2}
+def _manifest_key(sort: str):
+    """Sort key of a manifest row: the column, then the name (case-insensitive first for "name")."""
+    col = MANIFEST_COLUMNS[sort]
+    if col is None:
+        return lambda name, row: (name.lower(), name)
+    return lambda name, row: (row[col], name)
+MANIFEST_REBUILD_CHUNK = 2000
+def _save_summary(username: str) -> tuple:
+    """(username, level, score, last save time) read straight from a player's save files, without locking."""
+    path = player_save_path(username)
+    data = safe_json_load(path)
+    data = data if isinstance(data, dict) else {}
+    saved = 0.0
+    for p in (path, path + ".journal.old", path + ".journal"):
+        try:
+            saved = max(saved, os.path.getmtime(p))
+        except OSError:
+            continue
+        if p == path:
+            continue
+        with open(p, "rb") as f:
+            for raw in f:
+                try:
+                    op = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(op, dict) and op.get("k") in ("level", "score") and not op.get("d"):
+                    data[op["k"]] = op.get("v")
+    player = normalize_player({"level": data.get("level", 1), "score": data.get("score", 0)})
+    return username, player.level, player.score, round(saved, 3)
+def _save_summaries(usernames: list) -> list:
+    return [_save_summary(u) for u in usernames]
+class UserManifest:
+    """name -> [level, score, last save] for every account, so the admin listing never opens a save."""
+    def __init__(self, path: str = PLAYER_MANIFEST_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.rows = None
+        self._orders = {}
+    def journal(self) -> StateJournal:
+        return get_journal(self.path, self.snapshot, on_remote=self._apply_remote)
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {k: list(v) for k, v in self.rows.items()}
+    def load(self, workers: Optional[int] = None) -> dict:
+        journal = self.journal()
+        if self.rows is not None:
+            journal.refresh()
+            return self.rows
+        if journal.exists():
+            rows = journal.load()
+        else:
+            rows = self.rebuild(workers)
+        with self.lock:
+            if self.rows is None:
+                self.rows = {k: list(v) for k, v in rows.items() if isinstance(v, list) and len(v) == 3}
+                for u in USERS:
+                    self.rows.setdefault(u, [1, 0, 0.0])
+                self._orders = {}
+        return self.rows
+    def rebuild(self, workers: Optional[int] = None) -> dict:
+        """Summarize every account's save (in parallel for large user bases) and store the result."""
+        usernames = list(USERS if get_storage().users_loaded else load_users())
+        t = time.perf_counter()
+        chunks = [usernames[i:i + MANIFEST_REBUILD_CHUNK] for i in range(0, len(usernames), MANIFEST_REBUILD_CHUNK)]
+        if len(chunks) <= 1 or workers == 1:
+            parts = map(_save_summaries, chunks)
+        else:
+            print(f"🗂️ Rebuilding the player manifest for {len(usernames)} users...")
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_save_summaries, chunks))
+        rows = {u: [level, score, saved] for part in parts for u, level, score, saved in part}
+        self.journal().rewrite(rows)
+        if len(chunks) > 1:
+            print(f"✅ Manifest rebuilt: {len(rows)} users in {time.perf_counter() - t:.1f}s")
+        return rows
+    def record(self, username: str, level: int, score: int) -> bool:
+        """Note a player save; without a manifest on disk this is a no-op, the next rebuild reads the save itself."""
+        if self.rows is None:
+            if not self.journal().exists():
+                return True
+            self.load()
+        row = [level, score, round(time.time(), 3)]
+        if not self.journal().append({username: row}):
+            return False
+        with self.lock:
+            self._set(username, row)
+        return True
+    def _apply_remote(self, changes: dict, deleted: list, reset: bool):
+        with self.lock:
+            if self.rows is None:
+                return
+            if reset:
+                self.rows = {u: [1, 0, 0.0] for u in USERS}
+                self._orders = {}
+            for k in deleted:
+                self._set(k, None)
+            for k, row in changes.items():
+                if isinstance(row, list) and len(row) == 3:
+                    self._set(k, row)
+    def _set(self, name: str, row: Optional[list]):
+        old = self.rows.get(name)
+        for sort, order in self._orders.items():
+            key = _manifest_key(sort)
+            if old is not None:
+                i = bisect.bisect_left(order, key(name, old), key=lambda n: key(n, self.rows[n]))
+                if i < len(order) and order[i] == name:
+                    del order[i]
+            if row is not None:
+                bisect.insort(order, name, key=lambda n: key(n, self.rows[n] if n != name else row))
+        if row is None:
+            self.rows.pop(name, None)
+        else:
+            self.rows[name] = row
+    def _order(self, sort: str) -> list:
+        order = self._orders.get(sort)
+        if order is None:
+            rows = self.rows
+            col = MANIFEST_COLUMNS[sort]
+            order = sorted(rows)
+            # stable sort by the column alone, so comparisons stay on ints instead of key tuples
+            order.sort(key=str.lower if col is None else lambda n: rows[n][col])
+            self._orders[sort] = order
+        return order
+    def page(self, sort: str = "name", descending: bool = False, offset: int = 0, limit: int = 20,
+             name_filter: str = "", min_level: Optional[int] = None, max_level: Optional[int] = None) -> tuple:
+        """(rows, total, more) with rows as (username, level, score, saved); total is None for filtered pages."""
+        self.load()
+        with self.lock:
+            order = self._order(sort if sort in MANIFEST_COLUMNS else "name")
+            rows = self.rows
+            names = reversed(order) if descending else iter(order)
+            filtered = bool(name_filter) or min_level is not None or max_level is not None
+            if not filtered:
+                start = len(order) - offset - limit if descending else offset
+                chunk = order[max(0, start):max(0, start + limit)]
+                picked = chunk[::-1] if descending else chunk
+                more, total = offset + limit < len(order), len(order)
+            else:
+                needle = name_filter.lower()
+                hits = (n for n in names if needle in n.lower()
+                        and (min_level is None or rows[n][0] >= min_level)
+                        and (max_level is None or rows[n][0] <= max_level))
+                picked = list(itertools.islice(hits, offset, offset + limit + 1))
+                more, total = len(picked) > limit, None
+                picked = picked[:limit]
+            return [(n, *rows[n]) for n in picked], total, more
+class JsonStorage:
+    """users.json, one save per player under saves/ and leaderboard.json, each behind a StateJournal."""
+    name = "json"
+    users_loaded = False
+    manifest = None
+    def user_manifest(self) -> UserManifest:
+        if self.manifest is None:
+            self.manifest = UserManifest()
+        return self.manifest
+    def users_journal(self) -> StateJournal:
+        return get_journal(USERS_FILE, lambda: dict(USERS), on_remote=_apply_remote_users)
+    def leaderboard_journal(self) -> StateJournal:
+        return get_journal(
+            LEADERBOARD_FILE,
+            lambda: {name: dict(e) for name, e in get_leaderboard().entries.items()},
+            lambda data: {str(e["name"]): e for e in data if isinstance(e, dict) and e.get("name")} if isinstance(data, list) else {},
+            lambda state: sorted(state.values(), key=lambda e: (-e.get("score", 0), e.get("name", ""))),
+            _apply_remote_leaderboard)
+    def load_users(self) -> dict:
+        users = self.users_journal().load(track=True)
+        self.users_loaded = True
+        return users
+    def save_users(self, users: dict, changed=()) -> bool:
+        """Journal the changed accounts; False if another process changed one of them first (theirs is kept)."""
+        if not self.users_loaded:
+            # first write of a lazily started session: the journal snapshots USERS, so load the rest first
+            pending = {k: users[k] for k in changed if k in users}
+            users = load_users()
+            users.update(pending)
+        if not changed:
+            return self.users_journal().rewrite(users)
+        records = {k: users[k] for k in changed if k in users}
+        lost = []
+        def keep_theirs(key, ours, theirs):
+            lost.append(key)
+            return theirs
+        if not self.users_journal().append(records, [k for k in changed if k not in users], keep_theirs,
+                                           lambda k: USER_INDEX.get(k.lower())):
+            return False
+        for k, record in records.items():
+            if k not in lost:
+                USERS[k] = record
+                USER_INDEX[k.lower()] = k
+            elif USER_INDEX.get(k.lower()) != k:
+                USERS.pop(k, None)
+        return not lost
+    def find_user(self, username: str) -> tuple:
+        """Index lookup after folding in accounts other processes added since the last lookup."""
+        if not self.users_loaded:
+            load_users()
+        else:
+            self.users_journal().refresh()
+        key = USER_INDEX.get(username.lower()) if username else None
+        return (key, USERS[key]) if key is not None else (None, None)
+    def load_player(self, username: str) -> Optional[dict]:
+        return get_journal(player_save_path(username)).load(track=True) or None
+    def save_player(self, username: str, data: dict) -> bool:
+        if not get_journal(player_save_path(username)).commit_diff(data):
+            return False
+        self.user_manifest().record(username, data.get("level", 1), data.get("score", 0))
+        return True
+    def player_exists(self, username: str) -> bool:
+        path = player_save_path(username)
+        return path in JOURNALS or StateJournal(path).exists()
+    def release_player(self, username: str):
+        release_journal(player_save_path(username))
+    def open_leaderboard(self) -> "RankedLeaderboard":
+        entries = (_clean_leaderboard_entry(e) for e in self.leaderboard_journal().load().values())
+        return RankedLeaderboard(e for e in entries if e)
+    def save_leaderboard(self, board) -> bool:
+        if board.cleared:
+            return self.leaderboard_journal().rewrite({})
+        return self.leaderboard_journal().append({n: dict(board.entries[n]) for n in board.changed if n in board.entries},
+                                                 [n for n in board.changed if n not in board.entries], _best_leaderboard_row)
+    def refresh_leaderboard(self):
+        if LEADERBOARD is not None:
+            self.leaderboard_journal().refresh()
+    def user_page(self, *args, **kwargs) -> tuple:
+        """UserManifest.page() over every account."""
+        if not self.users_loaded:
+            load_users()
+        return self.user_manifest().page(*args, **kwargs)
+    def close(self):
+        sync_journals()
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    username_lower TEXT NOT NULL UNIQUE,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    level INTEGER NOT NULL DEFAULT 1,
+    score INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL DEFAULT 0
+);
+DROP INDEX IF EXISTS players_score;
+CREATE INDEX IF NOT EXISTS players_level_name ON players (level, username);
+CREATE INDEX IF NOT EXISTS players_score_name ON players (score, username);
+CREATE INDEX IF NOT EXISTS players_updated_name ON players (updated, username);
+-- every account gets a players row (data '{}' until the first save) so user_page() can sort on the indexed columns
+CREATE TRIGGER IF NOT EXISTS users_player_row AFTER INSERT ON users BEGIN
+    INSERT OR IGNORE INTO players (username, data) VALUES (new.username, '{}');
+END;
+CREATE TABLE IF NOT EXISTS leaderboard (
+    name TEXT PRIMARY KEY,
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    xp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (score DESC, name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+class SqliteStorage:
+    """Accounts, player saves and the leaderboard in one SQLite database (stdlib sqlite3)."""
+    name = "sqlite"
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or SQLITE_FILE
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.commit()
+        if self.query_one("SELECT value FROM meta WHERE key = 'json_migrated'") is None:
+            migrate_json_to_sqlite(self)
+        if self.query_one("SELECT value FROM meta WHERE key = 'player_rows'") is None:
+            with self.lock:
+                self.conn.execute("INSERT OR IGNORE INTO players (username, data) SELECT username, '{}' FROM users")
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('player_rows', '1')")
+                self.conn.commit()
+    def query(self, sql: str, args=()) -> list:
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+    def query_one(self, sql: str, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchone()
+    def write(self, sql: str, rows, commit: bool = True) -> bool:
+        """executemany() in one transaction; commit=False leaves it open for a later commit()."""
+        try:
+            with self.lock:
+                self.conn.executemany(sql, rows)
+                if commit:
+                    self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Error saving {self.path}: {e}")
+            with self.lock:
+                self.conn.rollback()
+            return False
+    def commit(self) -> bool:
+        try:
+            with self.lock:
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Error saving {self.path}: {e}")
+            return False
+    def load_users(self) -> dict:
+        return {u: json.loads(r) for u, r in self.query("SELECT username, record FROM users")}
+    def save_users(self, users: dict, changed=()) -> bool:
+        if not changed:
+            with self.lock:
+                self.conn.execute("DELETE FROM users")
+                return self.write(_SQL_UPSERT_USER, [(u, u.lower(), json.dumps(r)) for u, r in users.items()])
+        gone = [(k,) for k in changed if k not in users]
+        if gone and not self.write("DELETE FROM users WHERE username = ?", gone, commit=False):
+            return False
+        return self.write(_SQL_UPSERT_USER, [(k, k.lower(), json.dumps(users[k])) for k in changed if k in users])
+    def find_user(self, username: str) -> tuple:
+        if not username:
+            return None, None
+        row = self.query_one("SELECT username, record FROM users WHERE username_lower = ?", (username.lower(),))
+        return (row[0], json.loads(row[1])) if row else (None, None)
+    def load_player(self, username: str) -> Optional[dict]:
+        row = self.query_one("SELECT data FROM players WHERE username = ?", (username,))
+        return (json.loads(row[0]) or None) if row else None
+    def save_player(self, username: str, data: dict) -> bool:
+        return self.write(_SQL_UPSERT_PLAYER, [(username, json.dumps(data, ensure_ascii=False),
+                                                data.get("level", 1), data.get("score", 0), time.time())])
+    def player_exists(self, username: str) -> bool:
+        return self.query_one("SELECT 1 FROM players WHERE username = ? AND data != '{}'", (username,)) is not None
+    def release_player(self, username: str):
+        pass
+    def open_leaderboard(self) -> "SqlLeaderboard":
+        return SqlLeaderboard(self)
+    def save_leaderboard(self, board) -> bool:
+        return self.commit()
+    def refresh_leaderboard(self):
+        pass
+    def user_page(self, sort: str = "name", descending: bool = False, offset: int = 0, limit: int = 20,
+                  name_filter: str = "", min_level: Optional[int] = None, max_level: Optional[int] = None) -> tuple:
+        """UserManifest.page() answered from the indexed level/score/updated columns of players."""
+        where, args = [], []
+        if name_filter:
+            where.append("u.username_lower LIKE ? ESCAPE '\\'")
+            args.append("%" + re.sub(r"([%_\\])", r"\\\1", name_filter.lower()) + "%")
+        if min_level is not None:
+            where.append("p.level >= ?"); args.append(min_level)
+        if max_level is not None:
+            where.append("p.level <= ?"); args.append(max_level)
+        column, tiebreak = _SQL_USER_SORTS.get(sort, _SQL_USER_SORTS["name"])
+        direction = "DESC" if descending else "ASC"
+        sql = (f"SELECT u.username, p.level, p.score, p.updated FROM users u "
+               f"JOIN players p ON p.username = u.username {'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY {column} {direction}, {tiebreak} {direction} LIMIT ? OFFSET ?")
+        rows = self.query(sql, args + [limit + 1, offset])
+        total = None if where else self.query_one("SELECT COUNT(*) FROM users")[0]
+        return [tuple(r) for r in rows[:limit]], total, len(rows) > limit
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+_SQL_USER_SORTS = {"name": ("u.username_lower", "u.username"), "level": ("p.level", "p.username"),
+                   "score": ("p.score", "p.username"), "saved": ("p.updated", "p.username")}
+_SQL_UPSERT_USER = ("INSERT INTO users (username, username_lower, record) VALUES (?, ?, ?) "
+                    "ON CONFLICT(username) DO UPDATE SET record = excluded.record")
+_SQL_UPSERT_PLAYER = ("INSERT INTO players (username, data, level, score, updated) VALUES (?, ?, ?, ?, ?) "
+                      "ON CONFLICT(username) DO UPDATE SET data = excluded.data, level = excluded.level, "
+                      "score = excluded.score, updated = excluded.updated")
+_SQL_UPSERT_RANK = ("INSERT INTO leaderboard (name, score, level, xp) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET score = excluded.score, level = excluded.level, xp = excluded.xp")
+class SqlLeaderboard:
+    """RankedLeaderboard interface answered by indexed queries; each update commits on its own."""
+    _COLS = "name, score, level, xp"
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+        self.dirty = 0
+        self.changed = set()
+        self.cleared = False
+        self.last_flush = time.monotonic()
+    def _entries(self, sql: str, args=()) -> list:
+        return [{"name": n, "score": s, "level": l, "xp": x} for n, s, l, x in self.storage.query(sql, args)]
+    def __len__(self):
+        return self.storage.query_one("SELECT COUNT(*) FROM leaderboard")[0]
+    def __iter__(self):
+        return iter(self.to_list())
+    def __contains__(self, name):
+        return self.storage.query_one("SELECT 1 FROM leaderboard WHERE name = ?", (name,)) is not None
+    def get(self, name: str) -> Optional[dict]:
+        rows = self._entries(f"SELECT {self._COLS} FROM leaderboard WHERE name = ?", (name,))
+        return rows[0] if rows else None
+    def update(self, name: str, score: int, level: int = 1, xp: int = 0) -> int:
+        row = (str(name), max(0, int(score)), max(1, int(level)), max(0, int(xp)))
+        self.storage.write(_SQL_UPSERT_RANK, [row])
+        self.dirty += 1
+        self.changed.add(row[0])
+        return self.rank(row[0])
+    def remove(self, name: str) -> bool:
+        found = name in self
+        self.storage.write("DELETE FROM leaderboard WHERE name = ?", [(name,)])
+        self.dirty += 1
+        return found
+    def clear(self):
+        self.storage.write("DELETE FROM leaderboard", [()])
+        self.dirty += 1
+        self.cleared = True
+    def rank(self, name: str) -> Optional[int]:
+        row = self.storage.query_one("SELECT score FROM leaderboard WHERE name = ?", (name,))
+        if row is None:
+            return None
+        return self.storage.query_one("SELECT COUNT(*) FROM leaderboard WHERE score > ? OR (score = ? AND name < ?)",
+                                      (row[0], row[0], name))[0] + 1
+    def top(self, n: int = 10) -> list:
+        return self._entries(f"SELECT {self._COLS} FROM leaderboard ORDER BY score DESC, name LIMIT ?", (n,))
+    def page(self, page: int, size: int = 10) -> list:
+        return self._entries(f"SELECT {self._COLS} FROM leaderboard ORDER BY score DESC, name LIMIT ? OFFSET ?",
+                             (size, (max(1, page) - 1) * size))
+    def around(self, name: str, radius: int = 2) -> list:
+        r = self.rank(name)
+        if r is None:
+            return []
+        start = max(0, r - 1 - radius)
+        rows = self._entries(f"SELECT {self._COLS} FROM leaderboard ORDER BY score DESC, name LIMIT ? OFFSET ?",
+                             (2 * radius + 1, start))
+        return list(enumerate(rows, start + 1))
+    def to_list(self) -> list:
+        return self._entries(f"SELECT {self._COLS} FROM leaderboard ORDER BY score DESC, name")
+def migrate_json_to_sqlite(storage: SqliteStorage) -> dict:
+    """One-shot copy of users.json, saves/ and leaderboard.json into an empty SQLite database."""
+    counts = {"users": 0, "players": 0, "leaderboard": 0}
+    if storage.query_one("SELECT COUNT(*) FROM users")[0] == 0:
+        src = JsonStorage()
+        users = src.users_journal().load()
+        players = []
+        for u in users:
+            data = get_journal(player_save_path(u)).load()
+            if data:
+                p = normalize_player(data).to_dict()
+                players.append((u, json.dumps(p, ensure_ascii=False), p["level"], p["score"], time.time()))
+        board = [_clean_leaderboard_entry(e) for e in src.leaderboard_journal().load().values()]
+        ok = (storage.write(_SQL_UPSERT_USER, [(u, u.lower(), json.dumps(r)) for u, r in users.items()], commit=False)
+              and storage.write(_SQL_UPSERT_PLAYER, players, commit=False)
+              and storage.write(_SQL_UPSERT_RANK, [(e["name"], e["score"], e["level"], e["xp"]) for e in board if e], commit=False))
+        if not ok:
+            return counts
+        counts = {"users": len(users), "players": len(players), "leaderboard": sum(1 for e in board if e)}
+        if any(counts.values()):
+            print(f"📦 Migrated {counts['users']} users, {counts['players']} saves and "
+                  f"{counts['leaderboard']} leaderboard entries into {storage.path}")
+    storage.write("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", [(str(time.time()),)])
+    return counts
+STORAGE_BACKENDS = {"json": JsonStorage, "sqlite": SqliteStorage}
+def get_storage():
+    global STORAGE
+    if STORAGE is None:
+        STORAGE = STORAGE_BACKENDS.get(STORAGE_BACKEND, JsonStorage)()
+    return STORAGE
+def _apply_remote_users(changes: dict, deleted: list, reset: bool):
+    """Fold accounts written by other processes into USERS/USER_INDEX."""
+    if reset:
+        USERS.clear()
+        USER_INDEX.clear()
+    for k in deleted:
+        USERS.pop(k, None)
+        if USER_INDEX.get(k.lower()) == k:
+            del USER_INDEX[k.lower()]
+    for k, record in changes.items():
+        USERS[k] = record
+        USER_INDEX[k.lower()] = k
+def _apply_remote_leaderboard(changes: dict, deleted: list, reset: bool):
+    if LEADERBOARD is not None:
+        LEADERBOARD.merge_remote(changes, deleted, reset)
+def _leaderboard_order(entry: dict) -> tuple:
+    return entry["score"], entry["level"], entry["xp"]
+def _best_leaderboard_row(name: str, ours: dict, theirs: Optional[dict]) -> Optional[dict]:
+    """Two processes ranked the same player: keep the better row."""
+    theirs_clean = _clean_leaderboard_entry(theirs) if theirs is not None else None
+    if theirs_clean is None or _leaderboard_order(ours) >= _leaderboard_order(theirs_clean):
+        return ours
+    return theirs
+def close_storage():
+    """Close the backend if this run ever opened it (a lazy session may never have)."""
+    if STORAGE is not None:
+        STORAGE.close()
+USERS_LOCK = threading.RLock()
+LEADERBOARD_LOCK = threading.RLock()
 def load_users():
-    global USERS
-    data = safe_json_load(USERS_FILE)
-    USERS = data if isinstance(data, dict) else {}
-    return USERS
-def save_users():
-    global USERS
-    return safe_json_write(USERS_FILE, USERS)
+    global USERS, USER_INDEX
+    with USERS_LOCK:
+        with startup_phase("users"):
+            USERS = get_storage().load_users()
+        USER_INDEX = {k.lower(): k for k in USERS}
+        return USERS
+def save_users(*changed: str):
+    """Persist the given accounts; with no names the whole table is rewritten."""
+    with USERS_LOCK:
+        for k in changed:
+            if k in USERS:
+                owner = USER_INDEX.get(k.lower())
+                if owner is None or owner not in USERS:
+                    USER_INDEX[k.lower()] = k
+            elif USER_INDEX.get(k.lower()) == k:
+                del USER_INDEX[k.lower()]
+        if not changed:
+            USER_INDEX.clear()
+            USER_INDEX.update((k.lower(), k) for k in USERS)
+        return get_storage().save_users(USERS, changed)
+def find_user(username: str) -> tuple:
+    """Case-insensitive account lookup: (canonical username, record) or (None, None)."""
+    with USERS_LOCK:
+        key, stored = get_storage().find_user(username)
+        if key is not None:
+            USERS[key] = stored
+            USER_INDEX[key.lower()] = key
+        return key, stored
 def load_admins():
-    global ADMINS
-    data = safe_json_load(ADMINS_FILE)
-    ADMINS = data if isinstance(data, dict) else {}
-    if "admin" not in ADMINS or not isinstance(ADMINS["admin"], dict):
-        ADMINS["admin"] = hash_password("admin123")
-        save_admins()
+    global ADMINS, ADMIN_INDEX
+    with startup_phase("admins"):
+        data = safe_json_load(ADMINS_FILE)
+        ADMINS = data if isinstance(data, dict) else {}
+        if "admin" not in ADMINS or not isinstance(ADMINS["admin"], dict):
+            ADMINS["admin"] = hash_password("admin123")
+            save_admins()
+        ADMIN_INDEX = {k.lower(): k for k in ADMINS}
     return ADMINS
+def find_admin(username: str) -> tuple:
+    """Case-insensitive admin lookup through ADMIN_INDEX: (canonical name, record) or (None, None)."""
+    key = ADMIN_INDEX.get(username.lower()) if username else None
+    return (key, ADMINS[key]) if key in ADMINS else (None, None)
 def save_admins():
     global ADMINS
     return safe_json_write(ADMINS_FILE, ADMINS)
 def load_leaderboard():
     global LEADERBOARD
-    data = safe_json_load(LEADERBOARD_FILE)
-    if not isinstance(data, list):
-        LEADERBOARD = []
-    else:
-        out = []
-        for e in data:
-            if isinstance(e, dict) and e.get("name"):
-                try:
-                    out.append({
-                        "name": str(e["name"]),
-                        "score": max(0, int(e.get("score", 0))),
-                        "level": max(1, int(e.get("level", 1))),
-                        "xp": max(0, int(e.get("xp", 0)))
-                    })
-                except Exception:
-                    continue
-        LEADERBOARD = out[:10]
+    with startup_phase("leaderboard"):
+        LEADERBOARD = get_storage().open_leaderboard()
     return LEADERBOARD
-def save_leaderboard():
-    global LEADERBOARD
-    return safe_json_write(LEADERBOARD_FILE, LEADERBOARD)
+def get_leaderboard() -> "RankedLeaderboard":
+    if LEADERBOARD is None:
+        load_leaderboard()
+    return LEADERBOARD
+def save_leaderboard(force: bool = True):
+    """Write the full ranking; with force=False only once enough updates or time have piled up."""
+    with LEADERBOARD_LOCK:
+        board = get_leaderboard()
+        if not force:
+            if not board.dirty:
+                return True
+            if board.dirty < LEADERBOARD_FLUSH_EVERY and time.monotonic() - board.last_flush < LEADERBOARD_FLUSH_SECONDS:
+                return True
+        if get_storage().save_leaderboard(board):
+            board.dirty = 0
+            board.changed.clear()
+            board.cleared = False
+            board.last_flush = time.monotonic()
+            return True
+        return False
+def flush_leaderboard():
+    with LEADERBOARD_LOCK:
+        if LEADERBOARD is not None and LEADERBOARD.dirty:
+            save_leaderboard()
 def update_leaderboard_with_player(player: dict):
-    if not isinstance(player, dict) or "name" not in player:
+    if not isinstance(player, (dict, Player)) or "name" not in player:
         return False
-    load_leaderboard()
-    LEADERBOARD[:] = [e for e in LEADERBOARD if e.get("name") != player["name"]]
-    LEADERBOARD.append({
-        "name": player["name"],
-        "score": int(player.get("score", 0)),
-        "level": int(player.get("level", 1)),
-        "xp": int(player.get("xp", 0))
-    })
-    LEADERBOARD.sort(key=lambda x: x.get("score", 0), reverse=True)
-    del LEADERBOARD[10:]
-    return save_leaderboard()
-def load_questions():
-    global QUESTIONS
-    data = safe_json_load(QUESTION_FILE)
-    if not isinstance(data, list):
-        sample = [
-            {"question":"What is 2 + 2?","options":["3","4","5","6"],"answer":"4","difficulty":"easy"},
-            {"question":"What is the capital of France?","options":["London","Berlin","Paris","Madrid"],"answer":"Paris","difficulty":"medium"},
-        ]
-        safe_json_write(QUESTION_FILE, sample)
-        QUESTIONS = sample
-        return QUESTIONS
-    valid = []
-    for i, q in enumerate(data):
-        if not isinstance(q, dict):
+    with LEADERBOARD_LOCK:
+        board = get_leaderboard()
+        row = board.get(player["name"])
+        if row and (row["score"], row["level"], row["xp"]) == (player.get("score", 0), player.get("level", 1), player.get("xp", 0)):
+            with PENDING_LOCK:
+                SAVE_STATS["leaderboard_elided"] += 1
+            return True
+        board.update(player["name"], player.get("score", 0), player.get("level", 1), player.get("xp", 0))
+        return save_leaderboard(force=False)
+SAMPLE_QUESTIONS = [
+    {"question":"What is 2 + 2?","options":["3","4","5","6"],"answer":"4","difficulty":"easy"},
+    {"question":"What is the capital of France?","options":["London","Berlin","Paris","Madrid"],"answer":"Paris","difficulty":"medium"},
+]
+QUESTION_LOAD_REPORT = {}
+QUESTION_BANK_STATS = None
+QUESTION_LENGTH_BUCKET = 20
+QUESTION_LENGTH_BUCKETS = 16
+class QuestionBankStats:
+    """Running counts over the bank: difficulty, options per question, answer position and question length."""
+    __slots__ = ("total", "difficulty", "options", "answer_at", "lengths")
+    def __init__(self, bank=()):
+        self.total = 0
+        self.difficulty = {}
+        self.options = {}
+        self.answer_at = {}
+        self.lengths = [0] * QUESTION_LENGTH_BUCKETS
+        for q in bank:
+            self.add(q)
+    def add(self, q: dict):
+        opts = q["options"]
+        diff, at = q.get("difficulty", "medium"), (len(opts), opts.index(q["answer"]))
+        self.total += 1
+        self.difficulty[diff] = self.difficulty.get(diff, 0) + 1
+        self.options[len(opts)] = self.options.get(len(opts), 0) + 1
+        self.answer_at[at] = self.answer_at.get(at, 0) + 1
+        self.lengths[min(len(q["question"]) // QUESTION_LENGTH_BUCKET, QUESTION_LENGTH_BUCKETS - 1)] += 1
+    def state(self) -> dict:
+        """JSON-safe copy for the compiled question cache (the integer and pair keys become rows)."""
+        return {"total": self.total, "difficulty": dict(self.difficulty), "options": [[n, c] for n, c in self.options.items()],
+                "answer_at": [[n, pos, c] for (n, pos), c in self.answer_at.items()], "lengths": list(self.lengths)}
+    @classmethod
+    def from_state(cls, state: dict) -> "QuestionBankStats":
+        stats = cls()
+        stats.total = state["total"]
+        stats.difficulty, stats.lengths = dict(state["difficulty"]), list(state["lengths"])
+        stats.options = {n: c for n, c in state["options"]}
+        stats.answer_at = {(n, pos): c for n, pos, c in state["answer_at"]}
+        return stats
+    def answer_skew(self) -> list:
+        """(position, observed share, share expected if answers were placed at random) per answer slot."""
+        slots = max(self.options, default=0)
+        observed = [0] * slots
+        expected = [0.0] * slots
+        for (n, pos), c in self.answer_at.items():
+            observed[pos] += c
+        for n, c in self.options.items():
+            for pos in range(n):
+                expected[pos] += c / n
+        total = max(1, self.total)
+        return [(pos, observed[pos] / total, expected[pos] / total) for pos in range(slots)]
+def get_question_bank_stats() -> QuestionBankStats:
+    """Stats for the loaded bank; load_questions() and imports keep them current."""
+    global QUESTION_BANK_STATS
+    bank = get_questions()
+    if QUESTION_BANK_STATS is None:
+        QUESTION_BANK_STATS = QuestionBankStats(bank)
+    return QUESTION_BANK_STATS
+def validate_question(q) -> tuple:
+    """Return (normalized question, None) or (None, reject reason)."""
+    if not isinstance(q, dict):
+        return None, "not an object"
+    question = q.get("question", "")
+    answer = q.get("answer", "")
+    options = q.get("options")
+    if not isinstance(question, str) or not question.strip():
+        return None, "missing question"
+    if not isinstance(options, list) or len(options) < 2:
+        return None, "fewer than 2 options"
+    if not isinstance(answer, str) or not answer.strip():
+        return None, "missing answer"
+    answer = answer.strip()
+    if answer not in options:
+        return None, "answer not in options"
+    diff = q.get("difficulty", "medium")
+    diff = diff.lower() if isinstance(diff, str) else "medium"
+    if diff not in ("easy","medium","hard","boss"):
+        diff = "medium"
+    return {"question": question.strip(), "options": options, "answer": answer, "difficulty": diff,
+            "choices": option_choices(options)}, None
+def option_choices(options: list) -> dict:
+    """Normalized option text -> first option index, so answers match without re-normalizing."""
+    choices = {}
+    for i, o in enumerate(options):
+        choices.setdefault(str(o).lower().strip(), i)
+    return choices
+def iter_json_array(f, chunk_size: int = 1 << 16, max_item: int = 1 << 24):
+    """Yield the elements of a top-level JSON array read incrementally from a text file."""
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    eof = not buf
+    pos = 0
+    def skip(chars):
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+    skip(" \t\r\n\ufeff")
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            if end == len(buf) and not eof:
+                raise json.JSONDecodeError("item may continue", buf, end)
+        except json.JSONDecodeError:
+            if eof or len(buf) - pos > max_item:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
             continue
-        question = q.get("question","").strip()
-        options = q.get("options")
-        answer = q.get("answer","").strip()
-        if not question or not isinstance(options, list) or len(options) < 2 or not answer:
+        yield item
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+def iter_jsonl(f):
+    """Yield one object per line of a line-delimited JSON file; unparseable lines yield None."""
+    for line in f:
+        line = line.strip()
+        if not line:
             continue
-        if answer not in options:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+def stream_questions(path: str, chunk_rows: int = 10000, progress=None) -> tuple:
+    """(questions, index, report) from a JSON array or JSONL bank, validated chunk by chunk."""
+    total = os.path.getsize(path)
+    questions = []
+    index = QuestionIndex()
+    stats = QuestionBankStats()
+    report = {"path": path, "rows": 0, "accepted": 0, "rejected": 0, "reasons": {},
+              "bytes_read": 0, "bytes_total": total, "error": None}
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head in " \t\r\n\ufeff":
+            head = f.read(1)
+        f.seek(0)
+        rows = iter_json_array(f) if head == "[" else iter_jsonl(f)
+        chunk = []
+        try:
+            for raw in rows:
+                chunk.append(raw)
+                if len(chunk) >= chunk_rows:
+                    _ingest_question_chunk(chunk, questions, index, stats, report, f, progress)
+                    chunk = []
+        except (ValueError, UnicodeDecodeError) as e:
+            report["error"] = str(e)
+        if chunk or not report["rows"]:
+            _ingest_question_chunk(chunk, questions, index, stats, report, f, progress)
+    index.seal(questions)
+    report["stats"] = stats.state()
+    return questions, index, report
+def _ingest_question_chunk(chunk: list, questions: list, index, stats, report: dict, f, progress=None):
+    reasons = report["reasons"]
+    for raw in chunk:
+        q, reason = validate_question(raw)
+        if q is None:
+            reasons[reason] = reasons.get(reason, 0) + 1
+            report["rejected"] += 1
+        else:
+            index.add(len(questions), q["difficulty"])
+            stats.add(q)
+            questions.append(q)
+            report["accepted"] += 1
+    report["rows"] += len(chunk)
+    try:
+        report["bytes_read"] = min(report["bytes_total"], f.buffer.tell())
+    except (OSError, ValueError):
+        pass
+    if progress:
+        progress(report)
+def _print_load_progress(report: dict):
+    pct = report["bytes_read"] * 100 / max(1, report["bytes_total"])
+    print(f"\r📚 Loading questions... {pct:5.1f}% | {report['accepted']} ok | {report['rejected']} rejected", end="", flush=True)
+QUESTION_CACHE_VERSION = 3
+QUESTION_CACHE_FORMAT = "quicx-question-cache"
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+def load_question_cache(path: str):
+    """(questions, index, report) from the compiled cache next to path, or None if it is stale."""
+    cache = path + QUESTION_CACHE_SUFFIX
+    try:
+        st = os.stat(path)
+        with open(cache, "r", encoding="utf-8") as f:
+            head = json.loads(f.readline())
+            if (not isinstance(head, dict) or head.get("format") != QUESTION_CACHE_FORMAT
+                    or head.get("version") != QUESTION_CACHE_VERSION or head.get("size") != st.st_size):
+                return None
+            if head.get("mtime") != st.st_mtime_ns and head.get("digest") != _file_digest(path):
+                return None
+            collecting = gc.isenabled()
+            gc.disable()  # decoding allocates millions of objects; collections would triple the load time
+            try:
+                body = json.loads(f.read())
+            finally:
+                if collecting:
+                    gc.enable()
+        questions, ids, bounds = body["questions"], array("I", body["ids"]), body["bounds"]
+        if len(ids) != len(questions) or set(bounds) != set(DIFFICULTY_ORDER):
+            return None
+        if head["mtime"] != st.st_mtime_ns:
+            head["mtime"] = st.st_mtime_ns
+            _write_question_cache(cache, head, body)
+        bounds = {d: (int(a), int(b)) for d, (a, b) in bounds.items()}
+        return questions, QuestionIndex.from_layout(questions, ids, bounds), body["report"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log_error(f"Ignoring question cache {cache}: {e}")
+        return None
+def save_question_cache(path: str, stamp: os.stat_result, digest: str, questions: list, index, report: dict) -> bool:
+    """Store the validated bank keyed by the source stat/digest taken before it was parsed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if (st.st_size, st.st_mtime_ns) != (stamp.st_size, stamp.st_mtime_ns):
+        return False
+    ids, bounds = index.layout()
+    head = {"format": QUESTION_CACHE_FORMAT, "version": QUESTION_CACHE_VERSION,
+            "size": st.st_size, "mtime": st.st_mtime_ns, "digest": digest}
+    body = {"questions": questions, "ids": ids.tolist(), "bounds": bounds, "report": report}
+    return _write_question_cache(path + QUESTION_CACHE_SUFFIX, head, body)
+def _write_question_cache(cache: str, head: dict, body: dict) -> bool:
+    tmp = f"{cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(head) + "\n")
+            f.write(json.dumps(body, ensure_ascii=False, separators=(",", ":")))
+        os.replace(tmp, cache)
+        return True
+    except Exception as e:
+        log_error(f"Could not write question cache {cache}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+def compile_questions(path: str) -> tuple:
+    """Validate the bank at path, reusing the compiled cache when the source is unchanged."""
+    cached = load_question_cache(path)
+    if cached is not None:
+        return cached
+    stamp = os.stat(path)
+    digest = _file_digest(path)
+    big = stamp.st_size > 8 * 1024 * 1024
+    questions, index, report = stream_questions(path, progress=_print_load_progress if big else None)
+    if big:
+        print()
+    if questions and not report.get("error"):
+        save_question_cache(path, stamp, digest, questions, index, report)
+    return questions, index, report
+def load_questions():
+    global QUESTIONS, QUESTION_INDEX, QUESTION_LOAD_REPORT, QUESTION_BANK_STATS
+    questions, index, report = [], None, {}
+    if os.path.exists(QUESTION_FILE):
+        try:
+            questions, index, report = compile_questions(QUESTION_FILE)
+        except OSError as e:
+            print(f"⚠️ Error loading {QUESTION_FILE}: {e}")
+    QUESTION_LOAD_REPORT = report
+    if report.get("error"):
+        print(f"⚠️ Error loading {QUESTION_FILE}: {report['error']}")
+    if report.get("rejected"):
+        print(f"⚠️ Skipped {report['rejected']} invalid questions in {QUESTION_FILE}.")
+    if not questions:
+        if report.get("rows"):
+            print("⚠️ No valid questions found. Creating sample questions.")
+        questions = [dict(q) for q in SAMPLE_QUESTIONS]
+        safe_json_write(QUESTION_FILE, questions)
+        index = None
+    QUESTIONS = questions
+    QUESTION_INDEX = index or QuestionIndex(QUESTIONS)
+    QUESTION_BANK_STATS = QuestionBankStats.from_state(report["stats"]) if index and "stats" in report else QuestionBankStats(QUESTIONS)
+    return QUESTIONS
+def get_questions() -> list:
+    """The question bank, loaded on first use."""
+    if not QUESTIONS:
+        with startup_phase("questions"):
+            load_questions()
+    return QUESTIONS
+IMPORT_CHUNK_ROWS = 20_000
+IMPORT_PARALLEL_BYTES = 4 * 1024 * 1024
+QUESTION_EXPORT_FIELDS = ("question", "options", "answer", "difficulty")
+def question_text_fingerprint(text: str) -> int:
+    """64-bit id of a question's text with case and whitespace folded, used to dedupe imports."""
+    norm = " ".join(str(text).lower().split())
+    return int.from_bytes(hashlib.blake2b(norm.encode("utf-8"), digest_size=8).digest(), "little")
+def question_file_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".json": "json"}.get(ext, "jsonl")
+def _csv_question(header: list, row: list) -> dict:
+    """A CSV row as a raw question: options come from option_1..option_N columns or one "|"-separated options column."""
+    rec = dict(zip(header, row))
+    numbered = sorted((k for k in rec if k.startswith("option") and k != "options"), key=lambda k: int(re.sub(r"\D", "", k) or 0))
+    options = [rec[k].strip() for k in numbered if rec[k].strip()]
+    if not options:
+        options = [o.strip() for o in rec.get("options", "").split("|") if o.strip()]
+    return {"question": rec.get("question", ""), "options": options, "answer": rec.get("answer", ""),
+            "difficulty": rec.get("difficulty") or "medium"}
+def _validate_import_chunk(task: tuple) -> tuple:
+    """Worker: ([(text fingerprint, question as a JSON line)], reject reasons, rows seen) for one chunk."""
+    fmt, header, rows = task
+    accepted, reasons = [], {}
+    for raw in rows:
+        if fmt == "jsonl":
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                reasons["unparseable line"] = reasons.get("unparseable line", 0) + 1
+                continue
+        elif fmt == "csv":
+            raw = _csv_question(header, raw)
+        q, reason = validate_question(raw)
+        if q is None:
+            reasons[reason] = reasons.get(reason, 0) + 1
             continue
-        diff = q.get("difficulty","medium").lower()
-        if diff not in ("easy","medium","hard","boss"):
-            diff = "medium"
-        valid.append({"question": question, "options": options, "answer": answer, "difficulty": diff})
-    if not valid:
-        print("⚠️ No valid questions found. Creating sample questions.")
-        load_questions()
+        line = json.dumps({k: q[k] for k in QUESTION_EXPORT_FIELDS}, ensure_ascii=False)
+        accepted.append((question_text_fingerprint(q["question"]), line))
+    return accepted, reasons, len(rows)
+def _import_tasks(path: str, fmt: str, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Chunks of raw rows for _validate_import_chunk(); JSONL lines are parsed by the workers."""
+    if fmt == "csv":
+        import csv
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [h.strip().lower() for h in next(reader, [])]
+            for rows in iter(lambda: list(itertools.islice(reader, chunk_rows)), []):
+                yield fmt, header, rows
     else:
-        QUESTIONS = valid
-    return QUESTIONS
+        with open(path, encoding="utf-8-sig") as f:
+            items = iter_json_array(f) if fmt == "json" else (line for line in f if line.strip())
+            for rows in iter(lambda: list(itertools.islice(items, chunk_rows)), []):
+                yield fmt, None, rows
+def _run_chunks(fn, tasks, workers: Optional[int] = None):
+    """fn over tasks in order on a process pool, with at most two chunks per worker in flight."""
+    if workers == 1 or (workers is None and (os.cpu_count() or 1) < 2):
+        yield from map(fn, tasks)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    limit = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for task in tasks:
+            window.append(pool.submit(fn, task))
+            if len(window) >= limit:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+def _bank_text_fingerprints(path: str) -> set:
+    """Text fingerprints of the bank at path: from the loaded bank or the compiled cache, else one streaming pass."""
+    if QUESTIONS and path == QUESTION_FILE:
+        return {question_text_fingerprint(q["question"]) for q in QUESTIONS}
+    cached = load_question_cache(path)
+    if cached is not None:
+        return {question_text_fingerprint(q["question"]) for q in cached[0]}
+    seen = set()
+    if not os.path.exists(path):
+        return seen
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head in " \t\r\n\ufeff":
+            head = f.read(1)
+        f.seek(0)
+        try:
+            for raw in (iter_json_array(f) if head == "[" else iter_jsonl(f)):
+                if isinstance(raw, dict) and isinstance(raw.get("question"), str):
+                    seen.add(question_text_fingerprint(raw["question"]))
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"⚠️ Error reading {path}: {e}")
+    return seen
+def append_questions(path: str, batches) -> int:
+    """Append batches of JSON-encoded questions to the bank at path under its lock; returns how many were written."""
+    written = 0
+    with FileLock(path):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(b"[\n]\n")
+        with open(path, "r+b") as f:
+            is_array = f.read(64).lstrip(b" \t\r\n\xef\xbb\xbf")[:1] == b"["
+            size = f.seek(0, os.SEEK_END)
+            tail_at = max(0, size - 4096)
+            f.seek(tail_at)
+            tail = f.read()
+            if is_array:
+                body = tail.rstrip()
+                if not body.endswith(b"]"):
+                    raise ValueError(f"{path} does not end with a closing bracket")
+                cut = tail_at + len(body) - 1
+                lead = b"" if body[:-1].rstrip().endswith(b"[") else b",\n"
+                sep, end = b",\n", b"\n]\n"
+            else:
+                cut = size
+                lead = b"\n" if tail and not tail.endswith(b"\n") else b""
+                sep, end = b"\n", b"\n"
+            def restore():
+                f.seek(tail_at)
+                f.truncate()
+                f.write(tail)
+                f.flush()
+            try:
+                f.seek(cut)
+                f.truncate()
+                for batch in batches:
+                    if batch:
+                        f.write(lead + sep.join(line.encode("utf-8") for line in batch))
+                        lead = sep
+                        written += len(batch)
+                if written:
+                    f.write(end)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except BaseException:
+                restore()
+                raise
+            if not written:
+                restore()
+    return written
+def _extend_question_bank(questions: list):
+    """Add questions just appended to QUESTION_FILE to the loaded bank and its stats; the compiled cache is dropped."""
+    global QUESTION_INDEX
+    if QUESTIONS:
+        QUESTIONS.extend(questions)
+        if QUESTION_BANK_STATS is not None:
+            for q in questions:
+                QUESTION_BANK_STATS.add(q)
+        QUESTION_INDEX = QuestionIndex(QUESTIONS)
+    try:
+        os.remove(QUESTION_FILE + QUESTION_CACHE_SUFFIX)
+    except OSError:
+        pass
+def import_questions(path: str, fmt: Optional[str] = None, workers: Optional[int] = None, bank: str = QUESTION_FILE) -> dict:
+    """Validate a CSV/JSONL/JSON file across a process pool and merge the questions not already in bank."""
+    fmt = fmt or question_file_format(path)
+    start = time.perf_counter()
+    report = {"path": path, "format": fmt, "bytes": 0, "bank": 0, "rows": 0, "accepted": 0, "duplicates": 0,
+              "rejected": 0, "reasons": {}, "error": None, "scan_seconds": 0.0, "seconds": 0.0}
+    try:
+        size = report["bytes"] = os.path.getsize(path)
+    except OSError as e:
+        report["error"] = str(e)
+        return report
+    if size < IMPORT_PARALLEL_BYTES:
+        workers = 1
+    seen = _bank_text_fingerprints(bank)
+    report["bank"], report["scan_seconds"] = len(seen), time.perf_counter() - start
+    live = bank == QUESTION_FILE and bool(QUESTIONS)
+    added = []
+    def batches():
+        for accepted, reasons, rows in _run_chunks(_validate_import_chunk, _import_tasks(path, fmt), workers):
+            report["rows"] += rows
+            for reason, n in reasons.items():
+                report["reasons"][reason] = report["reasons"].get(reason, 0) + n
+                report["rejected"] += n
+            fresh = []
+            for fp, line in accepted:
+                if fp in seen:
+                    report["duplicates"] += 1
+                else:
+                    seen.add(fp)
+                    fresh.append(line)
+                    if live:
+                        added.append(validate_question(json.loads(line))[0])
+            if size >= IMPORT_PARALLEL_BYTES:
+                print(f"\r📥 Importing... {report['rows']} rows | {report['duplicates']} duplicates | {report['rejected']} rejected", end="", flush=True)
+            yield fresh
+    try:
+        report["accepted"] = append_questions(bank, batches())
+    except Exception as e:
+        report["error"] = str(e)
+    if size >= IMPORT_PARALLEL_BYTES:
+        print()
+    if report["accepted"] and not report["error"] and bank == QUESTION_FILE:
+        _extend_question_bank(added)
+    report["seconds"] = time.perf_counter() - start
+    return report
+def _export_chunk(task: tuple) -> str:
+    """Worker: one chunk of questions rendered as CSV rows, JSON lines or comma-joined array items."""
+    fmt, width, questions = task
+    if fmt == "csv":
+        import csv
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        for q in questions:
+            opts = list(q["options"])
+            writer.writerow([q["question"]] + opts + [""] * (width - len(opts)) + [q["answer"], q["difficulty"]])
+        return out.getvalue()
+    items = (json.dumps({k: q[k] for k in QUESTION_EXPORT_FIELDS}, ensure_ascii=False) for q in questions)
+    if fmt == "json":
+        return ",\n".join("  " + item for item in items)
+    return "".join(item + "\n" for item in items)
+def export_questions(path: str, fmt: Optional[str] = None, workers: Optional[int] = None) -> dict:
+    """Write the validated bank to path as CSV (option_1..option_N columns), a JSON array or JSONL, rendered across a process pool."""
+    fmt = fmt or question_file_format(path)
+    start = time.perf_counter()
+    bank = get_questions()
+    width = max(get_question_bank_stats().options, default=0)
+    if len(bank) < IMPORT_CHUNK_ROWS * 4:
+        workers = 1
+    tasks = ((fmt, width, bank[i:i + IMPORT_CHUNK_ROWS]) for i in range(0, len(bank), IMPORT_CHUNK_ROWS))
+    report = {"path": path, "format": fmt, "rows": len(bank), "bytes": 0, "error": None}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                f.write(",".join(["question"] + [f"option_{i}" for i in range(1, width + 1)] + ["answer", "difficulty"]) + "\n")
+            elif fmt == "json":
+                f.write("[")
+            sep = "\n"
+            for text in _run_chunks(_export_chunk, tasks, workers):
+                if fmt == "json":
+                    f.write(sep); sep = ",\n"
+                f.write(text)
+            if fmt == "json":
+                f.write("\n]\n")
+        os.replace(tmp, path)
+        report["bytes"] = os.path.getsize(path)
+    except OSError as e:
+        report["error"] = str(e)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    report["seconds"] = time.perf_counter() - start
+    return report
+def print_transfer_report(report: dict, verb: str):
+    if report.get("error"):
+        print(f"⚠️ {verb} failed for {report['path']}: {report['error']}")
+        return
+    secs = max(report["seconds"], 1e-9)
+    rate = f"{report['rows'] / secs:,.0f} rows/s, {report['bytes'] / secs / 1e6:.1f} MB/s"
+    if "accepted" not in report:
+        print(f"✅ Exported {report['rows']} questions to {report['path']} ({report['format']}) in {secs:.2f}s | {rate}")
+        return
+    print(f"📥 {report['path']} ({report['format']}): {report['rows']} rows in {secs:.2f}s | {rate}")
+    print(f"   ✅ Added {report['accepted']} | 🔁 Duplicates {report['duplicates']} | ❌ Rejected {report['rejected']}"
+          f" | bank had {report['bank']} (read in {report['scan_seconds']:.2f}s)")
+    for reason, n in sorted(report["reasons"].items(), key=lambda kv: -kv[1]):
+        print(f"   - {reason}: {n}")
+class QuestionPool:
+    """Read-only view over a slice of question ids; draws without copying the bank."""
+    __slots__ = ("bank", "ids", "start", "stop", "index", "_swaps", "_left")
+    def __init__(self, bank: list, ids=None, start: int = 0, stop: Optional[int] = None, index=None):
+        self.bank = bank
+        self.ids = ids
+        self.index = index
+        self.start = start
+        self.stop = (len(ids) if ids is not None else len(bank)) if stop is None else stop
+        self._swaps = {}
+        self._left = 0
+    def __len__(self):
+        return self.stop - self.start
+    def __getitem__(self, i: int) -> dict:
+        if not 0 <= i < self.stop - self.start:
+            raise IndexError(i)
+        i += self.start
+        return self.bank[self.ids[i] if self.ids is not None else i]
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    def sample(self, k: int, rng=random) -> "QuestionPool":
+        """Pick k distinct questions as a new pool (O(k), no scan of the bank)."""
+        picks = array("I", (self._qid(i) for i in rng.sample(range(len(self)), min(k, len(self)))))
+        return QuestionPool(self.bank, picks)
+    def draw(self, rng=random) -> dict:
+        """Next question of a lazy Fisher-Yates shuffle; reshuffles once every question was drawn."""
+        if self._left <= 0:
+            self._swaps = {}
+            self._left = len(self)
+        j = rng.randrange(self._left)
+        last = self._left - 1
+        pick = self._swaps.get(j, j)
+        self._swaps[j] = self._swaps.pop(last, last)
+        self._left = last
+        return self[pick]
+    def _qid(self, i: int) -> int:
+        i += self.start
+        return self.ids[i] if self.ids is not None else i
+class QuestionIndex:
+    """Question ids grouped by difficulty so every battle pool is one contiguous slice."""
+    __slots__ = ("bank", "ids", "bounds", "views", "_groups", "_fps", "_fp_pos")
+    def __init__(self, bank: Optional[list] = None):
+        self._groups = {d: array("I") for d in DIFFICULTY_ORDER}
+        self._fps = None
+        self._fp_pos = None
+        self.bank = None
+        self.ids = array("I")
+        self.bounds = {}
+        self.views = {}
+        if bank is not None:
+            for i, q in enumerate(bank):
+                self.add(i, q.get("difficulty"))
+            self.seal(bank)
+    def add(self, qid: int, diff: str):
+        self._groups.get(diff, self._groups["medium"]).append(qid)
+    def seal(self, bank: list):
+        """Lay the collected ids out in DIFFICULTY_ORDER and precompute the pool views."""
+        self.bank = bank
+        for d in DIFFICULTY_ORDER:
+            start = len(self.ids)
+            self.ids.extend(self._groups[d])
+            self.bounds[d] = (start, len(self.ids))
+        self._groups = {}
+        self._build_views()
+    @classmethod
+    def from_layout(cls, bank: list, ids: array, bounds: dict) -> "QuestionIndex":
+        """Rebuild a sealed index from ids/bounds saved by layout() without regrouping the bank."""
+        index = cls()
+        index.bank, index.ids, index.bounds = bank, ids, dict(bounds)
+        index._groups = {}
+        index._build_views()
+        return index
+    def layout(self) -> tuple:
+        return self.ids, self.bounds
+    def _build_views(self):
+        self.views = {name: (self.bounds[diffs[0]][0], self.bounds[diffs[-1]][1])
+                      for name, diffs in POOL_DIFFICULTIES.items()}
+        self.views["all"] = (0, len(self.ids))
+    def pool(self, name: str) -> QuestionPool:
+        start, stop = self.views.get(name, self.views["all"])
+        return QuestionPool(self.bank, self.ids, start, stop, self)
+    def count(self, diff: str) -> int:
+        start, stop = self.bounds.get(diff, (0, 0))
+        return stop - start
+    def fingerprints(self) -> tuple:
+        """(sorted question fingerprints, position in ids of each), built on first use."""
+        if self._fps is None:
+            bank = self.bank
+            fps = [question_fingerprint(bank[qid]) for qid in self.ids]
+            order = sorted(range(len(fps)), key=fps.__getitem__)
+            self._fps = array("Q", [fps[pos] for pos in order])
+            self._fp_pos = array("I", order)
+        return self._fps, self._fp_pos
+    def locate(self, fp: int) -> Optional[int]:
+        """Position in ids of the (first) question with this fingerprint."""
+        return next(self.locate_all(fp), None)
+    def locate_all(self, fp: int):
+        """Positions in ids of every copy of the question with this fingerprint."""
+        fps, positions = self.fingerprints()
+        i = bisect.bisect_left(fps, fp)
+        while i < len(fps) and fps[i] == fp:
+            yield positions[i]
+            i += 1
+    def difficulty_at(self, pos: int) -> str:
+        """Difficulty of the question at position pos in ids."""
+        for d in DIFFICULTY_ORDER:
+            if pos < self.bounds[d][1]:
+                return d
+        return DIFFICULTY_ORDER[-1]
+QUESTION_STATS_LIMIT = 512
+QUESTION_MISS_BOOST = 3.0
+QUESTION_RECENCY = 40
+QUESTION_COOLDOWN = 8
+QUESTION_COOLDOWN_FACTOR = 0.02
+_QSTAT_RECORD = struct.Struct("<QHHI")
+def question_fingerprint(q: dict) -> int:
+    """Stable 64-bit id of a question's text, answer and options, independent of its place in the bank."""
+    options = "\x1e".join(sorted(map(str, q.get("options") or ())))
+    text = f"{q.get('question', '')}\x1f{q.get('answer', '')}\x1f{options}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(text, digest_size=8).digest(), "little")
+class QuestionStats:
+    """One player's answers per question fingerprint (asked, missed, last asked), kept for the most recent few hundred."""
+    __slots__ = ("slots", "fps", "asked", "missed", "last", "tick", "revision")
+    def __init__(self):
+        self.slots = {}
+        self.fps = array("Q")
+        self.asked = array("H")
+        self.missed = array("H")
+        self.last = array("I")
+        self.tick = 0
+        self.revision = 0
+    def __len__(self):
+        return len(self.fps)
+    def __contains__(self, fp: int):
+        return fp in self.slots
+    def fingerprints(self):
+        return self.slots.keys()
+    def record(self, fp: int, correct: bool):
+        self.tick += 1
+        i = self.slots.get(fp)
+        if i is None:
+            i = self.slots[fp] = len(self.fps)
+            self.fps.append(fp)
+            self.asked.append(0)
+            self.missed.append(0)
+            self.last.append(0)
+        if self.asked[i] == 0xFFFF:
+            self.asked[i] //= 2
+            self.missed[i] //= 2
+        self.asked[i] += 1
+        if not correct:
+            self.missed[i] += 1
+        self.last[i] = self.tick
+        self.revision += 1
+        if len(self.fps) > QUESTION_STATS_LIMIT * 5 // 4:
+            self._trim()
+    def miss_weight(self, fp: int) -> float:
+        """Sampling weight from the miss rate alone; 1.0 for a question never asked."""
+        i = self.slots.get(fp)
+        if i is None or not self.asked[i]:
+            return 1.0
+        return 0.25 + QUESTION_MISS_BOOST * self.missed[i] / self.asked[i]
+    def weight(self, fp: int) -> float:
+        """miss_weight() damped for questions asked within the last QUESTION_RECENCY answers."""
+        i = self.slots.get(fp)
+        if i is None:
+            return 1.0
+        return self.miss_weight(fp) * min(1.0, 0.1 + (self.tick - self.last[i]) / QUESTION_RECENCY)
+    def _trim(self):
+        keep = sorted(range(len(self.fps)), key=self.last.__getitem__)[-QUESTION_STATS_LIMIT:]
+        self.fps = array("Q", (self.fps[i] for i in keep))
+        self.asked = array("H", (self.asked[i] for i in keep))
+        self.missed = array("H", (self.missed[i] for i in keep))
+        self.last = array("I", (self.last[i] for i in keep))
+        self.slots = {fp: i for i, fp in enumerate(self.fps)}
+    def encode(self) -> str:
+        if not self.fps:
+            return ""
+        buf = bytearray(struct.pack("<I", self.tick))
+        for rec in zip(self.fps, self.asked, self.missed, self.last):
+            buf += _QSTAT_RECORD.pack(*rec)
+        return base64.b64encode(bytes(buf)).decode("ascii")
+    @classmethod
+    def decode(cls, text: str) -> "QuestionStats":
+        stats = cls()
+        if not text:
+            return stats
+        raw = base64.b64decode(text, validate=True)
+        if len(raw) < 4 or (len(raw) - 4) % _QSTAT_RECORD.size:
+            raise ValueError("truncated question stats")
+        stats.tick = struct.unpack_from("<I", raw)[0]
+        for fp, asked, missed, last in _QSTAT_RECORD.iter_unpack(raw[4:]):
+            stats.slots[fp] = len(stats.fps)
+            stats.fps.append(fp)
+            stats.asked.append(asked)
+            stats.missed.append(min(missed, asked))
+            stats.last.append(last)
+        return stats
+class QuestionSampler:
+    """Weighted draws from a QuestionPool through a sparse Fenwick tree over pool positions."""
+    __slots__ = ("pool", "stats", "rng", "n", "top", "total", "tree", "weights", "base", "recent", "cooldown", "_last")
+    def __init__(self, pool: QuestionPool, stats: Optional[QuestionStats] = None, rng=random):
+        self.pool = pool
+        self.stats = stats if isinstance(stats, QuestionStats) else None
+        self.rng = rng
+        self.n = len(pool)
+        self.top = 1 << (self.n.bit_length() - 1) if self.n else 0
+        self.total = float(self.n)
+        self.tree = {}
+        self.weights = {}
+        self.base = {}
+        self.recent = deque()
+        self.cooldown = min(QUESTION_COOLDOWN, self.n // 2)
+        self._last = None
+        if self.stats:
+            for pos, fp in self._known_positions():
+                w = self.stats.weight(fp)
+                if w != 1.0:
+                    self.base[pos] = w
+                    self.set_weight(pos, w)
+    def __len__(self):
+        return self.n
+    def _known_positions(self):
+        """(pool position, fingerprint) of pool questions the player has answered before."""
+        pool, stats = self.pool, self.stats
+        if pool.index is not None and len(stats) < len(pool):
+            for fp in stats.fingerprints():
+                for at in pool.index.locate_all(fp):
+                    if pool.start <= at < pool.stop:
+                        yield at - pool.start, fp
+        else:
+            for pos in range(len(pool)):
+                fp = question_fingerprint(pool[pos])
+                if fp in stats:
+                    yield pos, fp
+    def set_weight(self, pos: int, w: float):
+        d = w - self.weights.get(pos, 1.0)
+        if not d:
+            return
+        if w == 1.0:
+            self.weights.pop(pos, None)
+        else:
+            self.weights[pos] = w
+        self.total += d
+        tree, n = self.tree, self.n
+        i = pos + 1
+        while i <= n:
+            tree[i] = tree.get(i, 0.0) + d
+            i += i & -i
+    def find(self, u: float) -> int:
+        """Position whose cumulative weight range contains u (Fenwick descent)."""
+        tree, n = self.tree, self.n
+        pos, step = 0, self.top
+        while step:
+            nxt = pos + step
+            if nxt <= n:
+                t = (nxt & -nxt) + tree.get(nxt, 0.0)
+                if t <= u:
+                    u -= t
+                    pos = nxt
+            step >>= 1
+        return min(pos, n - 1)
+    def draw(self) -> dict:
+        if not self.n:
+            raise IndexError("draw from an empty question pool")
+        pos = self.find(self.rng.random() * self.total)
+        self._last = pos
+        if self.cooldown:
+            self.set_weight(pos, self.base.get(pos, 1.0) * QUESTION_COOLDOWN_FACTOR)
+            self.recent.append(pos)
+            if len(self.recent) > self.cooldown:
+                old = self.recent.popleft()
+                if old not in self.recent:
+                    self.set_weight(old, self.base.get(old, 1.0))
+        return self.pool[pos]
+    def record(self, correct: bool):
+        """Feed the result for the last drawn question back into the stats and its weight."""
+        pos, self._last = self._last, None
+        if pos is None or self.stats is None:
+            return
+        fp = question_fingerprint(self.pool[pos])
+        self.stats.record(fp, correct)
+        w = self.stats.miss_weight(fp)
+        if w == 1.0:
+            self.base.pop(pos, None)
+        else:
+            self.base[pos] = w
+        if pos not in self.recent:
+            self.set_weight(pos, w)
+def question_pool(diff: str, questions: Optional[list] = None) -> QuestionPool:
+    """Pool for a battle difficulty ("all" for the whole bank) from the prebuilt index."""
+    global QUESTION_INDEX
+    questions = get_questions() if questions is None else questions
+    if QUESTION_INDEX is None or QUESTION_INDEX.bank is not questions:
+        QUESTION_INDEX = QuestionIndex(questions)
+    return QUESTION_INDEX.pool(diff)
 def player_save_path(username: str) -> str:
     safe_username = re.sub(r'[<>:"/\\|?*]', '_', username)
     return os.path.join(SAVE_DIR, f"{safe_username}.json")
-def load_player(username: str) -> dict:
+def player_save_exists(username: str) -> bool:
+    return get_storage().player_exists(username)
+PLAYER_SAVE_WINDOW = 2.0
+SAVE_STATS = {"requested": 0, "written": 0, "elided": 0, "coalesced": 0, "leaderboard_elided": 0}
+PENDING_SAVES = {}
+PENDING_LOCK = threading.Lock()
+PENDING_TIMER = None
+PLAYER_LOCKS = weakref.WeakValueDictionary()
+def player_lock(username: str) -> threading.Lock:
+    """Per-player lock: saves of different players run side by side, each player's stay in order."""
+    with PENDING_LOCK:
+        lock = PLAYER_LOCKS.get(username)
+        if lock is None:
+            lock = PLAYER_LOCKS[username] = threading.Lock()
+        return lock
+def load_player(username: str) -> Player:
     ensure_dirs()
-    data = safe_json_load(player_save_path(username))
+    with player_lock(username):
+        data = get_storage().load_player(username)
     if not data:
         return normalize_player({"name": username})
-    return normalize_player(data)
-def save_player(username: str, player: dict) -> bool:
-    if not isinstance(player, dict):
+    player = normalize_player(data)
+    player.mark_saved(player.revision)
+    return player
+def save_player(username: str, player: Player, force: bool = False) -> bool:
+    """Persist a player if it changed; changes within PLAYER_SAVE_WINDOW of the last write are coalesced."""
+    if isinstance(player, dict):
+        player = normalize_player(player)
+    elif not isinstance(player, Player):
         print("⚠️ Invalid player data")
         return False
-    return safe_json_write(player_save_path(username), normalize_player(player))
+    global PENDING_TIMER
+    with PENDING_LOCK:
+        SAVE_STATS["requested"] += 1
+        if not player.dirty:
+            PENDING_SAVES.pop(username, None)
+            SAVE_STATS["elided"] += 1
+            return True
+        wait = player._saved_at + PLAYER_SAVE_WINDOW - time.monotonic()
+        if not force and wait > 0:
+            # snapshot now, on the caller's thread; the timer must not read a player the game is changing
+            PENDING_SAVES[username] = (player, player.revision, player.to_dict())
+            SAVE_STATS["coalesced"] += 1
+            if PENDING_TIMER is None:
+                PENDING_TIMER = threading.Timer(wait, flush_player_saves)
+                PENDING_TIMER.daemon = True
+                PENDING_TIMER.start()
+            return True
+        PENDING_SAVES.pop(username, None)
+    return _write_player(username, player)
+def _write_player(username: str, player: Player, revision: Optional[tuple] = None, data: Optional[dict] = None) -> bool:
+    """Write the player, or a snapshot of it taken at revision; a snapshot older than the last save is dropped."""
+    if data is None:
+        revision, data = player.revision, player.to_dict()
+    with player_lock(username):
+        saved = player._saved
+        if saved is not None and all(s >= r for s, r in zip(saved, revision)):
+            with PENDING_LOCK:
+                SAVE_STATS["elided"] += 1
+            return True
+        ok = get_storage().save_player(username, data)
+        if ok:
+            player.mark_saved(revision)
+    with PENDING_LOCK:
+        SAVE_STATS["written"] += 1
+    return ok
+def flush_player_saves() -> bool:
+    """Write every coalesced save now."""
+    global PENDING_TIMER
+    with PENDING_LOCK:
+        pending = list(PENDING_SAVES.items())
+        PENDING_SAVES.clear()
+        PENDING_TIMER = None
+    ok = True
+    for username, (player, revision, data) in pending:
+        ok = _write_player(username, player, revision, data) and ok
+    return ok
+def flush_pending_state() -> bool:
+    """Write coalesced player saves and the throttled leaderboard; run at logout and shutdown."""
+    ok = flush_player_saves()
+    flush_leaderboard()
+    return ok
+def save_stats() -> dict:
+    with PENDING_LOCK:
+        return dict(SAVE_STATS, pending=len(PENDING_SAVES))
 def health_bar(current, maximum, length=20):
     try:
         maximum = max(1, int(maximum))
@@ -330,70 +2618,80 @@ def username_valid(username: str) -> bool:
         return False
     return bool(re.match(r'^[A-Za-z0-9_-]+$', username))
 def register_user():
-    load_users()
-    username = safe_input("Choose a username (3-20 chars, letters/numbers/_/- only): ").strip()
+    username = (yield from safe_input("Choose a username (3-20 chars, letters/numbers/_/- only): ")).strip()
     if not username_valid(username):
         print("⚠️ Invalid username format.")
-        press_enter(); return None
-    if any(u.lower() == username.lower() for u in USERS.keys()):
+        yield from press_enter(); return None
+    if (yield Call(find_user, username))[0] is not None:
         print("⚠️ Username already exists.")
-        press_enter(); return None
-    pw = safe_input("Choose a password (minimum 4 characters): ")
+        yield from press_enter(); return None
+    pw = yield from safe_input("Choose a password (minimum 4 characters): ")
     if len(pw) < 4:
-        print("⚠️ Password too short."); press_enter(); return None
-    confirm = safe_input("Confirm password: ")
+        print("⚠️ Password too short."); yield from press_enter(); return None
+    confirm = yield from safe_input("Confirm password: ")
     if pw != confirm:
-        print("⚠️ Passwords do not match."); press_enter(); return None
-    if os.path.exists(player_save_path(username)):
-        print("⚠️ Save file collision detected. Choose different username."); press_enter(); return None
-    USERS[username] = hash_password(pw)
-    if not save_users():
-        print("⚠️ Failed to save user account."); press_enter(); return None
+        print("⚠️ Passwords do not match."); yield from press_enter(); return None
+    if (yield Call(player_save_exists, username)):
+        print("⚠️ Save file collision detected. Choose different username."); yield from press_enter(); return None
+    USERS[username] = yield get_auth().hash_async(pw)
+    if not (yield Call(save_users, username)):
+        if USER_INDEX.get(username.lower()) not in (None, username):
+            print("⚠️ Username already exists.")
+        else:
+            print("⚠️ Failed to save user account.")
+        yield from press_enter(); return None
     player = normalize_player({"name": username})
-    save_player(username, player)
+    yield Call(save_player, username, player)
     print(f"✅ Account created for {username}")
-    press_enter()
+    yield from press_enter()
     return username
 def login_account(is_admin=False):
     if is_admin:
-        load_admins()
-        db = ADMINS
+        yield Call(load_admins)
         role = "Admin"
     else:
-        load_users()
-        db = USERS
         role = "User"
-    username = safe_input(f"{role} username: ").strip()
-    pw = safe_input("Password: ").strip()
+    username = (yield from safe_input(f"{role} username: ")).strip()
+    pw = (yield from safe_input("Password: ")).strip()
     if not username or not pw:
-        print("⚠️ Username and password cannot be empty."); press_enter(); return None
-    key, stored = _find_record_case_insensitive(db, username)
-    if stored and isinstance(stored, dict) and verify_password(pw, stored):
+        print("⚠️ Username and password cannot be empty."); yield from press_enter(); return None
+    key, stored = find_admin(username) if is_admin else (yield Call(find_user, username))
+    if stored and isinstance(stored, dict) and (yield get_auth().verify_async(pw, stored)):
+        if not is_admin and key in ACTIVE_USERS:
+            print("⚠️ This account is already playing in another session."); yield from press_enter(); return None
+        if get_auth().needs_rehash(stored):
+            if is_admin:
+                ADMINS[key] = yield get_auth().hash_async(pw); yield Call(save_admins)
+            else:
+                USERS[key] = yield get_auth().hash_async(pw); yield Call(save_users, key)
         print(f"✅ {role} logged in as {key if key else username}")
-        press_enter()
+        yield from press_enter()
         return key if not is_admin else True
     print("⚠️ Invalid credentials.")
-    press_enter()
+    yield from press_enter()
     return None
 def reset_password():
-    load_users()
-    username = safe_input("Enter your username: ").strip()
+    username = (yield from safe_input("Enter your username: ")).strip()
     if not username:
-        print("⚠️ Username cannot be empty."); press_enter(); return None
-    key, stored = _find_record_case_insensitive(USERS, username)
+        print("⚠️ Username cannot be empty."); yield from press_enter(); return None
+    key, stored = yield Call(find_user, username)
     if not key:
-        print("⚠️ Username not found."); press_enter(); return None
-    new_pw = safe_input("Enter a NEW password (minimum 4 characters): ").strip()
+        print("⚠️ Username not found."); yield from press_enter(); return None
+    new_pw = (yield from safe_input("Enter a NEW password (minimum 4 characters): ")).strip()
     if len(new_pw) < 4:
-        print("⚠️ Password must be at least 4 characters long."); press_enter(); return None
-    confirm = safe_input("Confirm NEW password: ").strip()
+        print("⚠️ Password must be at least 4 characters long."); yield from press_enter(); return None
+    confirm = (yield from safe_input("Confirm NEW password: ")).strip()
     if new_pw != confirm:
-        print("⚠️ Passwords do not match."); press_enter(); return None
-    USERS[key] = hash_password(new_pw)
-    if save_users():
-        print("✅ Password reset successful!"); press_enter(); return key
-    print("⚠️ Failed to save password change."); press_enter(); return None
-def ask_question(q: dict) -> bool:
+        print("⚠️ Passwords do not match."); yield from press_enter(); return None
+    USERS[key] = yield get_auth().hash_async(new_pw)
+    if (yield Call(save_users, key)):
+        print("✅ Password reset successful!"); yield from press_enter(); return key
+    print("⚠️ Failed to save password change."); yield from press_enter(); return None
+def ask_question(q: dict, answer: Optional[dict] = None) -> bool:
+    """Prompt for q; answer, if given, receives the option index picked ("choice", -1 if none) and "attempts"."""
+    if answer is None:
+        answer = {}
+    answer["choice"], answer["attempts"] = -1, 0
     opts = q.get("options", [])
     ans = q.get("answer")
     question_text = q.get("question", "???")
@@ -402,134 +2700,361 @@ def ask_question(q: dict) -> bool:
     print(f"\n❓ {question_text}")
     for i, o in enumerate(opts, 1):
         print(f"   {i}. {o}")
-    if DEV_MODE["show_answers"]:
+    if dev_mode()["show_answers"]:
         print(f"💡 [Answer: {ans}]")
-    opts_norm = [o.lower().strip() for o in opts]
+    choices = q.get("choices") or option_choices(opts)
     ans_norm = ans.lower().strip()
     for attempt in range(3):
-        user_input = safe_input(f"👉 Your answer (attempt {attempt+1}/3): ")
+        answer["attempts"] = attempt + 1
+        user_input = yield from safe_input(f"👉 Your answer (attempt {attempt+1}/3): ")
         if not user_input:
             print("⚠️ Please enter an answer."); continue
         if user_input.isdigit():
             idx = int(user_input) - 1
             if 0 <= idx < len(opts):
+                answer["choice"] = idx
                 return opts[idx] == ans
             print(f"⚠️ Enter a number between 1 and {len(opts)}."); continue
         u = user_input.lower().strip()
         if u == ans_norm:
+            answer["choice"] = choices.get(u, opts.index(ans))
             return True
-        for i, on in enumerate(opts_norm):
-            if u == on:
-                return opts[i] == ans
+        if u in choices:
+            answer["choice"] = choices[u]
+            return opts[choices[u]] == ans
         print("⚠️ Invalid input. Use an option number or exact option text.")
     print(f"⚠️ Max attempts. The correct answer was: {ans}")
     return False
+PROGRESSION_LEVELS = 1000
+PROGRESSION = None
+NUMPY = None
+def _numpy():
+    """numpy if it is installed (imported on first use), else None."""
+    global NUMPY
+    if NUMPY is None:
+        try:
+            import numpy
+            NUMPY = numpy
+        except ImportError:
+            NUMPY = False
+    return NUMPY or None
+def _xp_required_formula(level: int) -> int:
+    if level > 100:
+        return int(50000 + (level - 100) * 1000)
+    base_xp = 120
+    level_multiplier = level ** 1.3
+    bonus = level * 20
+    result = base_xp * level_multiplier + bonus
+    result = max(result, 50 + level * 10)
+    return min(int(result), 1000000)
+def _level_scaling_formula(player_level: int) -> float:
+    if player_level <= 1:
+        return 1.0
+    if player_level <= 5:
+        return 1.0 + (player_level - 1) * 0.3
+    if player_level <= 10:
+        return 2.2 + (player_level - 5) * 0.25
+    return 3.45 + (player_level - 10) * 0.2
+def _chapter_for_level(player_level: int) -> dict:
+    for chapter_id, chapter_data in STORY_CHAPTERS.items():
+        min_level, max_level = chapter_data["range"]
+        if min_level <= player_level <= max_level:
+            return chapter_data
+    return STORY_CHAPTERS[1]
+class ProgressionTables:
+    """Per-level lookups for levels 1..PROGRESSION_LEVELS; cumulative[i] is the XP from level 1 to level i."""
+    __slots__ = ("levels", "xp", "cumulative", "scaling", "chapters", "_np_cumulative")
+    def __init__(self, levels: int = PROGRESSION_LEVELS):
+        self.levels = levels
+        self.xp = [0] + [_xp_required_formula(lv) for lv in range(1, levels + 1)]
+        self.cumulative = [0, 0]
+        for lv in range(1, levels + 1):
+            self.cumulative.append(self.cumulative[-1] + self.xp[lv])
+        self.scaling = [1.0] + [_level_scaling_formula(lv) for lv in range(1, levels + 1)]
+        self.chapters = [STORY_CHAPTERS[1]] + [_chapter_for_level(lv) for lv in range(1, levels + 1)]
+        self._np_cumulative = None
+    def np_cumulative(self):
+        if self._np_cumulative is None:
+            self._np_cumulative = _numpy().asarray(self.cumulative, dtype="int64")
+        return self._np_cumulative
+def progression() -> ProgressionTables:
+    global PROGRESSION
+    if PROGRESSION is None:
+        PROGRESSION = ProgressionTables()
+    return PROGRESSION
 def get_xp_required(level: int) -> int:
     try:
         level = max(1, int(level))
-        if level > 100:
-            return int(50000 + (level - 100) * 1000)
-        base_xp = 120
-        level_multiplier = level ** 1.3
-        bonus = level * 20
-        result = base_xp * level_multiplier + bonus
-        result = max(result, 50 + level * 10)
-        return min(int(result), 1000000)
+        if level <= PROGRESSION_LEVELS:
+            return progression().xp[level]
+        return _xp_required_formula(level)
     except Exception:
         return 1000
+def resolve_xp_gain(level: int, xp: int, gained: int = 0) -> tuple:
+    """Final (level, leftover xp) after adding gained XP, with every level-up applied at once."""
+    t = progression()
+    level = max(1, int(level))
+    total = xp + gained
+    if level <= t.levels:
+        total += t.cumulative[level]
+        if total < t.cumulative[-1]:
+            level = bisect.bisect_right(t.cumulative, total, level) - 1
+            return level, total - t.cumulative[level]
+        level = t.levels + 1
+        total -= t.cumulative[-1]
+    while total >= get_xp_required(level):
+        total -= get_xp_required(level)
+        level += 1
+    return level, total
+def resolve_xp_gains(levels, xps, gains) -> tuple:
+    """resolve_xp_gain() over whole columns as (levels, xps) lists; vectorized with numpy when available."""
+    np = _numpy()
+    if np is None:
+        pairs = [resolve_xp_gain(lv, x, g) for lv, x, g in zip(levels, xps, gains)]
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+    t = progression()
+    cum = t.np_cumulative()
+    lv = np.maximum(np.asarray(levels, dtype="int64"), 1)
+    total = np.asarray(xps, dtype="int64") + np.asarray(gains, dtype="int64")
+    inside = lv <= t.levels
+    total = total + np.where(inside, cum[np.minimum(lv, t.levels)], 0)
+    fits = inside & (total < cum[-1])
+    new_lv = np.where(fits, np.searchsorted(cum, total, side="right") - 1, lv)
+    new_xp = np.where(fits, total - cum[np.minimum(new_lv, t.levels)], total)
+    out_lv, out_xp = new_lv.tolist(), new_xp.tolist()
+    for i in np.flatnonzero(~fits).tolist():
+        out_lv[i], out_xp[i] = resolve_xp_gain(levels[i], xps[i], gains[i])
+    return out_lv, out_xp
 def check_level_up(player: dict) -> bool:
     leveled = False
-    while player["xp"] >= get_xp_required(player["level"]):
+    req = get_xp_required(player["level"])
+    while player["xp"] >= req:
         play_sound(1200, 300)
-        req = get_xp_required(player["level"])
         player["xp"] -= req
         player["level"] += 1
+        req = get_xp_required(player["level"])
         leveled = True
         clear_screen()
         print(f"\n🎉 {player['name']} leveled up! Now Level {player['level']}")
-        print(f"📈 Next level requires: {get_xp_required(player['level'])} XP")
+        print(f"📈 Next level requires: {req} XP")
         while True:
             print("Choose your upgrade:")
             print("1) 🛡️ +15 Max HP")
             print("2) ⚔️ +3 Damage")
             print("3) 💰 +2 Gold per victory bonus")
-            choice = safe_input("👉 Choose (1, 2, or 3): ")
+            choice = yield from safe_input("👉 Choose (1, 2, or 3): ")
             if choice == "1":
-                player["max_hp"] += 15
+                apply_level_up_choice(player, choice)
                 print("🛡️ Max HP increased by 15!"); break
             if choice == "2":
-                player["damage"] += 3
+                apply_level_up_choice(player, choice)
                 print("⚔️ Damage increased by 3!"); break
             if choice == "3":
-                player["gold_bonus"] = player.get("gold_bonus", 0) + 2
+                apply_level_up_choice(player, choice)
                 print("💰 Gold bonus increased by 2 per victory!"); break
             print("⚠️ Please enter 1, 2, or 3.")
-        old_hp = player["hp"]
-        player["hp"] = player["max_hp"]
-        if player["hp"] > old_hp:
-            print(f"❤️ Restored {player['hp'] - old_hp} HP! Now at full health.")
-        press_enter()
+        restored = restore_after_level_up(player)
+        if restored > 0:
+            print(f"❤️ Restored {restored} HP! Now at full health.")
+        yield from press_enter()
     return leveled
+def apply_level_up_choice(player: dict, choice: str) -> bool:
+    """Apply one of the LEVEL_UP_CHOICES upgrades to the player."""
+    if choice not in LEVEL_UP_CHOICES:
+        return False
+    stat, amount = LEVEL_UP_CHOICES[choice]
+    player[stat] = player.get(stat, 0) + amount
+    return True
+def restore_after_level_up(player: dict) -> int:
+    old_hp = player["hp"]
+    player["hp"] = player["max_hp"]
+    return max(0, player["hp"] - old_hp)
 def get_level_scaling_factor(player_level: int) -> float:
-    if player_level <= 1:
-        return 1.0
-    if player_level <= 5:
-        return 1.0 + (player_level - 1) * 0.3
-    if player_level <= 10:
-        return 2.2 + (player_level - 5) * 0.25
-    return 3.45 + (player_level - 10) * 0.2
-def get_enemy_name_variant(base_name: str, player_level: int) -> str:
-    variants = {
-        "Slime": ["Slime","Green Slime","Acid Slime","Giant Slime","Toxic Slime","Crystal Slime","Shadow Slime","Ancient Slime","Void Slime","Primordial Slime"],
-        "Goblin": ["Goblin","Goblin Scout","Goblin Warrior","Goblin Berserker","Goblin Champion","Goblin Chieftain","Goblin Warlord","Goblin King","Demon Goblin","Goblin Overlord"],
-        "Orc": ["Orc","Orc Brute","Orc Warrior","Orc Savage","Orc Destroyer","Orc Warchief","Orc Juggernaut","Orc Warlord","Demon Orc","Orc Titan"],
-        "Dragon": ["Dragon","Young Dragon","Adult Dragon","Elder Dragon","Ancient Dragon","Wyrm Dragon","Shadow Dragon","Void Dragon","Primordial Dragon","Cosmic Dragon"],
-    }
-    lst = variants.get(base_name, [base_name])
+    if isinstance(player_level, int) and 1 <= player_level <= PROGRESSION_LEVELS:
+        return progression().scaling[player_level]
+    return _level_scaling_formula(player_level)
+# fallback stats for a difficulty missing from enemies.json, which ships next to this script
+DEFAULT_ENEMIES = {
+    "easy": {"name": "Slime", "hp": 35, "damage": 6, "xp_reward": 10, "gold_base": 25},
+    "medium": {"name": "Goblin", "hp": 60, "damage": 10, "xp_reward": 20, "gold_base": 40},
+    "hard": {"name": "Orc", "hp": 90, "damage": 16, "xp_reward": 35, "gold_base": 65},
+    "boss": {"name": "Dragon", "hp": 150, "damage": 25, "xp_reward": 75, "gold_base": 120},
+}
+ENEMY_CATALOG = None
+def validate_enemy(e) -> Optional[dict]:
+    """Normalized archetype or None if a field is missing or out of range."""
+    if not isinstance(e, dict) or not isinstance(e.get("name"), str) or not e["name"].strip():
+        return None
+    out = {"name": e["name"].strip()}
+    for k in ("hp", "damage", "xp_reward", "gold_base"):
+        v = e.get(k)
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or v <= 0:
+            return None
+        out[k] = int(v)
+    variants = e.get("variants") or [out["name"]]
+    if not isinstance(variants, list) or not all(isinstance(n, str) and n.strip() for n in variants):
+        return None
+    out["variants"] = [n.strip() for n in variants]
+    return out
+class EnemyTables:
+    """One archetype compiled to per-level columns, hp and damage already scaled."""
+    __slots__ = ("base", "scaled_hp", "scaled_damage", "xp_reward", "gold_base", "names")
+    def __init__(self, base: dict, levels: int = PROGRESSION_LEVELS):
+        self.base = base
+        scaling = progression().scaling
+        self.scaled_hp = [base["hp"] * scaling[lv] for lv in range(levels + 1)]
+        self.scaled_damage = [base["damage"] * scaling[lv] for lv in range(levels + 1)]
+        self.xp_reward = array("q", [0] + [int(base["xp_reward"] * (1 + (lv - 1) * 0.1)) for lv in range(1, levels + 1)])
+        self.gold_base = array("q", [0] + [int(base["gold_base"] * (1 + (lv - 1) * 0.15)) for lv in range(1, levels + 1)])
+        self.names = [base["variants"][0]] + [_variant_for_level(base["variants"], lv) for lv in range(1, levels + 1)]
+    def roll(self, player_level: int, v: float) -> tuple:
+        """(name, hp, damage, xp_reward, gold_base) for a level and variance draw."""
+        base = self.base
+        if isinstance(player_level, int) and 1 <= player_level < len(self.names):
+            hp = int(self.scaled_hp[player_level] * v)
+            dmg = int(self.scaled_damage[player_level] * v)
+            return (self.names[player_level], hp if hp > base["hp"] else base["hp"],
+                    dmg if dmg > base["damage"] else base["damage"],
+                    self.xp_reward[player_level], self.gold_base[player_level])
+        f = get_level_scaling_factor(player_level)
+        return (_variant_for_level(base["variants"], player_level),
+                max(int(base["hp"] * f * v), base["hp"]), max(int(base["damage"] * f * v), base["damage"]),
+                int(base["xp_reward"] * (1 + (player_level - 1) * 0.1)),
+                int(base["gold_base"] * (1 + (player_level - 1) * 0.15)))
+def _variant_for_level(lst: list, player_level: int) -> str:
     if player_level <= 1:
         return lst[0]
     idx = min(len(lst)-1, (player_level-1)//1 if player_level<=10 else 8 + (player_level-10)//3)
     return lst[idx]
-def make_enemy(diff: str, player_level: int=1) -> dict:
-    base = {
-        "easy": {"name":"Slime","hp":35,"damage":6,"xp_reward":10,"gold_base":25},
-        "medium": {"name":"Goblin","hp":60,"damage":10,"xp_reward":20,"gold_base":40},
-        "hard": {"name":"Orc","hp":90,"damage":16,"xp_reward":35,"gold_base":65},
-        "boss": {"name":"Dragon","hp":150,"damage":25,"xp_reward":75,"gold_base":120},
-    }.get(diff, {"name":"Goblin","hp":60,"damage":10,"xp_reward":20,"gold_base":40})
-    f = get_level_scaling_factor(player_level)
-    v = random.uniform(0.9, 1.1)
-    hp = max(int(base["hp"] * f * v), base["hp"])
-    dmg = max(int(base["damage"] * f * v), base["damage"])
+def load_enemies() -> dict:
+    """Read ENEMIES_FILE and compile every archetype; DEFAULT_ENEMIES fills in missing difficulties."""
+    global ENEMY_CATALOG
+    data = safe_json_load(ENEMIES_FILE)
+    if data is None:
+        print(f"⚠️ Could not read {ENEMIES_FILE}; using the built-in enemies.")
+        data = DEFAULT_ENEMIES
+    catalog = {}
+    for diff, default in DEFAULT_ENEMIES.items():
+        entry = validate_enemy(data.get(diff)) if isinstance(data, dict) else None
+        if entry is None:
+            print(f"⚠️ Invalid or missing '{diff}' enemy in {ENEMIES_FILE}; using the default {default['name']}.")
+            entry = validate_enemy(default)
+        catalog[diff] = EnemyTables(entry)
+    if isinstance(data, dict):
+        for diff, e in data.items():
+            if diff not in catalog and validate_enemy(e):
+                catalog[diff] = EnemyTables(validate_enemy(e))
+    ENEMY_CATALOG = catalog
+    return catalog
+def enemy_tables(diff: str) -> EnemyTables:
+    catalog = ENEMY_CATALOG if ENEMY_CATALOG is not None else load_enemies()
+    return catalog.get(diff) or catalog["medium"]
+def get_enemy_name_variant(base_name: str, player_level: int) -> str:
+    catalog = ENEMY_CATALOG if ENEMY_CATALOG is not None else load_enemies()
+    for t in catalog.values():
+        if t.base["name"] == base_name:
+            if isinstance(player_level, int) and 1 <= player_level < len(t.names):
+                return t.names[player_level]
+            return _variant_for_level(t.base["variants"], player_level)
+    return base_name
+def make_enemy(diff: str, player_level: int=1, rng=random) -> dict:
+    name, hp, dmg, xp_reward, gold_base = enemy_tables(diff).roll(player_level, rng.uniform(0.9, 1.1))
     return {
-        "name": get_enemy_name_variant(base["name"], player_level),
+        "name": name,
         "hp": hp,
         "max_hp": hp,
         "damage": dmg,
-        "xp_reward": int(base["xp_reward"] * (1 + (player_level - 1) * 0.1)),
-        "gold_base": int(base["gold_base"] * (1 + (player_level - 1) * 0.15))
+        "xp_reward": xp_reward,
+        "gold_base": gold_base
     }
+def make_enemies(diff: str, levels, n: int = 1, rng=random) -> dict:
+    """Roll n enemies per level as compact columns; row i matches what make_enemy() would roll."""
+    t = enemy_tables(diff)
+    levels = [levels] if isinstance(levels, int) else list(levels)
+    cols = {k: array("q") for k in ("level", "hp", "damage", "xp_reward", "gold_base")}
+    names = []
+    uniform = rng.uniform
+    min_hp, min_dmg = t.base["hp"], t.base["damage"]
+    for lv in levels:
+        if not (isinstance(lv, int) and 1 <= lv < len(t.names)):
+            for _ in range(n):
+                name, hp, dmg, xp_reward, gold_base = t.roll(lv, uniform(0.9, 1.1))
+                names.append(name)
+                cols["level"].append(lv)
+                cols["hp"].append(hp)
+                cols["damage"].append(dmg)
+                cols["xp_reward"].append(xp_reward)
+                cols["gold_base"].append(gold_base)
+            continue
+        sh, sd = t.scaled_hp[lv], t.scaled_damage[lv]
+        draws = [uniform(0.9, 1.1) for _ in range(n)]
+        cols["hp"].extend([max(int(sh * v), min_hp) for v in draws])
+        cols["damage"].extend([max(int(sd * v), min_dmg) for v in draws])
+        cols["level"].extend([lv] * n)
+        cols["xp_reward"].extend([t.xp_reward[lv]] * n)
+        cols["gold_base"].extend([t.gold_base[lv]] * n)
+        names.extend([t.names[lv]] * n)
+    cols["name"] = names
+    return cols
 def get_item_drop_chance(difficulty: str, player_level: int) -> float:
     base = {"easy":0.15,"medium":0.2,"hard":0.25,"boss":0.4}.get(difficulty,0.2)
     level_bonus = min(0.2, player_level * 0.02)
     return base + level_bonus
-def apply_victory_rewards(player: dict, enemy: dict, diff: str):
+def grant_victory_rewards(player: dict, enemy: dict, diff: str, rng=random) -> dict:
+    """Apply XP, gold and item drop for a won battle and return what was granted."""
     xp_reward = enemy.get("xp_reward", 10)
     player["xp"] += xp_reward
-    base_gold = enemy.get("gold_base", random.randint(30,100))
+    base_gold = enemy.get("gold_base", rng.randint(30,100))
     level_bonus = player["level"] * 3
     gb = player.get("gold_bonus", 0)
     total_gold = base_gold + level_bonus + gb
     player["gold"] = player.get("gold", 0) + total_gold
-    print(f"⭐ XP +{xp_reward}")
-    if gb:
-        print(f"💰 Gold +{base_gold} + {level_bonus} (level) + {gb} (bonus) = {total_gold}")
-    else:
-        print(f"💰 Gold +{base_gold} + {level_bonus} (level bonus) = {total_gold}")
-    if random.random() < get_item_drop_chance(diff, player["level"]):
-        item_key = random.choice(list(ITEMS.keys()))
+    item_key = None
+    if rng.random() < get_item_drop_chance(diff, player["level"]):
+        item_key = rng.choice(list(ITEMS.keys()))
         add_item(player, item_key)
-        print(f"🎁 You found a {ITEMS[item_key]['name']}!")
+    return {"xp": xp_reward, "base_gold": base_gold, "level_bonus": level_bonus,
+            "gold_bonus": gb, "gold": total_gold, "item": item_key}
+def apply_victory_rewards(player: dict, enemy: dict, diff: str):
+    r = grant_victory_rewards(player, enemy, diff)
+    print(f"⭐ XP +{r['xp']}")
+    if r["gold_bonus"]:
+        print(f"💰 Gold +{r['base_gold']} + {r['level_bonus']} (level) + {r['gold_bonus']} (bonus) = {r['gold']}")
+    else:
+        print(f"💰 Gold +{r['base_gold']} + {r['level_bonus']} (level bonus) = {r['gold']}")
+    if r["item"]:
+        print(f"🎁 You found a {ITEMS[r['item']]['name']}!")
+def resolve_correct_answer(player: dict, enemy: dict) -> tuple:
+    """Apply a correct answer: combo-boosted hit on the enemy. Returns (damage, score)."""
+    combo_bonus = min(player.get("combo",0), 10)
+    total_damage = player["damage"] + combo_bonus
+    enemy["hp"] = max(0, enemy["hp"] - total_damage)
+    player["combo"] = player.get("combo",0) + 1
+    score_reward = 50 + combo_bonus * 5
+    player["score"] = player.get("score",0) + score_reward
+    return total_damage, score_reward
+def resolve_wrong_answer(player: dict, enemy: dict, god_mode: bool=False) -> tuple:
+    """Apply a wrong answer. Returns (outcome, damage) with outcome god/shield/hit."""
+    player["combo"] = 0
+    if god_mode:
+        return "god", 0
+    if player.get("shield_points", 0) > 0:
+        player["shield_points"] -= 1
+        return "shield", 0
+    dmg = enemy.get("damage", 0)
+    player["hp"] = max(0, player["hp"] - dmg)
+    return "hit", dmg
+def apply_defeat_penalty(player: dict, diff: str, initial_score: int, initial_xp: int) -> int:
+    """Roll back score/XP on non-easy defeats, take the gold penalty and revive. Returns gold lost."""
+    gold_loss = 0
+    if diff in ("medium", "hard", "boss", "random"):
+        player["score"] = initial_score
+        player["xp"] = initial_xp
+        gold_loss = min(player.get("gold", 0) // 4, 100)
+        if gold_loss > 0:
+            player["gold"] = max(0, player.get("gold", 0) - gold_loss)
+    player["hp"] = player["max_hp"] // 4
+    return gold_loss
 def add_item(player: dict, item_key: str, qty: int=1) -> bool:
     if item_key not in ITEMS: return False
     try:
@@ -582,7 +3107,7 @@ def show_inventory(player: dict):
         if available_items:
             print(f"\n📊 Current HP: {health_bar(player['hp'], player['max_hp'], 15)}")
             print("\nPress item letter to use it, or Enter to exit")
-            choice = safe_input("👉 Choose: ").upper()
+            choice = (yield from safe_input("👉 Choose: ")).upper()
             if not choice:
                 break
             if len(choice) == 1:
@@ -592,13 +3117,13 @@ def show_inventory(player: dict):
                     if use_item(player, item_key):
                         if player.get("inventory", {}).get(item_key, 0) <= 0:
                             player["inventory"].pop(item_key, None)
-                        press_enter()
+                        yield from press_enter()
                         continue
             else:
                 print("⚠️ Invalid selection")
-                press_enter()
+                yield from press_enter()
         else:
-            press_enter()
+            yield from press_enter()
             break
 def shop_menu(player: dict):
     while True:
@@ -608,7 +3133,7 @@ def shop_menu(player: dict):
             print(f"{i}. {it['name']:<15} - {it['desc']}\n   Price: {it['price']} gold\n")
         print("0. Exit Shop\n" + "─"*40)
         print(f"💰 Your Gold: {player.get('gold',0)}\n")
-        choice = safe_input("👉 Enter item number to buy (or 0 to exit): ")
+        choice = yield from safe_input("👉 Enter item number to buy (or 0 to exit): ")
         if choice == "0": break
         try:
             idx = int(choice)-1
@@ -616,118 +3141,618 @@ def shop_menu(player: dict):
                 key = list(ITEMS.keys())[idx]
                 it = ITEMS[key]
                 if player.get("gold",0) >= it["price"]:
-                    confirm = safe_input(f"Buy {it['name']} for {it['price']} gold? (Y/n): ").lower()
+                    confirm = (yield from safe_input(f"Buy {it['name']} for {it['price']} gold? (Y/n): ")).lower()
                     if confirm in ('','y','yes'):
                         player["gold"] -= it["price"]
                         add_item(player, key)
                         print(f"✅ Purchased {it['name']}!")
-                        press_enter()
+                        yield from press_enter()
                     else:
-                        print("❌ Purchase cancelled."); press_enter()
+                        print("❌ Purchase cancelled."); yield from press_enter()
                 else:
-                    print("⚠️ Not enough gold!"); press_enter()
+                    print("⚠️ Not enough gold!"); yield from press_enter()
             else:
-                print("⚠️ Invalid item number."); press_enter()
+                print("⚠️ Invalid item number."); yield from press_enter()
         except Exception:
-            print("⚠️ Please enter a valid number."); press_enter()
+            print("⚠️ Please enter a valid number."); yield from press_enter()
+BATTLE_LOG_DIR = "battle_logs"
+BATTLE_LOG_ENABLED = True
+BATTLE_LOG_ROTATE_BYTES = 16 * 1024 * 1024
+BATTLE_LOG_KEEP = 64
+BATTLE_LOG_FLUSH_SECONDS = 1.0
+BATTLE_LOG_MAX_PENDING = 100_000
+BATTLE_LOG_BATCH = 4096
+BATTLE_LOG = None
+EVENT_TURN, EVENT_END = 1, 2
+TURN_CORRECT, TURN_SHIELD, TURN_GOD = 1, 2, 4
+OUTCOME_LOSS, OUTCOME_WIN, OUTCOME_FORFEIT = 0, 1, 2
+OUTCOME_NAMES = ("loss", "win", "forfeit")
+EVENT_DIFFICULTIES = ("easy", "medium", "hard", "boss", "random")
+TURN_EVENT = struct.Struct("<BBHIQQHHBBbB")
+END_EVENT = struct.Struct("<BBHIQHIIB5x")
+EVENT_SIZE = TURN_EVENT.size
+assert END_EVENT.size == EVENT_SIZE == 32
+BATTLE_LOG_HEADER = b"QKEV" + struct.pack("<BBH", 1, EVENT_SIZE, 0)
+BattleTurn = namedtuple("BattleTurn", "kind diff level ts battle question dealt taken combo flags choice attempts")
+BattleEnd = namedtuple("BattleEnd", "kind diff level ts battle turns dealt taken outcome")
+def _event_diff(diff: str) -> int:
+    return EVENT_DIFFICULTIES.index(diff) if diff in EVENT_DIFFICULTIES else 255
+def turn_event(battle_id: int, diff: str, level: int, fp: int, dealt: int, taken: int, combo: int,
+               flags: int, choice: int, attempts: int) -> bytes:
+    """One 32-byte TURN record; counters are clamped to their field widths."""
+    return TURN_EVENT.pack(EVENT_TURN, _event_diff(diff), min(level, 0xFFFF), int(time.time()) & 0xFFFFFFFF,
+                           battle_id, fp, min(dealt, 0xFFFF), min(taken, 0xFFFF), min(combo, 255), flags,
+                           max(-1, min(choice, 127)), min(attempts, 255))
+def end_event(battle_id: int, diff: str, level: int, turns: int, dealt: int, taken: int, outcome: int) -> bytes:
+    """One 32-byte END record closing a battle."""
+    return END_EVENT.pack(EVENT_END, _event_diff(diff), min(level, 0xFFFF), int(time.time()) & 0xFFFFFFFF,
+                          battle_id, min(turns, 0xFFFF), min(dealt, 0xFFFFFFFF), min(taken, 0xFFFFFFFF), outcome)
+class BattleEventLog:
+    """Append-only binary log of battle events, batched and written by a daemon thread with size-based rotation."""
+    def __init__(self, directory: str = BATTLE_LOG_DIR):
+        self.directory = directory
+        self.dropped = 0
+        self.written = 0
+        self._batch = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._fh = None
+        self._size = 0
+        self._seq = 0
+    def emit(self, record: bytes):
+        with self._lock:
+            if len(self._batch) >= BATTLE_LOG_MAX_PENDING:
+                self.dropped += 1
+                return
+            self._batch.append(record)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="battle-log", daemon=True)
+                self._thread.start()
+            if len(self._batch) == BATTLE_LOG_BATCH:
+                self._wake.set()
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(BATTLE_LOG_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+    def flush(self):
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if not batch:
+            return
+        data = b"".join(batch)
+        try:
+            if self._fh is None or self._size + len(data) > BATTLE_LOG_ROTATE_BYTES:
+                self._rotate()
+            self._fh.write(data)
+            self._fh.flush()
+            self._size += len(data)
+            self.written += len(batch)
+        except OSError as e:
+            self.dropped += len(batch)
+            print(f"⚠️ Could not write battle log: {e}")
+    def _rotate(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"battles-{stamp}-{os.getpid()}-{self._seq:04d}.qkev")
+        self._fh = open(path, "ab")
+        self._fh.write(BATTLE_LOG_HEADER)
+        self._size = len(BATTLE_LOG_HEADER)
+        for old in battle_log_files(self.directory)[:-BATTLE_LOG_KEEP]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    def close(self):
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._wake.set()
+            thread.join(timeout=5.0)
+        self.flush()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+def get_battle_log() -> Optional[BattleEventLog]:
+    global BATTLE_LOG
+    if not BATTLE_LOG_ENABLED:
+        return None
+    if BATTLE_LOG is None:
+        BATTLE_LOG = BattleEventLog(BATTLE_LOG_DIR)
+        atexit.register(BATTLE_LOG.close)
+    return BATTLE_LOG
+def battle_log_files(directory: str = BATTLE_LOG_DIR) -> list:
+    """Log files under directory, oldest first (the names start with their creation time)."""
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.startswith("battles-") and n.endswith(".qkev"))
+    except OSError:
+        return []
+    return [os.path.join(directory, n) for n in names]
+def read_battle_events(paths, chunk_records: int = 8192):
+    """Yield BattleTurn/BattleEnd records from log files, skipping a torn record at the end."""
+    chunk = EVENT_SIZE * chunk_records
+    new = tuple.__new__
+    for path in paths:
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            print(f"⚠️ Could not read {path}: {e}"); continue
+        with f:
+            if f.read(len(BATTLE_LOG_HEADER)) != BATTLE_LOG_HEADER:
+                print(f"⚠️ Skipping {path}: not a battle log."); continue
+            while True:
+                buf = f.read(chunk)
+                if not buf:
+                    break
+                view = memoryview(buf)[:len(buf) - len(buf) % EVENT_SIZE]
+                for i, rec in enumerate(TURN_EVENT.iter_unpack(view)):
+                    if rec[0] == EVENT_TURN:
+                        yield new(BattleTurn, rec)
+                    elif rec[0] == EVENT_END:
+                        yield new(BattleEnd, END_EVENT.unpack_from(view, i * EVENT_SIZE))
+def events_between(events, since: Optional[int] = None, until: Optional[int] = None):
+    """Only the events whose timestamp falls in [since, until)."""
+    for e in events:
+        if (since is None or e.ts >= since) and (until is None or e.ts < until):
+            yield e
+def summarize_battles(events, level_bucket: int = 10) -> dict:
+    """Per-question accuracy, win rate by difficulty and level band, and battle length from an event stream."""
+    questions = {}
+    outcomes = {}
+    lengths = {}
+    battles = turns = 0
+    for e in events:
+        if e.kind == EVENT_TURN:
+            row = questions.get(e.question)
+            if row is None:
+                row = questions[e.question] = [0, 0]
+            row[0] += 1
+            row[1] += e.flags & TURN_CORRECT
+        else:
+            band = (e.level - 1) // level_bucket * level_bucket + 1 if e.level else 0
+            row = outcomes.get((e.diff, band))
+            if row is None:
+                row = outcomes[(e.diff, band)] = [0, 0, 0]
+            row[0] += 1
+            row[1] += e.outcome == OUTCOME_WIN
+            row[2] += e.outcome == OUTCOME_FORFEIT
+            length = lengths.get(e.diff)
+            if length is None:
+                length = lengths[e.diff] = [0, 0]
+            length[0] += 1
+            length[1] += e.turns
+            battles += 1
+            turns += e.turns
+    return {"questions": questions, "outcomes": outcomes, "lengths": lengths, "battles": battles,
+            "avg_turns": turns / battles if battles else 0.0, "level_bucket": level_bucket}
+def _event_diff_name(code: int) -> str:
+    return EVENT_DIFFICULTIES[code] if code < len(EVENT_DIFFICULTIES) else "?"
+def print_battle_report(summary: dict, min_asked: int = 5, top: int = 10):
+    print(f"\n📜 Battle log: {summary['battles']} battles, {summary['avg_turns']:.2f} turns on average")
+    print(f"\n⚔️ Win rate by difficulty and level\n" + "─"*56)
+    print(f"{'Difficulty':<10} | {'Levels':>9} | {'Battles':>8} | {'Win%':>6} | {'Forfeit%':>8}")
+    step = summary["level_bucket"]
+    for (diff, band), (n, wins, forfeits) in sorted(summary["outcomes"].items()):
+        levels = f"{band}-{band + step - 1}" if band else "?"
+        print(f"{_event_diff_name(diff):<10} | {levels:>9} | {n:>8} | {wins / n * 100:>5.1f}% | {forfeits / n * 100:>7.1f}%")
+    print(f"\n⏱️ Average battle length\n" + "─"*36)
+    for diff, (n, total) in sorted(summary["lengths"].items()):
+        print(f"{_event_diff_name(diff):<10} | {n:>8} battles | {total / n:>6.2f} turns")
+    rows = [(correct / asked, asked, fp) for fp, (asked, correct) in summary["questions"].items() if asked >= min_asked]
+    if not rows:
+        print(f"\n❓ No question was asked at least {min_asked} times yet."); return
+    get_questions()
+    index = QUESTION_INDEX
+    def label(fp: int) -> str:
+        pos = index.locate(fp) if index is not None else None
+        if pos is None:
+            return f"#{fp:016x}"
+        text = index.bank[index.ids[pos]].get("question", "???")
+        return text if len(text) <= 60 else text[:57] + "..."
+    rows.sort()
+    print(f"\n❓ Per-question accuracy ({len(summary['questions'])} questions seen, {len(rows)} asked {min_asked}+ times)")
+    sections = (("Hardest", rows[:top]), ("Easiest", rows[::-1][:top])) if len(rows) > top else (("Accuracy", rows),)
+    for title, chosen in sections:
+        print(f"\n{title}\n" + "─"*80)
+        for acc, asked, fp in chosen:
+            print(f"{acc * 100:>5.1f}% of {asked:>6} | {label(fp)}")
+CALIBRATION_MIN_ASKED = 20
+CALIBRATION_Z = 3.5
+def calibrate_questions(observed: dict, index, min_asked: int = CALIBRATION_MIN_ASKED, z_limit: float = CALIBRATION_Z) -> dict:
+    """Flag questions whose accuracy in play fits another difficulty better than their label (numpy when available)."""
+    fps, positions = index.fingerprints()
+    stops = [index.bounds[d][1] for d in DIFFICULTY_ORDER]
+    np = _numpy()
+    if np is None:
+        return _calibrate_questions_py(observed, index, fps, positions, stops, min_asked, z_limit)
+    n = len(observed)
+    obs = np.fromiter(observed.keys(), dtype=np.uint64, count=n)
+    counts = np.fromiter((v for row in observed.values() for v in row[:2]), dtype=np.int64, count=2 * n).reshape(n, 2)
+    table = np.frombuffer(fps, dtype=np.uint64) if len(fps) else np.zeros(1, dtype=np.uint64)
+    at = np.minimum(np.searchsorted(table, obs), len(table) - 1)
+    hit = (table[at] == obs) & (len(fps) > 0)
+    pos = np.frombuffer(positions, dtype=np.uint32)[at[hit]] if len(fps) else np.zeros(0, dtype=np.uint32)
+    asked, correct = counts[hit, 0], counts[hit, 1]
+    label = np.searchsorted(np.asarray(stops), pos, side="right")
+    k = len(DIFFICULTY_ORDER)
+    total_asked = np.bincount(label, weights=asked, minlength=k)[:k]
+    total_correct = np.bincount(label, weights=correct, minlength=k)[:k]
+    questions = np.bincount(label, minlength=k)[:k]
+    means = total_correct / np.maximum(total_asked, 1)
+    acc = correct / np.maximum(asked, 1)
+    dist = np.abs(acc[:, None] - means[None, :])
+    dist[:, total_asked == 0] = np.inf
+    suggested = np.argmin(dist, axis=1) if len(acc) else np.zeros(0, dtype=np.int64)
+    mu = means[label]
+    z = (acc - mu) / np.maximum(np.sqrt(mu * (1 - mu) / np.maximum(asked, 1)), 1e-9)
+    flag = np.flatnonzero((asked >= min_asked) & (suggested != label) & (np.abs(z) >= z_limit))
+    flag = flag[np.argsort(-np.abs(z[flag]), kind="stable")]
+    ids = index.ids
+    return {"levels": {d: (int(questions[i]), int(total_asked[i]), float(means[i]))
+                       for i, d in enumerate(DIFFICULTY_ORDER) if questions[i]},
+            "flagged": [(ids[int(pos[i])], DIFFICULTY_ORDER[label[i]], DIFFICULTY_ORDER[suggested[i]],
+                         float(acc[i]), int(asked[i]), float(z[i])) for i in flag.tolist()],
+            "matched": int(hit.sum()), "unmatched": int(n - hit.sum())}
+def _calibrate_questions_py(observed: dict, index, fps, positions, stops, min_asked: int, z_limit: float) -> dict:
+    rows = []
+    for fp, (asked, correct) in observed.items():
+        i = bisect.bisect_left(fps, fp)
+        if i < len(fps) and fps[i] == fp:
+            pos = positions[i]
+            rows.append((pos, bisect.bisect_right(stops, pos), asked, correct))
+    k = len(DIFFICULTY_ORDER)
+    questions, total_asked, total_correct = [0] * k, [0] * k, [0] * k
+    for pos, label, asked, correct in rows:
+        questions[label] += 1
+        total_asked[label] += asked
+        total_correct[label] += correct
+    means = [c / max(a, 1) for a, c in zip(total_asked, total_correct)]
+    present = [d for d in range(k) if total_asked[d]]
+    flagged = []
+    for pos, label, asked, correct in rows:
+        if asked < min_asked:
+            continue
+        acc = correct / asked
+        suggested = min(present, key=lambda d: abs(acc - means[d]))
+        mu = means[label]
+        z = (acc - mu) / max(math.sqrt(mu * (1 - mu) / asked), 1e-9)
+        if suggested != label and abs(z) >= z_limit:
+            flagged.append((index.ids[pos], DIFFICULTY_ORDER[label], DIFFICULTY_ORDER[suggested], acc, asked, z))
+    flagged.sort(key=lambda r: -abs(r[5]))
+    return {"levels": {d: (questions[i], total_asked[i], means[i]) for i, d in enumerate(DIFFICULTY_ORDER) if questions[i]},
+            "flagged": flagged, "matched": len(rows), "unmatched": len(observed) - len(rows)}
+def print_calibration_report(result: dict, bank: list, top: int = 15):
+    print(f"\n🎯 Difficulty calibration ({result['matched']} questions with play data"
+          + (f", {result['unmatched']} no longer in the bank" if result["unmatched"] else "") + ")\n" + "─"*56)
+    for d, (n, asked, acc) in result["levels"].items():
+        print(f"  {d.capitalize():<8} {n:>7} questions | {asked:>9} answers | {acc * 100:5.1f}% correct")
+    flagged = result["flagged"]
+    if not flagged:
+        print("✅ No question looks mislabelled."); return
+    print(f"\n⚠️ {len(flagged)} questions look mislabelled (labelled → suggested):")
+    for qid, labelled, suggested, acc, asked, z in flagged[:top]:
+        text = bank[qid].get("question", "???")
+        text = text if len(text) <= 44 else text[:41] + "..."
+        print(f"  {labelled:>6} → {suggested:<6} {acc * 100:5.1f}% of {asked:>5} (z {z:+.1f}) | {text}")
+BATTLE_CALIBRATION = None
+def battle_calibration(directory: str = BATTLE_LOG_DIR) -> Optional[dict]:
+    """calibrate_questions() over the logs, cached until a log or the bank changes; None without logs."""
+    global BATTLE_CALIBRATION
+    bank = get_questions()
+    key = [id(QUESTION_INDEX), len(bank)]
+    paths = battle_log_files(directory)
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        key.append((path, st.st_size, st.st_mtime_ns))
+    if not paths:
+        return None
+    if BATTLE_CALIBRATION is None or BATTLE_CALIBRATION[0] != key:
+        try:
+            summary = summarize_battles(read_battle_events(paths))
+            BATTLE_CALIBRATION = (key, calibrate_questions(summary["questions"], QUESTION_INDEX))
+        except Exception as e:
+            return {"error": str(e)}
+    return BATTLE_CALIBRATION[1]
+def run_battle_report(directory: str = BATTLE_LOG_DIR, since: Optional[int] = None) -> bool:
+    paths = battle_log_files(directory)
+    if not paths:
+        print(f"⚠️ No battle logs in {directory}."); return False
+    summary = summarize_battles(events_between(read_battle_events(paths), since))
+    print_battle_report(summary)
+    bank = get_questions()
+    print_calibration_report(calibrate_questions(summary["questions"], QUESTION_INDEX), bank)
+    return True
+BATTLE_OPTIONS = ["", "Options:", "[A] Answer question", "[I] Inventory", "[S] Use shop", "[Q] Quit battle (forfeit)"]
+def battle_frame(player: dict, enemy: dict) -> list:
+    """Lines of the battle panel for one turn."""
+    lines = [
+        "╔" + "═"*40 + "╗",
+        f"{('⚔️ Battle vs ' + enemy['name']):^40}",
+        "╚" + "═"*40 + "╝",
+        "",
+        f"🧑 {player['name']}",
+        f"   {health_bar(player['hp'], player['max_hp'])}",
+        f"   ⚔️ Damage: {player['damage']} | 💥 Combo: {player['combo']} | ⭐ XP: {player['xp']}",
+    ]
+    if player.get("shield_points", 0) > 0:
+        lines.append(f"   {shield_bar(player['shield_points'])}")
+    lines += ["", f"👹 {enemy['name']}", f"   {health_bar(enemy['hp'], enemy['max_hp'])}", f"   ⚔️ Damage: {enemy['damage']}", "", "─"*40]
+    return lines
 def battle(player: dict, enemy: dict, qs: list, diff: str="easy") -> bool:
     if not qs:
-        print("⚠️ No questions available for this difficulty."); press_enter(); return False
+        print("⚠️ No questions available for this difficulty."); yield from press_enter(); return False
     initial_score = player.get("score", 0)
     initial_xp = player.get("xp", 0)
     initial_gold = player.get("gold", 0)
     player.setdefault("shield_points", 0)
-    questions_copy = qs.copy()
-    random.shuffle(questions_copy)
-    qidx = 0
+    pool = qs if isinstance(qs, QuestionPool) else QuestionPool(qs)
+    sampler = yield Call(QuestionSampler, pool, player.get("question_stats"))
+    renderer = get_renderer()
+    renderer.clear()
+    log = get_battle_log()
+    battle_id = int.from_bytes(os.urandom(8), "little")
+    level = player.get("level", 1)
+    turns = dealt_total = taken_total = 0
     while player["hp"] > 0 and enemy["hp"] > 0:
-        clear_screen()
-        print("╔" + "═"*40 + "╗")
-        print(f"{('⚔️ Battle vs ' + enemy['name']):^40}")
-        print("╚" + "═"*40 + "╝\n")
-        print(f"🧑 {player['name']}\n   {health_bar(player['hp'], player['max_hp'])}")
-        print(f"   ⚔️ Damage: {player['damage']} | 💥 Combo: {player['combo']} | ⭐ XP: {player['xp']}")
-        if player.get("shield_points", 0) > 0:
-            print(f"   {shield_bar(player['shield_points'])}")
-        print(f"\n👹 {enemy['name']}\n   {health_bar(enemy['hp'], enemy['max_hp'])}\n   ⚔️ Damage: {enemy['damage']}")
-        print("\n" + "─"*40)
-        if DEV_MODE["instant_win"]:
+        if dev_mode()["instant_win"]:
+            renderer.frame(battle_frame(player, enemy))
             print("💻 Dev Mode: Instant Win!"); enemy["hp"] = 0; break
-        print("\nOptions:\n[A] Answer question\n[I] Inventory\n[S] Use shop\n[Q] Quit battle (forfeit)")
-        opt = safe_input("👉 Choose (or press Enter to answer): ").lower()
+        renderer.frame(battle_frame(player, enemy) + BATTLE_OPTIONS)
+        opt = (yield from safe_input("👉 Choose (or press Enter to answer): ")).lower()
         if opt == "i":
-            show_inventory(player); continue
+            yield from show_inventory(player); renderer.clear(); continue
         if opt == "s":
-            shop_menu(player); continue
+            yield from shop_menu(player); renderer.clear(); continue
         if opt == "q":
-            confirm = safe_input("Are you sure you want to forfeit? (y/N): ").lower()
+            confirm = (yield from safe_input("Are you sure you want to forfeit? (y/N): ")).lower()
             if confirm in ['y','yes']:
-                print("You forfeited the battle."); press_enter(); return False
+                if log is not None:
+                    log.emit(end_event(battle_id, diff, level, turns, dealt_total, taken_total, OUTCOME_FORFEIT))
+                print("You forfeited the battle."); yield from press_enter(); return False
             continue
-        if qidx >= len(questions_copy):
-            random.shuffle(questions_copy); qidx = 0
-        q = questions_copy[qidx]; qidx += 1
-        if ask_question(q):
+        q = sampler.draw()
+        answer = {}
+        correct = yield from ask_question(q, answer)
+        sampler.record(correct)
+        dealt = taken = flags = 0
+        if correct:
             play_sound(800, 150)
-            combo_bonus = min(player.get("combo",0), 10)
-            total_damage = player["damage"] + combo_bonus
+            total_damage, score_reward = resolve_correct_answer(player, enemy)
+            dealt, flags = total_damage, TURN_CORRECT
             print(f"✅ Correct! You deal {total_damage} damage!")
-            enemy["hp"] = max(0, enemy["hp"] - total_damage)
-            player["combo"] = player.get("combo",0) + 1
-            score_reward = 50 + combo_bonus * 5
-            player["score"] = player.get("score",0) + score_reward
             print(f"💰 Score +{score_reward}")
-            if check_level_up(player):
+            if (yield from check_level_up(player)):
                 pass
         else:
             play_sound(300, 300)
             print("❌ Wrong answer!")
-            if DEV_MODE["god_mode"]:
+            outcome, dmg = resolve_wrong_answer(player, enemy, dev_mode()["god_mode"])
+            taken = dmg
+            flags = TURN_GOD if outcome == "god" else TURN_SHIELD if outcome == "shield" else 0
+            if outcome == "god":
                 print("💻 Dev Mode: No damage taken!")
+            elif outcome == "shield":
+                print("🛡️ Your shield blocked the attack!")
+                if player["shield_points"] <= 0:
+                    print("🛡️ Shield depleted!")
             else:
-                if player.get("shield_points", 0) > 0:
-                    print("🛡️ Your shield blocked the attack!")
-                    player["shield_points"] -= 1
-                    if player["shield_points"] <= 0:
-                        print("🛡️ Shield depleted!")
-                else:
-                    dmg = enemy.get("damage", 0)
-                    print(f"👹 {enemy['name']} hits you for {dmg} damage!")
-                    player["hp"] = max(0, player["hp"] - dmg)
-            player["combo"] = 0
+                print(f"👹 {enemy['name']} hits you for {dmg} damage!")
+        turns += 1
+        dealt_total += dealt
+        taken_total += taken
+        if log is not None:
+            log.emit(turn_event(battle_id, diff, level, question_fingerprint(q), dealt, taken, player["combo"],
+                                flags, answer["choice"], answer["attempts"]))
+            if enemy["hp"] <= 0 or player["hp"] <= 0:
+                log.emit(end_event(battle_id, diff, level, turns, dealt_total, taken_total,
+                                   OUTCOME_WIN if enemy["hp"] <= 0 else OUTCOME_LOSS))
         if enemy["hp"] <= 0:
             play_sound(1000, 400)
             print(f"\n🎉 Victory! You defeated the {enemy['name']}!")
             apply_victory_rewards(player, enemy, diff)
-            press_enter(); return True
+            yield from press_enter(); return True
         if player["hp"] <= 0:
             play_sound(200, 500)
             print(f"\n💀 Defeat! You were defeated by the {enemy['name']}...")
+            gold_loss = apply_defeat_penalty(player, diff, initial_score, initial_xp)
             if diff in ("medium", "hard", "boss", "random"):
                 print("📉 No score or XP recorded due to defeat!")
-                player["score"] = initial_score
-                player["xp"] = initial_xp
-                gold_loss = min(player.get("gold", 0) // 4, 100)
                 if gold_loss > 0:
-                    player["gold"] = max(0, player.get("gold", 0) - gold_loss)
                     print(f"💸 Lost {gold_loss} gold as penalty!")
-            player["hp"] = player["max_hp"] // 4
             print(f"❤️ Recovered to {player['hp']} HP")
-            press_enter(); return False
-        press_enter()
+            yield from press_enter(); return False
+        yield from press_enter()
     return player["hp"] > 0
+class _RankNode:
+    __slots__ = ("key", "next", "width")
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+class RankedLeaderboard:
+    """All players ordered by score (ties by name) in an indexable skip list."""
+    MAX_LEVELS = 32
+    def __init__(self, entries=()):
+        self.entries = {}
+        self.dirty = 0
+        self.changed = set()
+        self.last_flush = time.monotonic()
+        self.clear()
+        for e in entries:
+            self.update(e["name"], e.get("score", 0), e.get("level", 1), e.get("xp", 0))
+        self.dirty = 0
+        self.changed.clear()
+        self.cleared = False
+    def __len__(self):
+        return self._size
+    def __iter__(self):
+        return self._walk(self._head.next[0], len(self))
+    def __contains__(self, name):
+        return name in self.entries
+    def get(self, name: str) -> Optional[dict]:
+        return self.entries.get(name)
+    def merge_remote(self, rows: dict, deleted=(), reset: bool = False):
+        """Fold in rows other processes saved; a row still waiting to be saved here stays if it ranks higher."""
+        dirty, cleared = self.dirty, self.cleared
+        pending = set(self.changed)
+        if reset:
+            for name in [n for n in self.entries if n not in rows and n not in pending]:
+                self.remove(name)
+        for name in deleted:
+            if name not in pending:
+                self.remove(name)
+        for name, row in rows.items():
+            entry = _clean_leaderboard_entry(row)
+            if entry is None:
+                continue
+            mine = self.entries.get(entry["name"])
+            if entry["name"] in pending and mine is not None and _leaderboard_order(mine) >= _leaderboard_order(entry):
+                continue
+            if mine != entry:
+                self.update(entry["name"], entry["score"], entry["level"], entry["xp"])
+            pending.discard(entry["name"])
+        self.changed = pending
+        self.dirty = dirty if pending else 0
+        self.cleared = cleared
+    def clear(self):
+        self.entries.clear()
+        self._head = _RankNode(None, self.MAX_LEVELS)
+        self._size = 0
+        self._top = 1
+        self.dirty += 1
+        self.changed.clear()
+        self.cleared = True
+    @staticmethod
+    def _key(entry: dict) -> tuple:
+        return (-entry["score"], entry["name"])
+    def _find_chain(self, key):
+        chain = [self._head] * self.MAX_LEVELS
+        steps = [0] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self._top)):
+            nxt = node.next[level]
+            while nxt is not None and nxt.key < key:
+                steps[level] += node.width[level]
+                node = nxt
+                nxt = node.next[level]
+            chain[level] = node
+        return chain, steps
+    def _insert(self, key) -> int:
+        chain, steps_at = self._find_chain(key)
+        levels = min(self.MAX_LEVELS, 1 - int(math.log(1.0 - random.random(), 2.0)))
+        while self._top < levels:
+            self._head.width[self._top] = self._size + 1
+            self._top += 1
+        node = _RankNode(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at[level]
+        for level in range(levels, self._top):
+            chain[level].width[level] += 1
+        self._size += 1
+        return sum(steps_at) + 1
+    def _delete(self, key):
+        chain, _ = self._find_chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = chain[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), self._top):
+            chain[level].width[level] -= 1
+        self._size -= 1
+    def _node_at(self, index: int):
+        """Node at 0-based rank index."""
+        i = index + 1
+        node = self._head
+        for level in reversed(range(self._top)):
+            while node.next[level] is not None and node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node
+    def _walk(self, node, count: int):
+        while node is not None and count > 0:
+            yield self.entries[node.key[1]]
+            node = node.next[0]
+            count -= 1
+    def update(self, name: str, score: int, level: int = 1, xp: int = 0) -> int:
+        """Insert or move a player; returns the new 1-based rank."""
+        entry = {"name": str(name), "score": max(0, int(score)), "level": max(1, int(level)), "xp": max(0, int(xp))}
+        old = self.entries.get(entry["name"])
+        self.dirty += 1
+        self.changed.add(entry["name"])
+        if old is not None and old["score"] == entry["score"]:
+            old.update(entry)
+            return self.rank(entry["name"])
+        if old is not None:
+            self._delete(self._key(old))
+        self.entries[entry["name"]] = entry
+        return self._insert(self._key(entry))
+    def remove(self, name: str) -> bool:
+        old = self.entries.pop(name, None)
+        if old is None:
+            return False
+        self._delete(self._key(old))
+        self.dirty += 1
+        self.changed.add(name)
+        return True
+    def rank(self, name: str) -> Optional[int]:
+        """1-based rank of a player, or None if they have no entry."""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        key = self._key(entry)
+        pos = 0
+        node = self._head
+        for level in reversed(range(self._top)):
+            while node.next[level] is not None and node.next[level].key < key:
+                pos += node.width[level]
+                node = node.next[level]
+        return pos + 1
+    def top(self, n: int = 10) -> list:
+        return list(self._walk(self._head.next[0], n))
+    def page(self, page: int, size: int = 10) -> list:
+        """Entries of a 1-based page of `size` ranks."""
+        start = (max(1, page) - 1) * size
+        if start >= len(self):
+            return []
+        return list(self._walk(self._node_at(start), size))
+    def around(self, name: str, radius: int = 2) -> list:
+        """(rank, entry) pairs for the ranks surrounding a player."""
+        r = self.rank(name)
+        if r is None:
+            return []
+        start = max(0, r - 1 - radius)
+        return list(enumerate(self._walk(self._node_at(start), 2 * radius + 1), start + 1))
+    def to_list(self) -> list:
+        return list(self)
 def get_current_chapter(player_level: int) -> dict:
     """Determine the current story chapter based on player level."""
-    for chapter_id, chapter_data in STORY_CHAPTERS.items():
-        min_level, max_level = chapter_data["range"]
-        if min_level <= player_level <= max_level:
-            return chapter_data
-    return STORY_CHAPTERS[1]
+    if isinstance(player_level, int) and 1 <= player_level <= PROGRESSION_LEVELS:
+        return progression().chapters[player_level]
+    return _chapter_for_level(player_level)
 def show_story_intro():
     """Display the introductory story screen."""
     clear_screen()
     print(STORY_INTRO)
-    press_enter()
+    yield from press_enter()
 def show_battle_story(player: dict, difficulty: str):
     """Display a story snippet before battle based on chapter and difficulty."""
     chapter = get_current_chapter(player["level"])
@@ -736,61 +3761,112 @@ def show_battle_story(player: dict, difficulty: str):
     print(f"📖 {chapter['name']}\n" + "─"*50)
     print(f"{story_text}\n")
     print("─"*50)
-    press_enter()
-def show_leaderboard():
-    load_leaderboard()
+    yield from press_enter()
+def leaderboard_view(username: Optional[str] = None, page: int = 1) -> tuple:
+    """One page of the refreshed board plus the player's rank; run as a Call so the flock stays off the loop."""
+    with LEADERBOARD_LOCK:
+        board = get_leaderboard()
+        get_storage().refresh_leaderboard()
+        return [dict(e) for e in board.page(page, 10)], len(board), board.rank(username) if username else None
+def show_leaderboard(username: Optional[str] = None, page: int = 1):
+    rows, total, rank = yield Call(leaderboard_view, username, page)
     clear_screen()
     print("🏆 Leaderboard\n" + "─"*50)
-    if not LEADERBOARD:
+    if not rows:
         print("No scores yet.")
     else:
-        for i, e in enumerate(LEADERBOARD,1):
+        for i, e in enumerate(rows, (max(1, page) - 1) * 10 + 1):
             name = e.get("name","Unknown")[:10]
             print(f"{i:2}. {name:<10} | Score: {e.get('score',0):<6} | Lv: {e.get('level',1):<3} | XP: {e.get('xp',0)}")
     print("─"*50)
+    if rank:
+        print(f"📍 Your rank: #{rank} of {total}")
 def dev_menu():
+    global SOUND_ENABLED
     while True:
+        flags = dev_mode()
         clear_screen()
         print("🔧 Dev/Admin Menu\n" + "─"*35)
-        print(f"1. God Mode:     {'🟢 ON' if DEV_MODE['god_mode'] else '🔴 OFF'}")
-        print(f"2. Show Answers: {'🟢 ON' if DEV_MODE['show_answers'] else '🔴 OFF'}")
-        print(f"3. Instant Win:  {'🟢 ON' if DEV_MODE['instant_win'] else '🔴 OFF'}")
-        print(f"9. Sound:        {'🟢 ON' if SOUND_ENABLED else '🔴 OFF'}")
+        print(f"1. God Mode:     {'🟢 ON' if flags['god_mode'] else '🔴 OFF'}")
+        print(f"2. Show Answers: {'🟢 ON' if flags['show_answers'] else '🔴 OFF'}")
+        print(f"3. Instant Win:  {'🟢 ON' if flags['instant_win'] else '🔴 OFF'}")
+        print(f"9. Sound:        {'🟢 ON' if sound_enabled() else '🔴 OFF'}")
         print("4. View All Users\n5. Reset Leaderboard\n6. Create Sample Questions\n7. View Questions Statistics\n8. Back to Main Menu")
-        choice = safe_input("👉 Choose: ")
+        choice = yield from safe_input("👉 Choose: ")
         if choice == "1":
-            DEV_MODE["god_mode"] = not DEV_MODE["god_mode"]; print("God Mode toggled."); press_enter()
+            flags["god_mode"] = not flags["god_mode"]; print("God Mode toggled."); yield from press_enter()
         elif choice == "2":
-            DEV_MODE["show_answers"] = not DEV_MODE["show_answers"]; print("Show Answers toggled."); press_enter()
+            flags["show_answers"] = not flags["show_answers"]; print("Show Answers toggled."); yield from press_enter()
         elif choice == "3":
-            DEV_MODE["instant_win"] = not DEV_MODE["instant_win"]; print("Instant Win toggled."); press_enter()
+            flags["instant_win"] = not flags["instant_win"]; print("Instant Win toggled."); yield from press_enter()
         elif choice == "4":
-            load_users(); clear_screen(); print("👥 Registered Users:\n" + "─"*30)
-            if USERS:
-                for i,u in enumerate(USERS.keys(),1):
-                    pd = load_player(u)
-                    print(f"{i:2}. {u:<15} | Lv: {pd.get('level',1):<2} | Score: {pd.get('score',0)}")
-            else:
-                print("No users registered.")
-            press_enter()
+            yield from admin_user_list()
         elif choice == "5":
-            c = safe_input("Reset leaderboard? (y/N): ").lower()
+            c = (yield from safe_input("Reset leaderboard? (y/N): ")).lower()
             if c in ('y','yes'):
-                save_leaderboard(); LEADERBOARD.clear(); safe_json_write(LEADERBOARD_FILE, LEADERBOARD); print("✅ Leaderboard reset.")
+                get_leaderboard().clear(); yield Call(save_leaderboard); print("✅ Leaderboard reset.")
             else:
                 print("❌ Reset cancelled.")
-            press_enter()
+            yield from press_enter()
         elif choice == "6":
-            create_sample_questions(); press_enter()
+            create_sample_questions(); yield from press_enter()
         elif choice == "7":
-            show_question_stats(); press_enter()
+            yield from show_question_stats(); yield from press_enter()
         elif choice == "9":
-            SOUND_ENABLED = not SOUND_ENABLED
-            print("Sound toggled."); press_enter()
+            if CURRENT_SESSION is not None:
+                CURRENT_SESSION.sound = not CURRENT_SESSION.sound
+            else:
+                SOUND_ENABLED = not SOUND_ENABLED
+            print("Sound toggled."); yield from press_enter()
         elif choice == "8":
             break
         else:
-            print("⚠️ Invalid choice."); press_enter()
+            print("⚠️ Invalid choice."); yield from press_enter()
+ADMIN_PAGE_SIZE = 20
+def admin_user_list():
+    """Paged account listing from the storage's user manifest, with sorting and filters."""
+    sort, descending, page = "name", False, 0
+    name_filter, min_level, max_level = "", None, None
+    sorts = list(MANIFEST_COLUMNS)
+    while True:
+        rows, total, more = yield SlowCall(get_storage().user_page, sort, descending, page * ADMIN_PAGE_SIZE,
+                                       ADMIN_PAGE_SIZE, name_filter, min_level, max_level)
+        clear_screen()
+        print("👥 Registered Users\n" + "─"*64)
+        for i, (u, level, score, saved) in enumerate(rows, page * ADMIN_PAGE_SIZE + 1):
+            when = datetime.datetime.fromtimestamp(saved).strftime("%Y-%m-%d %H:%M") if saved else "never"
+            print(f"{i:>7}. {u:<20} | Lv: {level:<4} | Score: {score:<8} | Saved: {when}")
+        if not rows:
+            print("No users match." if name_filter or min_level is not None or max_level is not None else "No users registered.")
+        pages = f" of {max(1, -(-total // ADMIN_PAGE_SIZE))}" if total is not None else ""
+        filters = ", ".join(f for f in (f"name~{name_filter!r}" if name_filter else "",
+                                        f"level {min_level or 1}-{max_level or '∞'}" if min_level or max_level else "") if f)
+        print("─"*64 + f"\nPage {page + 1}{pages} | sort: {sort} {'↓' if descending else '↑'}" + (f" | {filters}" if filters else ""))
+        print("[N]ext [P]rev [G]oto page [S]ort [R]everse [F]ilter name [L]evel range [C]lear | Enter to exit")
+        cmd = (yield from safe_input("👉 Choose: ")).lower()
+        if not cmd:
+            break
+        if cmd == "n" and more:
+            page += 1
+        elif cmd == "p" and page > 0:
+            page -= 1
+        elif cmd == "g":
+            target = yield from safe_input("Page number: ")
+            if target.isdigit() and int(target) > 0:
+                page = int(target) - 1
+        elif cmd == "s":
+            sort, page = sorts[(sorts.index(sort) + 1) % len(sorts)], 0
+        elif cmd == "r":
+            descending, page = not descending, 0
+        elif cmd == "f":
+            name_filter, page = (yield from safe_input("Name contains: ")).strip(), 0
+        elif cmd == "l":
+            lo, _, hi = (yield from safe_input("Level range (e.g. 10-20): ")).partition("-")
+            min_level = int(lo) if lo.strip().isdigit() else None
+            max_level = int(hi) if hi.strip().isdigit() else None
+            page = 0
+        elif cmd == "c":
+            name_filter, min_level, max_level, page = "", None, None, 0
 def create_sample_questions():
     sample_questions = [
         {"question":"What is 2 + 2?","options":["3","4","5","6"],"answer":"4","difficulty":"easy"},
@@ -804,24 +3880,43 @@ def create_sample_questions():
     ]
     if safe_json_write(QUESTION_FILE, sample_questions):
         print(f"✅ Created {QUESTION_FILE} with {len(sample_questions)} sample questions.")
+        if QUESTIONS:
+            load_questions()
     else:
         print(f"⚠️ Failed to create {QUESTION_FILE}")
 def show_question_stats():
+    stats = yield SlowCall(get_question_bank_stats)
     try:
-        qs = load_questions()
         clear_screen()
         print("📊 Question Statistics\n" + "─"*30)
-        total = len(qs)
-        print(f"Total Questions: {total}\nBy Difficulty:")
-        diffs = {}
-        for q in qs:
-            diffs[q.get("difficulty","unknown")] = diffs.get(q.get("difficulty","unknown"),0) + 1
-        for d,c in sorted(diffs.items()):
+        print(f"Total Questions: {stats.total}\nBy Difficulty:")
+        for d,c in sorted(stats.difficulty.items()):
             print(f"  {d.capitalize()}: {c}")
+        print("\nOptions per question:")
+        for n,c in sorted(stats.options.items()):
+            print(f"  {n} options: {c}")
+        print("\nAnswer position (share vs. random placement):")
+        for pos, share, expected in stats.answer_skew():
+            flag = "  ⚠️" if abs(share - expected) > 0.05 else ""
+            print(f"  Option {pos+1}: {share*100:5.1f}% vs {expected*100:5.1f}%{flag}")
+        print("\nQuestion length (characters):")
+        peak = max(stats.lengths) or 1
+        for i, c in enumerate(stats.lengths):
+            if c:
+                lo = i * QUESTION_LENGTH_BUCKET
+                label = f"{lo}-{lo + QUESTION_LENGTH_BUCKET - 1}" if i < QUESTION_LENGTH_BUCKETS - 1 else f"{lo}+"
+                print(f"  {label:>7}: {'█' * max(1, round(c / peak * 20)):<20} {c}")
         print(f"\nFile: {QUESTION_FILE}")
     except Exception as e:
-        print(f"⚠️ Error analyzing questions: {e}")
-def battle_menu(player: dict, username: str, questions: list):
+        print(f"⚠️ Error analyzing questions: {e}"); return
+    calibration = yield SlowCall(battle_calibration)
+    if calibration is None:
+        return
+    if "error" in calibration:
+        print(f"⚠️ Error analyzing battle logs: {calibration['error']}")
+    else:
+        print_calibration_report(calibration, QUESTIONS)
+def battle_menu(player: dict, username: str, questions: Optional[list] = None):
     while True:
         clear_screen()
         print("⚔️ Choose Your Battle!\n" + "─"*30)
@@ -832,79 +3927,89 @@ def battle_menu(player: dict, username: str, questions: list):
         print("5. 🎲 Random Mix    (Mystery)")
         print("6. 🏠 Return to Main Menu")
         print(f"\n📊 Your Stats: Lv.{player['level']} | {health_bar(player['hp'], player['max_hp'], 12)}")
-        diff_choice = safe_input("👉 Choose your challenge: ")
+        diff_choice = yield from safe_input("👉 Choose your challenge: ")
         if diff_choice == "6": break
         mapping = {"1":"easy","2":"medium","3":"hard","4":"boss","5":"random"}
         if diff_choice not in mapping:
-            print("⚠️ Invalid choice."); press_enter(); continue
+            print("⚠️ Invalid choice."); yield from press_enter(); continue
         diff = mapping[diff_choice]
         if player["hp"] <= 0:
-            print("⚠️ You need to heal before battling!"); press_enter(); continue
-        filtered = []
+            print("⚠️ You need to heal before battling!"); yield from press_enter(); continue
+        if questions is None:
+            questions = yield Call(get_questions)
+        filtered = question_pool(diff, questions)
         if diff == "random":
-            all_remaining = [q for q in questions if q.get("difficulty") in ("easy", "medium", "hard")]
-            if not all_remaining:
+            if not filtered:
                 print(f"⚠️ No 'easy', 'medium', or 'hard' questions found in {QUESTION_FILE}.")
                 print("Cannot start Random Battle. Please add questions.")
-                press_enter()
+                yield from press_enter()
                 continue
-            total_questions = min(random.randint(10, 20), len(all_remaining))
-            filtered = random.sample(all_remaining, total_questions)
-        else:
-            if diff == "easy":
-                filtered = [q for q in questions if q.get("difficulty") == "easy"]
-            elif diff == "medium":
-                filtered = [q for q in questions if q.get("difficulty") in ("easy", "medium")]
-            elif diff == "hard":
-                filtered = [q for q in questions if q.get("difficulty") in ("medium", "hard")]
-            elif diff == "boss":
-                filtered = [q for q in questions if q.get("difficulty") == "boss"]
+            filtered = filtered.sample(random.randint(10, 20))
         if not filtered:
             if diff == "boss":
                 print(f"⚠️ CRITICAL: No 'boss' difficulty questions found in {QUESTION_FILE}.")
                 print("Cannot start Boss Battle. Please add boss questions.")
-                press_enter()
+                yield from press_enter()
                 continue
             elif diff != "random":
                 print(f"⚠️ No specific questions found for {diff}, using a general mix.")
-                filtered = questions
+                filtered = question_pool("all", questions)
             if not filtered:
                 print(f"⚠️ CRITICAL: No questions found in {QUESTION_FILE} at all!")
                 print("Cannot start battle. Please add questions.")
-                press_enter()
+                yield from press_enter()
                 continue
         enemy = make_enemy(diff if diff != "random" else "medium", player["level"])
-        show_battle_story(player, diff)
+        yield from show_battle_story(player, diff)
         print(f"\n🎯 Preparing {diff.capitalize()} battle against {enemy['name']}...")
         if diff == "random":
             print("🎲 This battle will feature a random mix of Easy, Medium, and Hard questions!")
         print(f"👹 Enemy: {health_bar(enemy['hp'], enemy['max_hp'], 12)} | ⚔️ {enemy['damage']}")
-        confirm = safe_input("Ready to fight? (Y/n): ").lower()
+        confirm = (yield from safe_input("Ready to fight? (Y/n): ")).lower()
         if confirm not in ('','y','yes'):
-            print("❌ Battle cancelled."); press_enter(); continue
-        result = battle(player, enemy, filtered, diff)
-        save_player(username, player)
-        update_leaderboard_with_player(player)
+            print("❌ Battle cancelled."); yield from press_enter(); continue
+        result = yield from battle(player, enemy, filtered, diff)
+        yield Call(save_player, username, player)
+        yield Call(update_leaderboard_with_player, player)
         if result:
             if diff == "boss":
-                print("🎉 Congratulations! You've defeated a mighty boss!"); press_enter(); break
+                print("🎉 Congratulations! You've defeated a mighty boss!"); yield from press_enter(); break
             else:
                 while True:
                     print("\n🎉 Victory! What would you like to do next?")
                     print("1. Choose different difficulty\n2. Return to main menu")
-                    next_action = safe_input("👉 Choose: ")
+                    next_action = yield from safe_input("👉 Choose: ")
                     if next_action in ("1","2"): break
                     print("⚠️ Invalid choice.")
                 if next_action == "1":
                     continue
                 return
         else:
-            print("💀 Perhaps try an easier difficulty or heal up first..."); press_enter(); break
-def player_game_loop(player: dict, username: str, questions: list):
+            print("💀 Perhaps try an easier difficulty or heal up first..."); yield from press_enter(); break
+def player_game_loop(player: dict, username: str, questions: Optional[list] = None):
+    ACTIVE_USERS.add(username)
+    try:
+        yield from _player_game_loop(player, username, questions)
+    except BaseException:
+        persist_later(close_player_session, username, player)
+        raise
+    yield Call(close_player_session, username)
+def close_player_session(username: str, player=None):
+    """Final save (when player is given) and release of the player's journal once they leave."""
+    try:
+        if player is not None:
+            save_player(username, player, True)
+            update_leaderboard_with_player(player)
+        flush_pending_state()
+        with player_lock(username):
+            get_storage().release_player(username)
+    finally:
+        ACTIVE_USERS.discard(username)
+def _player_game_loop(player: dict, username: str, questions: Optional[list] = None):
     if not player.get("story_shown", False):
-        show_story_intro()
+        yield from show_story_intro()
         player["story_shown"] = True
-        save_player(username, player)
+        yield Call(save_player, username, player)
     while True:
         clear_screen()
         req = get_xp_required(player['level'])
@@ -916,86 +4021,663 @@ def player_game_loop(player: dict, username: str, questions: list):
         print(f"   💰 Gold: {player.get('gold', 0)} | 🏆 Score: {player['score']}\n")
         print(f"📖 Current Chapter: {chapter['name']}\n")
         print("🎮 Game Menu:\n1. 🗡️  Battle Enemies\n2. 🏆 View Leaderboard\n3. 🎒 Inventory\n4. 🏪 Visit Shop\n5. 📖 Read Story Intro\n6. 💾 Save & Logout")
-        choice = get_valid_choice("\n👉 Choose your action: ", ["1","2","3","4","5","6"])
+        choice = yield from get_valid_choice("\n👉 Choose your action: ", ["1","2","3","4","5","6"])
         if choice == "1":
-            battle_menu(player, username, questions)
+            yield from battle_menu(player, username, questions)
         elif choice == "2":
-            show_leaderboard(); press_enter()
+            yield from show_leaderboard(username); yield from press_enter()
         elif choice == "3":
-            show_inventory(player); save_player(username, player)
+            yield from show_inventory(player); yield Call(save_player, username, player)
         elif choice == "4":
-            shop_menu(player); save_player(username, player)
+            yield from shop_menu(player); yield Call(save_player, username, player)
         elif choice == "5":
-            show_story_intro()
+            yield from show_story_intro()
         elif choice == "6":
             print("💾 Saving your progress...")
-            if save_player(username, player):
-                update_leaderboard_with_player(player)
+            if (yield Call(save_player, username, player, True)):
+                yield Call(update_leaderboard_with_player, player)
+                yield Call(flush_pending_state)
                 print("✅ Game saved successfully!")
             else:
                 print("⚠️ Error saving game!")
-            print("👋 See you next time!"); press_enter(); break
+            print("👋 See you next time!"); yield from press_enter(); break
         else:
-            print("⚠️ Invalid choice."); press_enter()
+            print("⚠️ Invalid choice."); yield from press_enter()
+SERVER_IDLE_TIMEOUT = 900.0
+SERVER_PERSIST_WORKERS = 16
+SERVER_REPORT_WORKERS = 2
+class Session:
+    """One network player: buffered output, the peer it belongs to and its own dev/sound flags."""
+    __slots__ = ("peer", "out", "renderer", "dev", "sound")
+    def __init__(self, peer):
+        self.peer = peer
+        self.out = []
+        self.renderer = TerminalRenderer()
+        self.dev = {"god_mode": False, "show_answers": False, "instant_win": False}
+        self.sound = False
+class _SessionStdout:
+    """sys.stdout stand-in: prints made on the event-loop thread go to the session being stepped."""
+    def __init__(self, real, loop_thread: int):
+        self.real = real
+        self.loop_thread = loop_thread
+    def write(self, text: str) -> int:
+        if CURRENT_SESSION is not None and threading.get_ident() == self.loop_thread:
+            CURRENT_SESSION.out.append(text)
+            return len(text)
+        return self.real.write(text)
+    def flush(self):
+        if CURRENT_SESSION is None:
+            self.real.flush()
+    def __getattr__(self, name):
+        return getattr(self.real, name)
+def _step_session(session: Session, flow, value):
+    """Advance a session coroutine to its next request; (True, None) once it finished."""
+    global CURRENT_SESSION
+    CURRENT_SESSION = session
+    try:
+        return False, flow.send(value)
+    except StopIteration:
+        return True, None
+    finally:
+        CURRENT_SESSION = None
+async def _serve_session(reader, writer):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    session = Session(writer.get_extra_info("peername"))
+    flow = main_menu()
+    value = None
+    try:
+        while True:
+            done, req = _step_session(session, flow, value)
+            if session.out:
+                writer.write("".join(session.out).encode("utf-8"))
+                session.out.clear()
+            if done:
+                break
+            if isinstance(req, Call):
+                pool = REPORT_POOL if isinstance(req, SlowCall) else PERSIST_POOL
+                value = await loop.run_in_executor(pool, req.fn, *req.args)
+            elif isinstance(req, Future):
+                value = await asyncio.wrap_future(req)
+            else:
+                writer.write(str(req).encode("utf-8"))
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), SERVER_IDLE_TIMEOUT)
+                if not line:
+                    break
+                value = line.decode("utf-8", "replace").rstrip("\r\n")
+        await writer.drain()
+    except (ConnectionError, asyncio.TimeoutError, ValueError):
+        pass
+    except Exception as e:
+        log_error(f"Session {session.peer} crashed: {e}", exc_info=True)
+    finally:
+        _step_close(session, flow)
+        writer.close()
+def _step_close(session: Session, flow):
+    global CURRENT_SESSION
+    CURRENT_SESSION = session
+    try:
+        flow.close()
+    finally:
+        CURRENT_SESSION = None
+def serve(host: str = "127.0.0.1", port: int = 7777):
+    """Host the game for many players over line-oriented TCP (try: nc HOST PORT, or --connect)."""
+    import asyncio
+    global PERSIST_POOL, REPORT_POOL, SOUND_ENABLED, AUDIO
+    SOUND_ENABLED = False
+    AUDIO = NullAudioBackend()
+    start_game()
+    with startup_phase("questions"):
+        get_questions()
+        QUESTION_INDEX.fingerprints()
+    with startup_phase("leaderboard"):
+        get_leaderboard()
+    PERSIST_POOL = ThreadPoolExecutor(max_workers=SERVER_PERSIST_WORKERS, thread_name_prefix="persist")
+    REPORT_POOL = ThreadPoolExecutor(max_workers=SERVER_REPORT_WORKERS, thread_name_prefix="report")
+    real_stdout = sys.stdout
+    async def run():
+        sys.stdout = _SessionStdout(real_stdout, threading.get_ident())
+        server = await asyncio.start_server(_serve_session, host, port, backlog=1024)
+        print(f"🌐 Quicx Knight server listening on {host}:{port} with {len(QUESTIONS)} questions")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped.")
+    finally:
+        sys.stdout = real_stdout
+        REPORT_POOL.shutdown(wait=True)
+        PERSIST_POOL.shutdown(wait=True)
+        PERSIST_POOL = REPORT_POOL = None
+        flush_pending_state()
+def run_client(host: str, port: int):
+    """Minimal line client for serve(): shows what arrives and sends each typed line."""
+    import socket
+    with socket.create_connection((host, port)) as sock:
+        def pump():
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                sys.stdout.write(data.decode("utf-8", "replace"))
+                sys.stdout.flush()
+            print("\n🔌 Connection closed.")
+        reader = threading.Thread(target=pump, daemon=True)
+        reader.start()
+        try:
+            for line in sys.stdin:
+                if not reader.is_alive():
+                    break
+                sock.sendall(line.encode("utf-8"))
+        except (KeyboardInterrupt, OSError):
+            pass
+def _parse_address(text: str, default_host: str = "127.0.0.1") -> tuple:
+    host, _, port = text.rpartition(":")
+    return host or default_host, int(port)
+class FixedAccuracy:
+    """Answer-accuracy model: the same chance of a correct answer for every question."""
+    def __init__(self, p: float = 0.75):
+        self.p = max(0.0, min(1.0, float(p)))
+    def __call__(self, player: dict, question_diff: str) -> float:
+        return self.p
+class DifficultyAccuracy:
+    """Answer-accuracy model keyed by question difficulty, optionally improving with level."""
+    def __init__(self, rates: Optional[dict] = None, level_gain: float = 0.0, cap: float = 0.98):
+        self.rates = rates or {"easy": 0.9, "medium": 0.75, "hard": 0.6, "boss": 0.5}
+        self.level_gain = level_gain
+        self.cap = cap
+    def __call__(self, player: dict, question_diff: str) -> float:
+        p = self.rates.get(question_diff, 0.7) + self.level_gain * (player["level"] - 1)
+        return max(0.0, min(self.cap, p))
+def choose_level_up(player: dict, policy: str, rng=random) -> str:
+    """Pick a LEVEL_UP_CHOICES key for a simulated player."""
+    if policy == "hp":
+        return "1"
+    if policy == "damage":
+        return "2"
+    if policy == "gold":
+        return "3"
+    if policy == "random":
+        return rng.choice(("1", "2", "3"))
+    return ("2", "1", "3")[player["level"] % 3]
+def sim_level_up(player: dict, policy: str, rng=random) -> int:
+    """Headless check_level_up(): same XP thresholds and upgrades, no prompts."""
+    target, player["xp"] = resolve_xp_gain(player["level"], player["xp"])
+    gained = target - player["level"]
+    while player["level"] < target:
+        player["level"] += 1
+        apply_level_up_choice(player, choose_level_up(player, policy, rng))
+        restore_after_level_up(player)
+    return gained
+def sim_prepare(player: dict, heal_below: float = 0.5):
+    """Spend gold on potions/shields between battles like a careful player would."""
+    inv = player.setdefault("inventory", {})
+    while player["hp"] < player["max_hp"] * heal_below:
+        if inv.get("potion", 0) <= 0:
+            if player["gold"] < ITEMS["potion"]["price"]:
+                break
+            player["gold"] -= ITEMS["potion"]["price"]
+            inv["potion"] = inv.get("potion", 0) + 1
+        inv["potion"] -= 1
+        player["hp"] = min(player["max_hp"], player["hp"] + 30)
+    if player.get("shield_points", 0) <= 0 and inv.get("shield", 0) > 0:
+        inv["shield"] -= 1
+        player["shield_points"] = 3
+def simulate_battle(player: dict, diff: str, accuracy, rng=random, policy: str = "balanced", max_turns: int = 500) -> dict:
+    """Run one battle() with the real combat rules and a simulated answerer."""
+    initial_score = player.get("score", 0)
+    initial_xp = player.get("xp", 0)
+    initial_gold = player.get("gold", 0)
+    enemy = make_enemy(diff if diff != "random" else "medium", player["level"], rng)
+    pool = POOL_DIFFICULTIES.get(diff, POOL_DIFFICULTIES["medium"])
+    turns = 0
+    xp_earned = 0
+    while player["hp"] > 0 and enemy["hp"] > 0 and turns < max_turns:
+        turns += 1
+        qdiff = pool[0] if len(pool) == 1 else rng.choice(pool)
+        if rng.random() < accuracy(player, qdiff):
+            resolve_correct_answer(player, enemy)
+            sim_level_up(player, policy, rng)
+        else:
+            resolve_wrong_answer(player, enemy)
+    won = enemy["hp"] <= 0
+    if won:
+        xp_earned = grant_victory_rewards(player, enemy, diff, rng)["xp"]
+    elif player["hp"] <= 0:
+        apply_defeat_penalty(player, diff, initial_score, initial_xp)
+    return {"won": won, "turns": turns, "xp": xp_earned,
+            "gold": player.get("gold", 0) - initial_gold,
+            "score": player.get("score", 0) - initial_score}
+def _simulate_chunk(task: tuple) -> dict:
+    """Process-pool worker: run campaigns and return {(diff, level): [battles, wins, turns, kill_turns, gold, xp]}."""
+    diff, campaigns, campaign_length, accuracy, policy, seed = task
+    rng = random.Random(seed)
+    agg = {}
+    for _ in range(campaigns):
+        player = normalize_player({"name": "Sim"}).to_dict()
+        for _ in range(campaign_length):
+            sim_prepare(player)
+            level = player["level"]
+            r = simulate_battle(player, diff, accuracy, rng, policy)
+            row = agg.get((diff, level))
+            if row is None:
+                row = agg[(diff, level)] = [0, 0, 0, 0, 0, 0]
+            row[0] += 1
+            row[2] += r["turns"]
+            row[4] += r["gold"]
+            row[5] += r["xp"]
+            if r["won"]:
+                row[1] += 1
+                row[3] += r["turns"]
+    return agg
+def run_balance_simulation(battles: int = 1_000_000, difficulties=("easy", "medium", "hard", "boss", "random"),
+                           accuracy=None, policy: str = "balanced", campaign_length: int = 50,
+                           workers: Optional[int] = None, seed: Optional[int] = None, chunk_battles: int = 20_000) -> dict:
+    """Spread simulated campaigns over a process pool and aggregate per difficulty and level."""
+    accuracy = accuracy or DifficultyAccuracy()
+    campaign_length = max(1, int(campaign_length))
+    base_seed = seed if seed is not None else random.randrange(2**32)
+    per_diff = max(1, battles // max(1, len(difficulties)))
+    per_task = max(1, chunk_battles // campaign_length)
+    tasks = []
+    for diff in difficulties:
+        campaigns = max(1, per_diff // campaign_length)
+        while campaigns > 0:
+            n = min(per_task, campaigns)
+            tasks.append((diff, n, campaign_length, accuracy, policy, base_seed + len(tasks)))
+            campaigns -= n
+    totals = {}
+    if workers == 1:
+        for part in map(_simulate_chunk, tasks):
+            _merge_sim_part(totals, part)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_simulate_chunk, tasks):
+                _merge_sim_part(totals, part)
+    results = {diff: {} for diff in difficulties}
+    for (diff, level), (n, wins, turns, kill_turns, gold, xp) in sorted(totals.items()):
+        results[diff][level] = {
+            "battles": n,
+            "win_rate": wins / n,
+            "avg_turns": turns / n,
+            "avg_turns_to_kill": kill_turns / wins if wins else 0.0,
+            "avg_gold": gold / n,
+            "avg_xp": xp / n,
+        }
+    return results
+def _merge_sim_part(totals: dict, part: dict):
+    for key, row in part.items():
+        cur = totals.get(key)
+        if cur is None:
+            totals[key] = list(row)
+        else:
+            for i, v in enumerate(row):
+                cur[i] += v
+def print_simulation_report(results: dict):
+    for diff, levels in results.items():
+        print(f"\n⚔️ {diff.capitalize()}\n" + "─"*72)
+        print(f"{'Lv':>3} | {'Battles':>9} | {'Win%':>6} | {'Turns':>6} | {'To kill':>7} | {'Gold':>8} | {'XP':>7}")
+        for level, r in levels.items():
+            print(f"{level:>3} | {r['battles']:>9} | {r['win_rate']*100:>5.1f}% | {r['avg_turns']:>6.2f} | "
+                  f"{r['avg_turns_to_kill']:>7.2f} | {r['avg_gold']:>8.1f} | {r['avg_xp']:>7.1f}")
+BENCH_BASELINE_FILE = "bench_baseline.json"
+BENCH_SCALES = (1_000, 10_000, 100_000, 1_000_000)
+def _bench_question(i: int, rng) -> dict:
+    opts = [f"Option {i}-{j}" for j in range(4)]
+    return {"question": f"Synthetic question #{i}?", "options": opts, "answer": opts[rng.randrange(4)],
+            "difficulty": DIFFICULTY_ORDER[i % 4]}
+def _bench_raw_player(i: int, rng) -> dict:
+    return {"name": f"Player{i}", "level": str(rng.randint(1, 60)), "xp": rng.randint(0, 5000), "hp": "80",
+            "max_hp": 100 + rng.randint(0, 300), "damage": rng.randint(10, 90), "score": rng.randint(0, 10**6),
+            "gold": rng.randint(0, 5000), "inventory": {"potion": rng.randint(0, 5)}, "story_shown": True}
+def _bench_reset():
+    global STORAGE, LEADERBOARD, USERS, USER_INDEX, QUESTIONS, QUESTION_INDEX
+    if STORAGE is not None:
+        STORAGE.close()
+    STORAGE = None
+    for path in list(JOURNALS):
+        release_journal(path)
+    LEADERBOARD = None
+    USERS, USER_INDEX = {}, {}
+    QUESTIONS, QUESTION_INDEX = [], None
+def _bench_load_questions(n: int, rng):
+    with open(QUESTION_FILE, "w", encoding="utf-8") as f:
+        json.dump([_bench_question(i, rng) for i in range(n)], f)
+    return 1, load_questions
+def _bench_normalize_player(n: int, rng):
+    raws = [_bench_raw_player(i, rng) for i in range(n)]
+    return n, lambda: [normalize_player(p) for p in raws]
+def _bench_save_load_player(n: int, rng):
+    players = [normalize_player(_bench_raw_player(i, rng)) for i in range(min(n, 5_000))]
+    def run():
+        for p in players:
+            p["score"] += 1
+            save_player(p["name"], p, True)
+            load_player(p["name"])
+    return len(players), run
+def _bench_update_leaderboard(n: int, rng):
+    board = get_leaderboard()
+    for i in range(n):
+        board.update(f"Player{i}", rng.randint(0, 10**6), 1, 0)
+    save_leaderboard()
+    players = [normalize_player(_bench_raw_player(rng.randrange(n), rng)) for _ in range(min(n, 10_000))]
+    return len(players), lambda: [update_leaderboard_with_player(p) for p in players]
+def _bench_find_user(n: int, rng):
+    USERS.update((f"Player{i}", {"hash": "0" * 64, "salt": "0" * 32}) for i in range(n))
+    save_users()
+    names = [f"PLAYER{rng.randrange(n)}" for _ in range(10_000)]
+    return len(names), lambda: [find_user(k) for k in names]
+def _bench_question_pools(n: int, rng):
+    questions = [_bench_question(i, rng) for i in range(n)]
+    question_pool("all", questions)
+    diffs = list(POOL_DIFFICULTIES) * 100
+    return len(diffs), lambda: [question_pool(d, questions).draw() for d in diffs]
+BENCH_CASES = {
+    "load_questions": _bench_load_questions,
+    "normalize_player": _bench_normalize_player,
+    "save_load_player": _bench_save_load_player,
+    "update_leaderboard": _bench_update_leaderboard,
+    "find_user": _bench_find_user,
+    "question_pool": _bench_question_pools,
+}
+def run_benchmarks(max_scale: int = 100_000, cases=None, repeat: int = 3) -> dict:
+    """{case: {scale: seconds per operation}} for every BENCH_SCALES size up to max_scale, best of repeat runs."""
+    import shutil
+    import tempfile
+    results = {}
+    home = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="quicx-bench-")
+    try:
+        os.chdir(scratch)
+        for case in cases or BENCH_CASES:
+            results[case] = {}
+            for n in (s for s in BENCH_SCALES if s <= max_scale):
+                _bench_reset()
+                ensure_dirs()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ops, fn = BENCH_CASES[case](n, random.Random(n))
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        fn()
+                        best = min(best, time.perf_counter() - start)
+                results[case][str(n)] = best / ops
+                print(f"   {case:<30} n={n:<9,} {best / ops * 1e6:>12.2f} µs/op")
+    finally:
+        _bench_reset()
+        os.chdir(home)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+def compare_benchmarks(results: dict, baseline: dict, threshold: float = 0.25) -> list:
+    """Rows (case, scale, seconds, baseline seconds, ratio, regressed) for every measured point."""
+    rows = []
+    for case, scales in results.items():
+        for n, secs in scales.items():
+            old = baseline.get(case, {}).get(n)
+            ratio = secs / old if old else None
+            rows.append((case, n, secs, old, ratio, ratio is not None and ratio > 1 + threshold))
+    return rows
+def run_benchmark_suite(max_scale: int = 100_000, baseline_path: str = BENCH_BASELINE_FILE,
+                        threshold: float = 0.25, save: bool = False) -> bool:
+    """Run the suite and check it against the stored baseline; False if anything regressed."""
+    baseline_path = os.path.abspath(baseline_path)
+    print(f"⏱️ Benchmarking up to {max_scale:,} records ({STORAGE_BACKEND} storage)")
+    results = run_benchmarks(max_scale)
+    stored = safe_json_load(baseline_path) or {}
+    rows = compare_benchmarks(results, stored.get("results", {}), threshold)
+    print(f"\n{'Case':<30} | {'N':>9} | {'µs/op':>12} | {'Baseline':>12} | {'Change':>8}")
+    print("─"*84)
+    for case, n, secs, old, ratio, regressed in rows:
+        change = f"{(ratio - 1) * 100:+7.1f}%" if ratio is not None else "new"
+        base = f"{old * 1e6:>12.2f}" if old else f"{'-':>12}"
+        print(f"{case:<30} | {int(n):>9,} | {secs * 1e6:>12.2f} | {base} | {change:>8}{' ❌' if regressed else ''}")
+    regressions = [r for r in rows if r[5]]
+    if save or not stored:
+        merged = stored.get("results", {})
+        for case, scales in results.items():
+            merged.setdefault(case, {}).update(scales)
+        safe_json_write(baseline_path, {"python": sys.version.split()[0], "platform": sys.platform,
+                                        "storage": STORAGE_BACKEND, "saved": time.time(), "results": merged})
+        print(f"\n💾 Baseline written to {baseline_path}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} measurement(s) regressed by more than {threshold:.0%}")
+        return False
+    print("\n✅ No regressions")
+    return True
+PROFILE = None
+PROFILED_CALLS = ("load_users", "save_users", "find_user", "load_admins", "save_admins", "load_leaderboard",
+                  "save_leaderboard", "flush_leaderboard", "load_questions", "load_player", "save_player",
+                  "resolve_correct_answer", "resolve_wrong_answer")
+PROFILED_STEPS = ("battle", "ask_question")
+class Profiler:
+    """Timers and counters behind --profile; nothing runs unless enable_profiling() swapped the wrappers in."""
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+        self.cprofile = None
+        self.dump_prefix = None
+        self._lock = threading.Lock()
+    def record(self, name: str, elapsed: float):
+        with self._lock:
+            t = self.timers.get(name)
+            if t is None:
+                self.timers[name] = [1, elapsed, elapsed]
+            else:
+                t[0] += 1
+                t[1] += elapsed
+                if elapsed > t[2]:
+                    t[2] = elapsed
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+    def wrap(self, name: str, fn):
+        import inspect
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def steps(*args, **kwargs):
+                return (yield from self._steps(name, fn(*args, **kwargs)))
+            return steps
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - t)
+        return timed
+    def _steps(self, name: str, gen):
+        busy = 0.0
+        value = pending = None
+        try:
+            while True:
+                t = time.perf_counter()
+                try:
+                    req = gen.throw(pending) if pending is not None else gen.send(value)
+                except StopIteration as stop:
+                    busy += time.perf_counter() - t
+                    return stop.value
+                busy += time.perf_counter() - t
+                pending = None
+                try:
+                    value = yield req
+                except GeneratorExit:
+                    gen.close()
+                    raise
+                except BaseException as e:
+                    pending = e
+        finally:
+            self.record(name, busy)
+    def wrap_json_write(self, fn):
+        @functools.wraps(fn)
+        def timed(path, data):
+            t = time.perf_counter()
+            ok = fn(path, data)
+            self.record("safe_json_write", time.perf_counter() - t)
+            if ok:
+                try:
+                    self.count("safe_json_write.bytes", os.path.getsize(path))
+                except OSError:
+                    pass
+            return ok
+        return timed
+    def report(self):
+        wall = time.perf_counter() - self.started
+        print(f"\n📊 Profile ({wall:.1f}s wall)\n" + "─"*78)
+        print(f"{'Operation':<24} | {'Calls':>7} | {'Total ms':>10} | {'Mean ms':>9} | {'Max ms':>9} | {'Calls/s':>8}")
+        for name, (calls, total, worst) in sorted(self.timers.items(), key=lambda kv: -kv[1][1]):
+            print(f"{name:<24} | {calls:>7} | {total*1000:>10.2f} | {total/calls*1000:>9.3f} | {worst*1000:>9.3f} | {calls/max(total, 1e-9):>8.0f}")
+        for name, n in sorted(self.counters.items()) + [(f"player_saves.{k}", v) for k, v in save_stats().items()]:
+            print(f"{name:<24} | {n:>7}")
+        locks = lock_stats()
+        if locks["acquired"]:
+            print(f"🔒 File locks: {locks['acquired']} taken, {locks['contended']} contended | "
+                  f"hold mean {locks['held'] / locks['acquired'] * 1000:.3f} ms, max {locks['held_max'] * 1000:.3f} ms | "
+                  f"wait max {locks['wait_max'] * 1000:.3f} ms")
+        write = self.timers.get("safe_json_write")
+        if write and write[1] > 0 and "safe_json_write.bytes" in self.counters:
+            print(f"💾 JSON writes: {self.counters['safe_json_write.bytes'] / write[1] / 1e6:.2f} MB/s")
+        if self.dump_prefix:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                top = snapshot.statistics("lineno")
+                with open(f"{self.dump_prefix}.mem.txt", "w", encoding="utf-8") as f:
+                    f.write(f"current {current} bytes, peak {peak} bytes\n")
+                    f.writelines(f"{stat}\n" for stat in top[:200])
+                print(f"\n🧠 Memory: {current/1e6:.1f} MB traced, {peak/1e6:.1f} MB peak (top allocations in {self.dump_prefix}.mem.txt)")
+                for stat in top[:10]:
+                    print(f"   {stat}")
+        if self.cprofile is not None:
+            import pstats
+            self.cprofile.disable()
+            self.cprofile.dump_stats(f"{self.dump_prefix}.prof")
+            print(f"\n🧭 cProfile (full stats in {self.dump_prefix}.prof)")
+            pstats.Stats(self.cprofile).sort_stats("cumulative").print_stats(15)
+def enable_profiling(dump_prefix: Optional[str] = None) -> Profiler:
+    """Swap timed wrappers over the hot paths; with dump_prefix also run cProfile and tracemalloc."""
+    global PROFILE
+    if PROFILE is not None:
+        return PROFILE
+    PROFILE = Profiler()
+    g = globals()
+    for name in PROFILED_CALLS + PROFILED_STEPS:
+        g[name] = PROFILE.wrap(name, g[name])
+    g["safe_json_write"] = PROFILE.wrap_json_write(safe_json_write)
+    if dump_prefix:
+        import cProfile
+        import tracemalloc
+        PROFILE.dump_prefix = dump_prefix
+        tracemalloc.start()
+        PROFILE.cprofile = cProfile.Profile()
+        PROFILE.cprofile.enable()
+    atexit.register(PROFILE.report)
+    return PROFILE
+ERROR_LOG = None
+ERROR_LOG_LOCK = threading.Lock()
 def log_error(error_msg, exc_info=None):
+    global ERROR_LOG
     try:
-        with open("error.log", "a") as f:
-            f.write(f"\n[{__import__('datetime').datetime.now()}] {error_msg}")
+        with ERROR_LOG_LOCK:
+            if ERROR_LOG is None:
+                ERROR_LOG = open("error.log", "a", encoding="utf-8")
+                atexit.register(ERROR_LOG.close)
+            ERROR_LOG.write(f"\n[{datetime.datetime.now()}] {error_msg}")
             if exc_info:
-                f.write(f"\n{traceback.format_exc()}")
+                ERROR_LOG.write(f"\n{traceback.format_exc()}")
+            ERROR_LOG.flush()
     except:
         pass
+STARTUP_PHASES = []
+def mark_startup(name: str):
+    """Record when a startup milestone was first reached, in seconds since the process began importing."""
+    if not any(n == name for n, _, _ in STARTUP_PHASES):
+        STARTUP_PHASES.append((name, time.perf_counter() - STARTUP_STARTED, 0.0))
+@contextlib.contextmanager
+def startup_phase(name: str):
+    """Time a load step for --startup-report; only the first run of each name is kept."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if not any(n == name for n, _, _ in STARTUP_PHASES):
+            STARTUP_PHASES.append((name, start - STARTUP_STARTED, time.perf_counter() - start))
+def print_startup_report():
+    print("\n⏱️ Startup Report\n" + "─"*48)
+    print(f"{'phase':<20}{'at (ms)':>12}{'took (ms)':>14}")
+    for name, at, took in STARTUP_PHASES:
+        print(f"{name:<20}{at * 1000:>12.1f}{(f'{took * 1000:.1f}' if took else '-'):>14}")
+    not_loaded = [n for n in ("users", "admins", "questions", "leaderboard") if not any(p == n for p, _, _ in STARTUP_PHASES)]
+    if not_loaded:
+        print(f"Not loaded this run: {', '.join(not_loaded)}")
+def start_game():
+    """Prepare the process; every store (users, admins, questions, leaderboard) loads on first use."""
+    ensure_dirs()
+    atexit.register(close_storage)
+    atexit.register(flush_pending_state)
+def main_menu():
+    """Title screen coroutine: one per terminal or network session."""
+    while True:
+        try:
+            clear_screen()
+            print("╔" + "═"*60 + "╗")
+            print("       ⚔️ Quicx Knight: The Astral Oath Beta 1.2 ⚔️")
+            print("╚" + "═"*60 + "╝\n")
+            print("🎯 Test your knowledge in epic battles!\n")
+            print("1️⃣ Play Game (Login/Register)\n2️⃣ Admin Panel\n3️⃣ View Leaderboard\n4️⃣ Quit Game")
+            mark_startup("first menu")
+            choice = yield from get_valid_choice("\n👉 Choose your adventure: ", ["1","2","3","4"])
+            if choice == "1":
+                clear_screen()
+                print("🔐 Player Access\n" + "─"*30)
+                print("1. Login to existing account\n2. Create new account\n3. Reset forgotten password\n4. Back to main menu")
+                sub = yield from get_valid_choice("👉 Choose: ", ["1","2","3","4"])
+                username = None
+                if sub == "1":
+                    username = yield from login_account(is_admin=False)
+                elif sub == "2":
+                    username = yield from register_user()
+                elif sub == "3":
+                    username = yield from reset_password()
+                elif sub == "4":
+                    continue
+                if not username:
+                    continue
+                player = yield Call(load_player, username)
+                yield from player_game_loop(player, username)
+            elif choice == "2":
+                clear_screen(); print("🔑 Admin Access Required")
+                if CURRENT_SESSION is not None:
+                    print("⚠️ The admin panel is only available from the server's own terminal.")
+                    yield from press_enter(); continue
+                if (yield from login_account(is_admin=True)):
+                    yield from dev_menu()
+            elif choice == "3":
+                yield from show_leaderboard(); yield from press_enter()
+            elif choice == "4":
+                print("👋 Thanks for playing Quiz Battle Game!\n💫 Your progress has been saved. See you next time!")
+                break
+        except Exception as e:
+            log_error(f"Error in main loop: {str(e)}", exc_info=True)
+            print(f"\n⚠️ An error occurred: {str(e)}")
+            print("The error has been logged. Press Enter to continue...")
+            yield from press_enter()
+            continue
 def main():
     try:
-        ensure_dirs()
-        load_users()
-        load_admins()
-        load_questions()
-        load_leaderboard()
+        with startup_phase("start_game"):
+            start_game()
         print("🎮 Loading Quiz Battle Game...")
-        print(f"✅ Game ready with {len(QUESTIONS)} questions!")
-        while True:
-            try:
-                clear_screen()
-                print("╔" + "═"*60 + "╗")
-                print("       ⚔️ Quicx Knight: The Astral Oath Beta 1.2 ⚔️")
-                print("╚" + "═"*60 + "╝\n")
-                print("🎯 Test your knowledge in epic battles!\n")
-                print("1️⃣ Play Game (Login/Register)\n2️⃣ Admin Panel\n3️⃣ View Leaderboard\n4️⃣ Quit Game")
-                choice = get_valid_choice("\n👉 Choose your adventure: ", ["1","2","3","4"])
-                if choice == "1":
-                    clear_screen()
-                    print("🔐 Player Access\n" + "─"*30)
-                    print("1. Login to existing account\n2. Create new account\n3. Reset forgotten password\n4. Back to main menu")
-                    sub = get_valid_choice("👉 Choose: ", ["1","2","3","4"])
-                    username = None
-                    if sub == "1":
-                        username = login_account(is_admin=False)
-                    elif sub == "2":
-                        username = register_user()
-                    elif sub == "3":
-                        username = reset_password()
-                    elif sub == "4":
-                        continue
-                    if not username:
-                        continue
-                    player = load_player(username)
-                    player_game_loop(player, username, QUESTIONS)
-                elif choice == "2":
-                    clear_screen(); print("🔑 Admin Access Required")
-                    if login_account(is_admin=True):
-                        dev_menu()
-                elif choice == "3":
-                    show_leaderboard(); press_enter()
-                elif choice == "4":
-                    print("👋 Thanks for playing Quiz Battle Game!\n💫 Your progress has been saved. See you next time!")
-                    break
-            except Exception as e:
-                log_error(f"Error in main loop: {str(e)}", exc_info=True)
-                print(f"\n⚠️ An error occurred: {str(e)}")
-                print("The error has been logged. Press Enter to continue...")
-                press_enter()
-                continue
+        print("✅ Game ready!")
+        try:
+            run_cli(main_menu())
+        finally:
+            flush_pending_state()
     except KeyboardInterrupt:
         print("\n\n👋 Game interrupted. Your progress has been saved!")
     except Exception as e:
@@ -1003,5 +4685,76 @@ def main():
         print(f"\n⚠️ A critical error occurred: {str(e)}")
         print("The error has been logged to error.log")
         print("Please check the log file and restart the game.")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Quicx Knight: The Astral Oath")
+    parser.add_argument("--storage", choices=list(STORAGE_BACKENDS), help="storage backend (default: $QUICX_STORAGE or json)")
+    parser.add_argument("--audio", choices=["auto"] + list(AUDIO_BACKENDS), help="sound backend (default: $QUICX_AUDIO or auto)")
+    parser.add_argument("--profile", action="store_true", help="print a latency/throughput summary of hot paths on exit")
+    parser.add_argument("--startup-report", action="store_true", help="print per-phase import/load timings and time-to-first-menu on exit")
+    parser.add_argument("--profile-dump", metavar="PREFIX", help="with --profile, also write PREFIX.prof (cProfile) and PREFIX.mem.txt (tracemalloc)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="host the game for network players instead of playing locally")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="play on a running --serve instance")
+    parser.add_argument("--bench", action="store_true", help="run the benchmark suite against the stored baseline")
+    parser.add_argument("--bench-max", type=int, default=100_000, metavar="N", help="largest synthetic dataset for --bench")
+    parser.add_argument("--bench-baseline", default=BENCH_BASELINE_FILE, metavar="FILE", help="baseline JSON for --bench")
+    parser.add_argument("--bench-threshold", type=float, default=0.25, help="slowdown ratio that counts as a regression")
+    parser.add_argument("--bench-save", action="store_true", help="store this --bench run as the new baseline")
+    parser.add_argument("--bench-auth", action="store_true", help="benchmark password hashing at each cost setting")
+    parser.add_argument("--simulate", type=int, metavar="BATTLES", help="run a headless balance simulation instead of the game")
+    parser.add_argument("--difficulty", action="append", choices=list(POOL_DIFFICULTIES), help="difficulty to simulate (repeatable)")
+    parser.add_argument("--accuracy", type=float, help="fixed answer accuracy for the simulation (default: per-difficulty model)")
+    parser.add_argument("--policy", default="balanced", choices=["balanced", "hp", "damage", "gold", "random"], help="level-up choice policy")
+    parser.add_argument("--campaign-length", type=int, default=50, help="battles fought by each simulated player")
+    parser.add_argument("--workers", type=int, help="worker count for --simulate, --bench-auth and question import/export (default: CPU count)")
+    parser.add_argument("--seed", type=int, help="simulation random seed")
+    parser.add_argument("--import-questions", metavar="FILE", help="validate a CSV/JSONL/JSON question file and merge new questions into the bank")
+    parser.add_argument("--export-questions", metavar="FILE", help="write the question bank as CSV, a JSON array or JSONL (by extension)")
+    parser.add_argument("--question-format", choices=["csv", "jsonl", "json"], help="file format for --import-questions/--export-questions")
+    parser.add_argument("--battle-log", metavar="DIR", help=f"directory for the binary battle event log (default: {BATTLE_LOG_DIR}; 'off' disables it)")
+    parser.add_argument("--battle-report", action="store_true", help="summarize the battle event log instead of playing")
+    parser.add_argument("--since-days", type=float, help="with --battle-report, only count the last N days")
+    return parser.parse_args(argv)
+STARTUP_PHASES.append(("imports", 0.0, STARTUP_IMPORTED - STARTUP_STARTED))
+STARTUP_PHASES.append(("definitions", STARTUP_IMPORTED - STARTUP_STARTED, time.perf_counter() - STARTUP_IMPORTED))
 if __name__ == "__main__":
-    main()
+    with startup_phase("arguments"):
+        args = parse_args()
+    if args.startup_report:
+        atexit.register(print_startup_report)
+    if args.storage:
+        STORAGE_BACKEND = args.storage
+    if args.audio:
+        AUDIO_BACKEND = args.audio
+    if args.battle_log == "off":
+        BATTLE_LOG_ENABLED = False
+    elif args.battle_log:
+        BATTLE_LOG_DIR = args.battle_log
+    if args.profile or args.profile_dump:
+        enable_profiling(args.profile_dump)
+    if args.serve:
+        serve(*_parse_address(args.serve))
+    elif args.connect:
+        run_client(*_parse_address(args.connect))
+    elif args.bench:
+        if not run_benchmark_suite(args.bench_max, args.bench_baseline, args.bench_threshold, args.bench_save):
+            sys.exit(1)
+    elif args.bench_auth:
+        print_auth_benchmark(benchmark_password_hashing(workers=args.workers))
+    elif args.import_questions or args.export_questions:
+        for path, run, verb in ((args.import_questions, import_questions, "Import"), (args.export_questions, export_questions, "Export")):
+            if path:
+                report = run(path, args.question_format, args.workers)
+                print_transfer_report(report, verb)
+                if report["error"]:
+                    sys.exit(1)
+    elif args.battle_report:
+        since = int(time.time() - args.since_days * 86400) if args.since_days else None
+        if not run_battle_report(BATTLE_LOG_DIR, since):
+            sys.exit(1)
+    elif args.simulate:
+        accuracy = FixedAccuracy(args.accuracy) if args.accuracy is not None else DifficultyAccuracy()
+        print_simulation_report(run_balance_simulation(
+            args.simulate, tuple(args.difficulty or POOL_DIFFICULTIES), accuracy, args.policy,
+            args.campaign_length, args.workers, args.seed))
+    else:
+        main()
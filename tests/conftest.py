@@ -0,0 +1,52 @@
+import importlib.util
+import itertools
+import pathlib
+import sys
+from concurrent.futures import Future
+import pytest
+GAME_PATH = pathlib.Path(__file__).resolve().parents[1] / "Quicx Knight The Astral Oath Beta 1.1.py"
+_INSTANCES = itertools.count()
+def load_game():
+    """A fresh copy of the game module; each copy has its own globals, like a separate process."""
+    name = f"quicx_game_{next(_INSTANCES)}"
+    spec = importlib.util.spec_from_file_location(name, GAME_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+def run_flow(game, flow, answers=()):
+    """Drive a game coroutine the way run_cli() does, answering prompts from answers."""
+    answers = list(answers)
+    value = None
+    while True:
+        try:
+            req = flow.send(value)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(req, game.Call):
+            value = req.fn(*req.args)
+        elif isinstance(req, Future):
+            value = req.result()
+        else:
+            value = answers.pop(0) if answers else ""
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+@pytest.fixture
+def games(workdir):
+    """Factory for game instances sharing the temporary working directory."""
+    made = []
+    def make():
+        game = load_game()
+        game.clear_screen = lambda: None
+        made.append(game)
+        return game
+    yield make
+    for game in made:
+        game.flush_pending_state()
+        game.sync_journals()
+        sys.modules.pop(game.__name__, None)
+@pytest.fixture
+def game(games):
+    return games()
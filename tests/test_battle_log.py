@@ -0,0 +1,58 @@
+import os
+import pytest
+def write_battles(game, log, battles: int, diff: str = "easy", fps=(11, 22)):
+    for b in range(battles):
+        for t, fp in enumerate(fps):
+            log.emit(game.turn_event(b, diff, 5, fp, 10, 3, t, game.TURN_CORRECT if (b + t) % 2 else 0, 1, 1))
+        log.emit(game.end_event(b, diff, 5, len(fps), 20, 6, b % 3))
+def test_events_round_trip_and_torn_tail_is_skipped(game):
+    log = game.BattleEventLog("logs")
+    write_battles(game, log, 4)
+    log.close()
+    assert log.written == 12 and log.dropped == 0
+    (path,) = game.battle_log_files("logs")
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 7)
+    events = list(game.read_battle_events([path], chunk_records=5))
+    assert [e.kind for e in events] == [game.EVENT_TURN, game.EVENT_TURN, game.EVENT_END] * 4
+    turn, end = events[0], events[2]
+    assert (turn.battle, turn.question, turn.dealt, turn.taken, turn.choice, turn.level) == (0, 11, 10, 3, 1, 5)
+    assert (end.battle, end.turns, end.dealt, end.outcome) == (0, 2, 20, 0)
+    summary = game.summarize_battles(events)
+    assert summary["battles"] == 4 and summary["avg_turns"] == 2.0
+    assert summary["questions"] == {11: [4, 2], 22: [4, 2]}
+    assert summary["outcomes"] == {(0, 1): [4, 1, 1]}
+    assert summary["lengths"] == {0: [4, 8]}
+def test_logs_rotate_and_keep_the_newest(game, monkeypatch):
+    monkeypatch.setattr(game, "BATTLE_LOG_ROTATE_BYTES", len(game.BATTLE_LOG_HEADER) + 3 * game.EVENT_SIZE)
+    monkeypatch.setattr(game, "BATTLE_LOG_KEEP", 3)
+    log = game.BattleEventLog("logs")
+    for b in range(6):
+        write_battles(game, log, 1, fps=(b,))
+        log.flush()
+    log.close()
+    paths = game.battle_log_files("logs")
+    assert len(paths) == 3
+    assert all(os.path.getsize(p) <= game.BATTLE_LOG_ROTATE_BYTES for p in paths)
+    assert [e.battle for e in game.read_battle_events(paths) if e.kind == game.EVENT_END] == [0, 0, 0]
+    assert [e.question for e in game.read_battle_events(paths) if e.kind == game.EVENT_TURN] == [3, 4, 5]
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_calibration_flags_a_mislabelled_question(game, vectorized):
+    if vectorized:
+        pytest.importorskip("numpy")
+    else:
+        game.NUMPY = False
+    bank = [{"question": f"{d} {i}", "options": ["a", "b"], "answer": "a", "difficulty": d}
+            for d in ("easy", "hard") for i in range(10)]
+    index = game.QuestionIndex(bank)
+    observed = {}
+    for q in bank:
+        acc = 0.9 if q["difficulty"] == "easy" else 0.3
+        if q["question"] == "hard 4":
+            acc = 0.95
+        observed[game.question_fingerprint(q)] = [100, int(acc * 100)]
+    observed[12345] = [50, 25]
+    result = game.calibrate_questions(observed, index)
+    assert result["matched"] == 20 and result["unmatched"] == 1
+    assert [(bank[r[0]]["question"], r[1], r[2]) for r in result["flagged"]] == [("hard 4", "hard", "easy")]
+    assert result["levels"]["easy"][:2] == (10, 1000)
@@ -0,0 +1,36 @@
+import json
+import random
+def test_shipped_catalog_loads_cleanly(game, capsys):
+    catalog = game.load_enemies()
+    assert "⚠️" not in capsys.readouterr().out
+    assert set(game.DEFAULT_ENEMIES) <= set(catalog)
+def test_bad_entries_fall_back_to_the_defaults(game, capsys, monkeypatch):
+    with open("enemies.json", "w", encoding="utf-8") as f:
+        json.dump({"easy": {"name": "Blob", "hp": 0, "damage": 1, "xp_reward": 1, "gold_base": 1},
+                   "hard": {"name": "Troll", "hp": 80, "damage": 12.5, "xp_reward": 30, "gold_base": 50,
+                            "variants": ["Troll", "Cave Troll"]},
+                   "elite": {"name": "Wraith", "hp": 70, "damage": 20, "xp_reward": 50, "gold_base": 90}}, f)
+    monkeypatch.setattr(game, "ENEMIES_FILE", "enemies.json")
+    catalog = game.load_enemies()
+    out = capsys.readouterr().out
+    assert "'easy'" in out and "'hard'" not in out
+    assert catalog["easy"].base["name"] == "Slime"
+    assert catalog["hard"].base == {"name": "Troll", "hp": 80, "damage": 12, "xp_reward": 30, "gold_base": 50,
+                                    "variants": ["Troll", "Cave Troll"]}
+    assert catalog["elite"].base["name"] == "Wraith"
+    assert game.enemy_tables("unknown") is catalog["medium"]
+    monkeypatch.setattr(game, "ENEMIES_FILE", "missing.json")
+    assert game.load_enemies()["boss"].base["name"] == "Dragon"
+def test_make_enemies_rolls_what_make_enemy_would(game):
+    levels = [1, 2, 9, 10, 37, game.PROGRESSION_LEVELS, game.PROGRESSION_LEVELS + 4]
+    for diff in game.DEFAULT_ENEMIES:
+        cols = game.make_enemies(diff, levels, 3, random.Random(5))
+        rng = random.Random(5)
+        singles = [game.make_enemy(diff, lv, rng) for lv in levels for _ in range(3)]
+        assert len(cols["name"]) == len(singles)
+        for i, e in enumerate(singles):
+            assert cols["level"][i] == levels[i // 3]
+            row = {k: cols[k][i] for k in ("name", "hp", "damage", "xp_reward", "gold_base")}
+            assert row == {k: e[k] for k in row}
+            assert e["hp"] == e["max_hp"]
+    assert len(game.make_enemies("easy", 4, 5)["hp"]) == 5
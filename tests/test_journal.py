@@ -0,0 +1,108 @@
+import json
+import os
+def open_journal(game, path="store.json", seen=None):
+    """A journal whose remote changes are folded into seen, the way the game's stores apply them."""
+    def on_remote(changes, deleted, reset):
+        if reset:
+            seen.clear()
+        seen.update(changes)
+        for k in deleted:
+            seen.pop(k, None)
+    return game.StateJournal(path, on_remote=on_remote if seen is not None else None)
+def test_appends_and_deletes_replay_in_order(game):
+    j = open_journal(game)
+    assert j.load(track=True) == {}
+    assert j.append({"a": 1, "b": {"x": [1, 2]}})
+    assert j.append({"a": 2}, deleted=["b"])
+    assert j.append({"c": "ü"})
+    j.sync()
+    assert not os.path.exists("store.json")
+    assert open_journal(game).load() == {"a": 2, "c": "ü"}
+def test_torn_last_line_is_cut_off(game):
+    j = open_journal(game)
+    j.load(track=True)
+    j.append({"a": 1})
+    j.sync()
+    with open("store.json.journal", "ab") as f:
+        f.write(b'{"k":"b","v":')
+    assert open_journal(game).load() == {"a": 1}
+    with open("store.json.journal", "rb") as f:
+        assert f.read().endswith(b"\n")
+def test_compaction_folds_the_log_into_the_snapshot(game):
+    j = open_journal(game)
+    j.load(track=True)
+    for i in range(50):
+        j.append({f"k{i % 10}": i})
+    assert j.compact(wait=True)
+    assert not os.path.exists("store.json.journal.old")
+    with open("store.json", encoding="utf-8") as f:
+        assert json.load(f) == {f"k{i}": 40 + i for i in range(10)}
+    j.append({"k0": "after"}, deleted=["k9"])
+    j.sync()
+    expected = {f"k{i}": 40 + i for i in range(9)}
+    expected["k0"] = "after"
+    assert open_journal(game).load() == expected
+def test_large_logs_compact_on_their_own(game, monkeypatch):
+    monkeypatch.setattr(game, "JOURNAL_COMPACT_MIN_BYTES", 256)
+    j = open_journal(game)
+    j.load(track=True)
+    for i in range(100):
+        j.append({"n": i, "pad": "x" * 20})
+        if j._compactor is not None:
+            j._compactor.join()  # let each background compaction land before the next append
+    j.sync()
+    left = sum(os.path.getsize(p) for p in ("store.json.journal", "store.json.journal.old") if os.path.exists(p))
+    assert os.path.exists("store.json") and left <= 256 + 64
+    assert open_journal(game).load() == {"n": 99, "pad": "x" * 20}
+def test_writers_see_each_others_changes(games):
+    a_seen, b_seen = {}, {}
+    a, b = open_journal(games(), seen=a_seen), open_journal(games(), seen=b_seen)
+    a_seen.update(a.load(track=True))
+    b_seen.update(b.load(track=True))
+    a.append({"x": 1})
+    b.append({"y": 2})
+    assert b_seen == {"x": 1}
+    assert a.refresh()
+    assert a_seen == {"y": 2}
+    b.append(deleted=["x"])
+    a.refresh()
+    assert "x" not in a_seen
+def test_conflicting_writes_are_settled_by_merge(games):
+    a, b = open_journal(games(), seen={}), open_journal(games(), seen={})
+    a.load(track=True)
+    b.load(track=True)
+    a.append({"score": 7, "name": "a"})
+    b.append({"score": 3, "other": 1}, merge=lambda k, ours, theirs: max(ours, theirs))
+    a.append({"name": "a2"})
+    b.append({"name": "b"}, merge=lambda k, ours, theirs: theirs)
+    b.sync()
+    a.sync()
+    assert open_journal(games()).load() == {"score": 7, "name": "a2", "other": 1}
+def test_reader_behind_a_compaction_catches_up(games):
+    a_seen, b_seen = {}, {}
+    a, b = open_journal(games(), seen=a_seen), open_journal(games(), seen=b_seen)
+    a.load(track=True)
+    b_seen.update(b.load(track=True))
+    a.append({"x": 1})
+    a.compact(wait=True)
+    a.append({"y": 2})
+    b.append({"z": 3})
+    assert b_seen == {"x": 1, "y": 2}
+    a.compact(wait=True)
+    a.append({"w": 4})
+    a.compact(wait=True)
+    assert b.refresh()
+    assert b_seen == {"x": 1, "y": 2, "z": 3, "w": 4}
+def test_player_journals_are_released_and_bounded(game, monkeypatch):
+    game.ensure_dirs()
+    storage = game.get_storage()
+    monkeypatch.setattr(game, "JOURNAL_CACHE_LIMIT", 4)
+    for i in range(10):
+        storage.save_player(f"p{i}", {"name": f"p{i}", "level": 1, "score": i})
+    assert len(game.JOURNALS) <= 4
+    game.ACTIVE_USERS.add("p9")
+    game.close_player_session("p9")
+    assert game.player_save_path("p9") not in game.JOURNALS
+    assert "p9" not in game.ACTIVE_USERS
+    assert storage.load_player("p0")["score"] == 0
+    assert storage.load_player("p9")["score"] == 9
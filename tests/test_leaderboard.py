@@ -0,0 +1,39 @@
+import random
+def reference_order(scores: dict) -> list:
+    return sorted(scores, key=lambda n: (-scores[n], n))
+def test_rank_update_remove_match_a_sorted_list(game):
+    rng = random.Random(7)
+    board = game.RankedLeaderboard()
+    scores = {}
+    for step in range(3000):
+        name = f"p{rng.randrange(300)}"
+        if rng.random() < 0.2:
+            assert board.remove(name) == (name in scores)
+            scores.pop(name, None)
+        else:
+            scores[name] = rng.randrange(50)
+            order = reference_order(scores)
+            assert board.update(name, scores[name]) == order.index(name) + 1
+        if step % 250 == 0:
+            order = reference_order(scores)
+            assert len(board) == len(scores)
+            assert [e["name"] for e in board] == order
+            for i, n in enumerate(order, 1):
+                assert board.rank(n) == i
+    assert board.rank("nobody") is None
+def test_ties_rank_by_name_and_pages_slice_the_order(game):
+    board = game.RankedLeaderboard()
+    for name, score in [("cara", 10), ("abe", 10), ("dan", 30), ("bea", 20), ("eve", 0)]:
+        board.update(name, score)
+    assert [e["name"] for e in board.top(10)] == ["dan", "bea", "abe", "cara", "eve"]
+    assert [e["name"] for e in board.page(2, 2)] == ["abe", "cara"]
+    assert [e["name"] for e in board.page(3, 2)] == ["eve"]
+    assert board.page(4, 2) == []
+    assert board.around("abe", 1) == [(2, board.get("bea")), (3, board.get("abe")), (4, board.get("cara"))]
+def test_update_moves_an_existing_entry(game):
+    board = game.RankedLeaderboard([{"name": "a", "score": 5}, {"name": "b", "score": 3}])
+    assert board.dirty == 0 and board.rank("b") == 2
+    assert board.update("b", 9, level=4, xp=12) == 1
+    assert len(board) == 2
+    assert board.get("b") == {"name": "b", "score": 9, "level": 4, "xp": 12}
+    assert board.rank("a") == 2
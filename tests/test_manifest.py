@@ -0,0 +1,40 @@
+import random
+def expected(game, manifest, sort, descending=False):
+    key = game._manifest_key(sort)
+    return sorted(manifest.rows, key=lambda n: key(n, manifest.rows[n]), reverse=descending)
+def make_accounts(game, n):
+    game.ensure_dirs()
+    game.load_users()
+    game.USERS.update((f"user{i}", {"hash": "x"}) for i in range(n))
+    game.save_users()
+def test_manifest_rebuilds_from_saves_and_keeps_orders_sorted(game):
+    make_accounts(game, 30)
+    storage = game.get_storage()
+    rng = random.Random(9)
+    for i in range(0, 30, 2):
+        storage.save_player(f"user{i}", {"name": f"user{i}", "level": rng.randint(1, 9), "score": rng.randint(0, 99)})
+    rows, total, more = storage.user_page("level", True, 0, 10)
+    manifest = storage.user_manifest()
+    assert total == 30 and more
+    assert [r[0] for r in rows] == expected(game, manifest, "level", True)[:10]
+    assert manifest.rows["user1"] == [1, 0, 0.0]
+    for sort in game.MANIFEST_COLUMNS:
+        storage.user_page(sort)
+    for _ in range(40):
+        i = rng.randrange(30)
+        storage.save_player(f"user{i}", {"name": f"user{i}", "level": rng.randint(1, 9), "score": rng.randint(0, 99)})
+    for sort in game.MANIFEST_COLUMNS:
+        assert manifest._order(sort) == expected(game, manifest, sort)
+        rows, total, more = storage.user_page(sort, True, 25, 10)
+        assert [r[0] for r in rows] == expected(game, manifest, sort, True)[25:] and not more
+def test_filtered_pages_and_other_processes(games):
+    a = games()
+    make_accounts(a, 12)
+    a.get_storage().save_player("user3", {"name": "user3", "level": 4, "score": 7})
+    a.get_storage().user_page()
+    b = games()
+    b.get_storage().save_player("user11", {"name": "user11", "level": 6, "score": 1})
+    rows, total, more = a.get_storage().user_page("level", True, name_filter="USER1", min_level=2)
+    assert [r[:3] for r in rows] == [("user11", 6, 1)] and total is None and not more
+    rows, _, _ = a.get_storage().user_page("name", False, 0, 5, min_level=4, max_level=4)
+    assert [r[0] for r in rows] == ["user3"]
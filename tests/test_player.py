@@ -0,0 +1,54 @@
+import pytest
+def test_from_dict_keeps_defaults_for_bad_fields(game):
+    p = game.normalize_player({"name": "  ", "level": "7", "xp": "x", "hp": 500, "max_hp": 120, "damage": -3,
+                               "gold": "12", "inventory": {"potion": "2", "shield": -1, "relic": 1, 5: 1},
+                               "story_shown": 1, "question_stats": 42, "unknown": True})
+    assert p.name == "Hero" and p.level == 7 and p.xp == 0
+    assert (p.hp, p.max_hp) == (120, 120)
+    assert p.damage == 1 and p.gold == 12 and p.story_shown is True
+    assert p.inventory.to_dict() == {"potion": 2, "relic": 1}
+    assert len(p.question_stats) == 0
+    assert game.normalize_player(None) == game.Player()
+def test_assignments_are_coerced_clamped_and_counted(game):
+    p = game.Player("ann")
+    rev = p.revision
+    p["gold"] = -50
+    p.max_hp = 40
+    assert p.gold == 0 and p.hp == 40
+    p.hp = 1000
+    assert p.hp == 40
+    assert p.revision != rev
+    with pytest.raises(KeyError):
+        p["mana"] = 3
+    with pytest.raises(AttributeError):
+        p.mana = 3
+    with pytest.raises(ValueError):
+        p.name = ""
+    assert p.get("mana", "none") == "none" and "mana" not in p
+def test_inventory_reads_like_a_dict(game):
+    inv = game.Inventory({"potion": 3, "old_item": 2})
+    rev = inv.revision
+    inv["potion"] -= 5
+    assert inv["potion"] == 0 and "potion" not in inv
+    inv["shield"] = 2
+    assert inv.revision > rev
+    assert inv.to_dict() == {"shield": 2, "old_item": 2} == inv
+    assert inv.pop("old_item") == 2 and inv.get("old_item") is None
+    with pytest.raises(KeyError):
+        inv["missing"]
+    with pytest.raises(TypeError):
+        inv[3] = 1
+def test_to_dict_round_trips_and_tracks_dirty(game):
+    p = game.Player("bob")
+    p.inventory["potion"] = 2
+    p.question_stats.record(123, False)
+    data = p.to_dict()
+    again = game.Player.from_dict(data)
+    assert again.to_dict() == data and again == p
+    again.mark_saved(again.revision)
+    assert not again.dirty
+    again.inventory["potion"] += 1
+    assert again.dirty
+    copy = again.copy()
+    copy.gold = 99
+    assert again.gold == 0
@@ -0,0 +1,28 @@
+import random
+import pytest
+from conftest import run_flow
+def level_up_by_hand(game, level: int, xp: int, gained: int) -> tuple:
+    player = game.Player("hero")
+    player.level, player.xp = level, xp + gained
+    run_flow(game, game.check_level_up(player), ["1"] * 10_000)
+    return player.level, player.xp
+def cases(game):
+    rng = random.Random(7)
+    top = game.PROGRESSION_LEVELS
+    picks = [(1, 0, 0), (1, 0, game.get_xp_required(1)), (1, 0, game.get_xp_required(1) - 1), (top, 0, 10 ** 6), (top + 3, 5, 10 ** 5)]
+    picks += [(rng.randint(1, 120), rng.randint(0, 50), rng.randint(0, 40_000)) for _ in range(40)]
+    return picks
+def test_resolve_xp_gain_matches_levelling_up_one_step_at_a_time(game):
+    game.SOUND_ENABLED = False
+    for level, xp, gained in cases(game):
+        assert game.resolve_xp_gain(level, xp, gained) == level_up_by_hand(game, level, xp, gained)
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_resolve_xp_gains_matches_the_scalar_version(game, vectorized):
+    if vectorized:
+        pytest.importorskip("numpy")
+    else:
+        game.NUMPY = False
+    levels, xps, gains = zip(*cases(game))
+    expected = [game.resolve_xp_gain(*c) for c in cases(game)]
+    out_levels, out_xps = game.resolve_xp_gains(list(levels), list(xps), list(gains))
+    assert list(zip(out_levels, out_xps)) == expected
@@ -0,0 +1,19 @@
+import json
+def write_jsonl(path, questions):
+    with open(path, "w", encoding="utf-8") as f:
+        for q in questions:
+            f.write(json.dumps(q) + "\n")
+def test_import_extends_the_loaded_bank_and_its_stats(game):
+    bank = game.get_questions()
+    before = len(bank)
+    write_jsonl("new.jsonl", [{"question": f"New {i}?", "options": ["a", "b", "c"], "answer": "c", "difficulty": "hard"}
+                              for i in range(5)])
+    report = game.import_questions("new.jsonl")
+    assert report["accepted"] == 5 and report["error"] is None
+    assert game.QUESTIONS is bank and len(bank) == before + 5
+    stats = game.get_question_bank_stats()
+    fresh = game.QuestionBankStats(bank)
+    assert stats.total == fresh.total == before + 5
+    assert stats.state() == fresh.state()
+    assert game.question_pool("hard").index is game.QUESTION_INDEX
+    assert len(game.question_pool("all")) == before + 5
@@ -0,0 +1,44 @@
+import json
+import os
+QUESTIONS = [{"question": f"Q{i}?", "options": ["a", "b", "c"], "answer": "abc"[i % 3],
+              "difficulty": ("easy", "medium", "hard", "boss")[i % 4]} for i in range(12)]
+def write_bank(path, questions):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(questions, f)
+def no_parse(*args, **kwargs):
+    raise AssertionError("the bank was parsed instead of read from the cache")
+def test_cache_round_trip(game, monkeypatch):
+    write_bank("bank.json", QUESTIONS)
+    questions, index, report = game.compile_questions("bank.json")
+    assert os.path.exists("bank.json" + game.QUESTION_CACHE_SUFFIX)
+    monkeypatch.setattr(game, "stream_questions", no_parse)
+    cached, cached_index, cached_report = game.compile_questions("bank.json")
+    assert cached == questions
+    assert cached_index.layout() == index.layout()
+    for name in game.POOL_DIFFICULTIES:
+        assert list(cached_index.pool(name)) == list(index.pool(name))
+    assert cached_report["stats"] == report["stats"]
+def test_touched_source_is_rehashed_not_reparsed(game, monkeypatch):
+    write_bank("bank.json", QUESTIONS)
+    game.compile_questions("bank.json")
+    st = os.stat("bank.json")
+    os.utime("bank.json", ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    monkeypatch.setattr(game, "stream_questions", no_parse)
+    assert len(game.compile_questions("bank.json")[0]) == len(QUESTIONS)
+    with open("bank.json" + game.QUESTION_CACHE_SUFFIX, encoding="utf-8") as f:
+        assert json.loads(f.readline())["mtime"] == os.stat("bank.json").st_mtime_ns
+def test_changed_or_foreign_cache_is_ignored(game):
+    write_bank("bank.json", QUESTIONS)
+    game.compile_questions("bank.json")
+    write_bank("bank.json", QUESTIONS + [{"question": "New?", "options": ["x", "y"], "answer": "y"}])
+    assert game.load_question_cache("bank.json") is None
+    assert len(game.compile_questions("bank.json")[0]) == len(QUESTIONS) + 1
+    cache = "bank.json" + game.QUESTION_CACHE_SUFFIX
+    with open(cache, encoding="utf-8") as f:
+        head, body = json.loads(f.readline()), f.read()
+    with open(cache, "w", encoding="utf-8") as f:
+        f.write(json.dumps(dict(head, version=head["version"] - 1)) + "\n" + body)
+    assert game.load_question_cache("bank.json") is None
+    with open(cache, "w", encoding="utf-8") as f:
+        f.write(json.dumps(head) + "\n" + body[: len(body) // 2])
+    assert game.load_question_cache("bank.json") is None
@@ -0,0 +1,47 @@
+import io
+import json
+import pytest
+QUESTIONS = [{"question": f"Q{i} [x], {{y}}?", "options": ["a", "b]", "c"], "answer": "b]",
+              "difficulty": ("easy", "HARD", "boss", "?")[i % 4]} for i in range(25)]
+BAD = [{"question": "", "options": ["a", "b"], "answer": "a"}, {"question": "no", "options": ["a"], "answer": "a"},
+       {"question": "x", "options": ["a", "b"], "answer": "c"}, "not an object"]
+def test_iter_json_array_reads_across_chunk_boundaries(game):
+    text = json.dumps(QUESTIONS, indent=1)
+    assert list(game.iter_json_array(io.StringIO(text), chunk_size=7)) == QUESTIONS
+    assert list(game.iter_json_array(io.StringIO("﻿ [ ]"))) == []
+    with pytest.raises(ValueError):
+        list(game.iter_json_array(io.StringIO('{"a": 1}')))
+    with pytest.raises(ValueError):
+        list(game.iter_json_array(io.StringIO('[{"a": 1},'), chunk_size=4))
+@pytest.mark.parametrize("layout", ["array", "jsonl"])
+def test_array_and_line_banks_load_the_same(game, layout):
+    rows = QUESTIONS + BAD
+    with open("bank.json", "w", encoding="utf-8") as f:
+        if layout == "array":
+            json.dump(rows, f)
+        else:
+            f.write("\n".join(json.dumps(r) for r in rows) + "\n\n")
+    seen = []
+    questions, index, report = game.stream_questions("bank.json", chunk_rows=4, progress=lambda r: seen.append(r["rows"]))
+    assert [q["question"] for q in questions] == [q["question"] for q in QUESTIONS]
+    assert {q["difficulty"] for q in questions} == {"easy", "hard", "boss", "medium"}
+    assert report["rows"] == len(rows) and report["accepted"] == 25 and report["rejected"] == 4
+    assert report["error"] is None
+    assert seen == sorted(seen) and seen[-1] == len(rows)
+    assert index.count("boss") == sum(q["difficulty"] == "boss" for q in questions)
+    assert game.QuestionBankStats.from_state(report["stats"]).state() == game.QuestionBankStats(questions).state()
+def test_broken_input_keeps_the_rows_before_it(game):
+    with open("bank.jsonl", "w", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(q) for q in QUESTIONS[:3]) + "\n{broken\n" + json.dumps(QUESTIONS[3]) + "\n")
+    questions, index, report = game.stream_questions("bank.jsonl", chunk_rows=2)
+    assert len(questions) == 4 and report["rejected"] == 1 and report["error"] is None
+    with open("bank.json", "w", encoding="utf-8") as f:
+        f.write(json.dumps(QUESTIONS[:3])[:-1] + ", {broken")
+    questions, index, report = game.stream_questions("bank.json", chunk_rows=2)
+    assert len(questions) == 3 and report["error"]
+def test_load_questions_falls_back_to_the_samples(game):
+    with open(game.QUESTION_FILE, "w", encoding="utf-8") as f:
+        json.dump(BAD, f)
+    bank = game.load_questions()
+    assert [q["question"] for q in bank] == [q["question"] for q in game.SAMPLE_QUESTIONS]
+    assert game.get_question_bank_stats().total == len(bank)
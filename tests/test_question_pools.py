@@ -0,0 +1,41 @@
+import random
+import pytest
+def make_bank(counts: dict) -> list:
+    bank = []
+    for diff, n in counts.items():
+        bank += [{"question": f"{diff} {i}", "options": ["a", "b"], "answer": "a", "difficulty": diff} for i in range(n)]
+    random.Random(4).shuffle(bank)
+    return bank
+def test_pools_hold_exactly_their_difficulties(game):
+    bank = make_bank({"easy": 5, "medium": 4, "hard": 3, "boss": 2})
+    bank.append({"question": "odd", "options": ["a", "b"], "answer": "a", "difficulty": "weird"})
+    index = game.QuestionIndex(bank)
+    assert [index.count(d) for d in game.DIFFICULTY_ORDER] == [5, 5, 3, 2]
+    for name, diffs in game.POOL_DIFFICULTIES.items():
+        pool = index.pool(name)
+        assert len(pool) == sum(index.count(d) for d in diffs)
+        assert {q["difficulty"] for q in pool} <= set(diffs) | {"weird"}
+    assert sorted(q["question"] for q in index.pool("all")) == sorted(q["question"] for q in bank)
+    assert len(index.pool("no such pool")) == len(bank)
+def test_draw_visits_every_question_before_repeating(game):
+    pool = game.QuestionIndex(make_bank({"easy": 3, "medium": 7})).pool("medium")
+    rng = random.Random(2)
+    first = [pool.draw(rng)["question"] for _ in range(len(pool))]
+    assert sorted(first) == sorted(q["question"] for q in pool)
+    second = {pool.draw(rng)["question"] for _ in range(len(pool))}
+    assert second == set(first)
+def test_sample_and_layout_round_trip(game):
+    bank = make_bank({"easy": 4, "hard": 6})
+    index = game.QuestionIndex(bank)
+    picked = index.pool("hard").sample(3, random.Random(1))
+    assert len(picked) == 3 and len({q["question"] for q in picked}) == 3
+    assert all(q["difficulty"] == "hard" for q in picked)
+    again = game.QuestionIndex.from_layout(bank, *index.layout())
+    assert list(again.pool("easy")) == list(index.pool("easy"))
+    with pytest.raises(IndexError):
+        index.pool("boss")[0]
+def test_question_pool_reuses_the_index_for_the_same_bank(game):
+    bank = make_bank({"easy": 2, "boss": 1})
+    first = game.question_pool("boss", bank)
+    assert game.question_pool("easy", bank).index is first.index
+    assert game.question_pool("easy", list(bank)).index is not first.index
@@ -0,0 +1,38 @@
+import json
+import pytest
+QUESTIONS = [{"question": f"Capital #{i}, \"quoted\"?", "options": ["a", "b, c", "d"][: 2 + i % 2], "answer": "a",
+              "difficulty": ("easy", "medium", "hard", "boss")[i % 4]} for i in range(20)]
+def load_bank(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+@pytest.mark.parametrize("fmt", ["csv", "jsonl", "json"])
+def test_export_then_import_round_trips_and_dedupes(game, fmt):
+    with open(game.QUESTION_FILE, "w", encoding="utf-8") as f:
+        json.dump(QUESTIONS, f)
+    out = f"bank.{fmt}"
+    assert game.export_questions(out)["rows"] == 20
+    report = game.import_questions(out, bank="copy.json")
+    assert (report["accepted"], report["duplicates"], report["rejected"], report["error"]) == (20, 0, 0, None)
+    assert load_bank("copy.json") == QUESTIONS
+    again = game.import_questions(out, bank="copy.json")
+    assert (again["accepted"], again["duplicates"], again["bank"]) == (0, 20, 20)
+    assert load_bank("copy.json") == QUESTIONS
+def test_import_folds_case_and_space_and_reports_rejects(game):
+    with open("in.csv", "w", encoding="utf-8") as f:
+        f.write("question,options,answer,difficulty\n"
+                "What is 2+2?,3|4|5,4,easy\n"
+                "  what IS   2+2? ,4|5,4,\n"
+                "Missing answer?,a|b,,hard\n"
+                "Sky colour?,blue|green,blue,\n")
+    report = game.import_questions("in.csv", bank="out.json")
+    assert (report["rows"], report["accepted"], report["duplicates"], report["rejected"]) == (4, 2, 1, 1)
+    assert report["reasons"] == {"missing answer": 1}
+    lines = load_bank("out.json")
+    assert [q["question"] for q in lines] == ["What is 2+2?", "Sky colour?"]
+    assert lines[1] == {"question": "Sky colour?", "options": ["blue", "green"], "answer": "blue", "difficulty": "medium"}
+def test_transfer_flags_parse(game):
+    args = game.parse_args(["--import-questions", "in.csv", "--question-format", "csv", "--workers", "3"])
+    assert (args.import_questions, args.question_format, args.workers, args.export_questions) == ("in.csv", "csv", 3, None)
+    assert game.parse_args(["--export-questions", "out.jsonl"]).export_questions == "out.jsonl"
+    with pytest.raises(SystemExit):
+        game.parse_args(["--question-format", "xml"])
@@ -0,0 +1,61 @@
+import bisect
+import itertools
+import random
+def make_sampler(game, n: int, seed: int = 1, stats=None):
+    bank = [{"question": f"q{i}", "options": ["a", "b"], "answer": "a", "difficulty": "easy"} for i in range(n)]
+    return game.QuestionSampler(game.QuestionIndex(bank).pool("all"), stats, random.Random(seed))
+def test_find_descends_to_the_position_owning_each_weight_range(game):
+    rng = random.Random(3)
+    sampler = make_sampler(game, 37)
+    weights = [1.0] * 37
+    for _ in range(200):
+        pos, w = rng.randrange(37), rng.choice([0.02, 0.5, 1.0, 2.5, 4.0])
+        sampler.set_weight(pos, w)
+        weights[pos] = w
+    cumulative = list(itertools.accumulate(weights))
+    assert abs(sampler.total - cumulative[-1]) < 1e-9
+    assert sampler.weights == {i: w for i, w in enumerate(weights) if w != 1.0}
+    for _ in range(2000):
+        u = rng.random() * sampler.total
+        assert sampler.find(u) == bisect.bisect_right(cumulative, u)
+def test_draws_follow_the_weights(game):
+    sampler = make_sampler(game, 10)
+    sampler.cooldown = 0
+    sampler.set_weight(3, 9.0)
+    hits = sum(sampler.draw()["question"] == "q3" for _ in range(4000))
+    assert 0.5 * 4000 * 0.9 < hits < 0.5 * 4000 * 1.1
+def test_drawn_question_sits_out_the_cooldown(game):
+    sampler = make_sampler(game, 40)
+    first = sampler.draw()
+    pos = int(first["question"][1:])
+    assert sampler.weights[pos] == game.QUESTION_COOLDOWN_FACTOR
+    for _ in range(sampler.cooldown):
+        sampler.draw()
+    assert pos not in sampler.recent
+    assert sampler.weights.get(pos, 1.0) == 1.0
+    assert abs(sampler.total - (40 - len(sampler.recent) * (1 - game.QUESTION_COOLDOWN_FACTOR))) < 1e-9
+def test_record_reweights_by_miss_rate(game):
+    stats = game.QuestionStats()
+    sampler = make_sampler(game, 20, stats=stats)
+    sampler.cooldown = 0
+    q = sampler.draw()
+    sampler.record(False)
+    fp = game.question_fingerprint(q)
+    pos = int(q["question"][1:])
+    assert stats.miss_weight(fp) > 1.0
+    assert sampler.weights[pos] == sampler.base[pos] == stats.miss_weight(fp)
+    again = make_sampler(game, 20, stats=stats)
+    assert again.weights[pos] == stats.weight(fp)
+def test_fingerprints_tell_apart_questions_with_other_options(game):
+    q = {"question": "Pick the prime", "options": ["4", "7"], "answer": "7"}
+    other = dict(q, options=["7", "9"])
+    assert game.question_fingerprint(q) != game.question_fingerprint(other)
+    assert game.question_fingerprint(q) == game.question_fingerprint(dict(q, options=["7", "4"]))
+def test_stats_weight_every_copy_of_a_duplicated_question(game):
+    bank = [{"question": f"q{i}", "options": ["a", "b"], "answer": "a", "difficulty": "easy"} for i in range(30)]
+    bank.append(dict(bank[5]))
+    stats = game.QuestionStats()
+    fp = game.question_fingerprint(bank[5])
+    stats.record(fp, False)
+    sampler = game.QuestionSampler(game.QuestionIndex(bank).pool("all"), stats, random.Random(1))
+    assert sorted(sampler.base) == [5, 30]
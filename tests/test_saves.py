@@ -0,0 +1,24 @@
+def test_coalesced_save_writes_the_snapshot_and_keeps_later_changes_dirty(game):
+    game.ensure_dirs()
+    player = game.load_player("hero")
+    assert game.save_player("hero", player, True)
+    player.gold = 10
+    assert game.save_player("hero", player)
+    assert game.save_stats()["pending"] == 1
+    player.gold = 20
+    assert game.flush_player_saves()
+    assert game.get_storage().load_player("hero")["gold"] == 10
+    assert player.dirty
+    assert game.save_player("hero", player, True)
+    assert not player.dirty
+    assert game.get_storage().load_player("hero")["gold"] == 20
+def test_stale_snapshot_does_not_roll_back_a_newer_save(game):
+    game.ensure_dirs()
+    player = game.load_player("hero")
+    player.gold = 10
+    stale = player.revision, player.to_dict()
+    player.gold = 30
+    assert game.save_player("hero", player, True)
+    assert game._write_player("hero", player, *stale)
+    assert game.get_storage().load_player("hero")["gold"] == 30
+    assert not player.dirty
@@ -0,0 +1,23 @@
+def open_storage(game):
+    game.STORAGE_BACKEND = "sqlite"
+    return game.get_storage()
+def test_user_page_sorts_accounts_with_and_without_saves(game):
+    storage = open_storage(game)
+    assert storage.save_users({"ann": {"hash": "a"}, "Bob": {"hash": "b"}, "cy": {"hash": "c"}})
+    assert not storage.player_exists("cy")
+    assert storage.load_player("cy") is None
+    storage.save_player("ann", {"name": "ann", "level": 7, "score": 50})
+    storage.save_player("Bob", {"name": "Bob", "level": 3, "score": 90})
+    assert storage.player_exists("ann")
+    rows, total, more = storage.user_page("level", True)
+    assert [r[:3] for r in rows] == [("ann", 7, 50), ("Bob", 3, 90), ("cy", 1, 0)]
+    assert (total, more) == (3, False)
+    assert [r[0] for r in storage.user_page("score", False, 0, 2)[0]] == ["cy", "ann"]
+    assert [r[0] for r in storage.user_page("name")[0]] == ["ann", "Bob", "cy"]
+    assert [r[0] for r in storage.user_page("level", min_level=2, max_level=5)[0]] == ["Bob"]
+def test_user_page_sorts_use_indexes(game):
+    storage = open_storage(game)
+    for column, tiebreak in game._SQL_USER_SORTS.values():
+        plan = storage.query(f"EXPLAIN QUERY PLAN SELECT u.username FROM users u JOIN players p ON p.username = u.username "
+                             f"ORDER BY {column} DESC, {tiebreak} DESC LIMIT 21")
+        assert not any("TEMP B-TREE" in row[-1] for row in plan)
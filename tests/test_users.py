@@ -0,0 +1,35 @@
+from conftest import run_flow
+def test_case_insensitive_collision_across_processes(games):
+    a, b = games(), games()
+    a.load_users()
+    b.load_users()
+    assert a.find_user("bob") == (None, None)
+    b.USERS["Bob"] = {"hash": "b"}
+    assert b.save_users("Bob")
+    a.USERS["bob"] = {"hash": "a"}
+    assert not a.save_users("bob")
+    assert a.USERS == {"Bob": {"hash": "b"}}
+    assert a.USER_INDEX == {"bob": "Bob"}
+    fresh = games()
+    assert fresh.load_users() == {"Bob": {"hash": "b"}}
+    assert fresh.find_user("BOB") == ("Bob", {"hash": "b"})
+def test_collision_is_caught_after_a_refresh(games):
+    a, b = games(), games()
+    a.load_users()
+    b.load_users()
+    a.USERS["carol"] = {"hash": "a"}
+    b.USERS["Carol"] = {"hash": "b"}
+    assert b.save_users("Carol")
+    a.find_user("someone else")
+    assert not a.save_users("carol")
+    assert a.USERS == {"Carol": {"hash": "b"}}
+def test_registering_a_name_taken_in_another_case_is_refused(games, capsys):
+    a, b = games(), games()
+    assert run_flow(b, b.register_user(), ["Dana", "pw1234", "pw1234"]) == "Dana"
+    assert run_flow(a, a.register_user(), ["dana", "other99", "other99"]) is None
+    assert "already exists" in capsys.readouterr().out
+    assert run_flow(a, a.login_account(), ["DANA", "pw1234"]) == "Dana"
+def test_admin_login_ignores_case(game):
+    assert run_flow(game, game.login_account(True), ["ADMIN", "admin123"]) is True
+    assert game.find_admin("Admin")[0] == "admin"
+    assert run_flow(game, game.login_account(True), ["admin", "wrong"]) is None